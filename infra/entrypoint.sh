@@ -3,6 +3,11 @@
 # Apply database migrations
 poetry run python onhires_drf_test_task/manage.py migrate
 
+# Write the OpenAPI document served by every worker, when a file is set
+if [ -n "$API_SCHEMA_FILE" ]; then
+    poetry run python onhires_drf_test_task/manage.py generate_api_schema --output "$API_SCHEMA_FILE"
+fi
+
 # Collect static files (skipped for now)
 # poetry run python manage.py collectstatic --noinput
 
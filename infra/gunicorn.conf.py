@@ -0,0 +1,42 @@
+# ruff: noqa: INP001
+"""
+Gunicorn settings of the production profile.
+
+Every value can be overridden through the environment, e.g. GUNICORN_WORKERS.
+"""
+
+import multiprocessing
+import os
+import shutil
+from pathlib import Path
+
+# The Django project directory, so onhires_drf_test_task.wsgi is importable.
+chdir = str(Path(__file__).resolve().parent.parent / "onhires_drf_test_task")
+wsgi_app = "onhires_drf_test_task.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Preforked workers, each serving requests on a few threads. Every worker has
+# its own database pool of DB_POOL_SIZE (+ DB_MAX_OVERFLOW) connections, so
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below max_connections.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Load the application once in the master, so forked workers start ready. The
+# database pools are created per process on first use, never shared.
+preload_app = True
+
+# Keep client connections open between requests, e.g. behind a load balancer.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server: object) -> None:  # noqa: ARG001
+    """Clear the request metrics left by the workers of a previous run."""
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
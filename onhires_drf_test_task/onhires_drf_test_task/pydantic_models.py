@@ -1,3 +1,5 @@
+import typing
+
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 
@@ -13,6 +15,9 @@ class MySQLConnectionSettings(BaseSettings):
 
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
 
 
 class ApplicationSettings(BaseSettings):
@@ -21,5 +26,51 @@ class ApplicationSettings(BaseSettings):
     SECRET_KEY: SecretStr
 
 
+class CacheSettings(BaseSettings):
+    """Cache settings."""
+
+    CACHE_BACKEND: str = "django.core.cache.backends.locmem.LocMemCache"
+    CACHE_LOCATION: str = ""
+
+
+class ApiDocsSettings(BaseSettings):
+    """API documentation settings."""
+
+    API_SCHEMA_FILE: str = ""
+
+
+class MetricsSettings(BaseSettings):
+    """Request metrics settings."""
+
+    METRICS_DIR: str = ""
+    METRICS_FLUSH_INTERVAL: float = 1.0
+
+
+class WalletSettings(BaseSettings):
+    """Wallet write path settings."""
+
+    WALLET_WRITE_MODE: typing.Literal["locking", "conditional", "optimistic"] = (
+        "locking"
+    )
+    WALLET_WRITE_MAX_ATTEMPTS: int = 5
+    WALLET_WRITE_RETRY_BACKOFF: float = 0.005
+
+    WALLET_SUBMISSION_MODE: typing.Literal["direct", "group_commit"] = "direct"
+    WALLET_GROUP_COMMIT_MAX_DEPTH: int = 10_000
+    WALLET_GROUP_COMMIT_BATCH_SIZE: int = 500
+    WALLET_GROUP_COMMIT_MAX_WAIT: float = 0.005
+    WALLET_GROUP_COMMIT_WORKERS: int = 4
+    WALLET_GROUP_COMMIT_TIMEOUT: float = 30
+
+    WALLET_TXID_CACHE_TIMEOUT: int = 300
+    WALLET_RESPONSE_CACHE_TIMEOUT: int = 0
+    WALLET_CONTENTION_CAPACITY: int = 1000
+    WALLET_ASYNC_READ_WORKERS: int = 8
+
+
 application_settings = ApplicationSettings()
+cache_settings = CacheSettings()
+metrics_settings = MetricsSettings()
+api_docs_settings = ApiDocsSettings()
+wallet_settings = WalletSettings()
 mysql_connection_settings = MySQLConnectionSettings()
@@ -14,7 +14,14 @@ from pathlib import Path
 
 import pymysql
 
-from .pydantic_models import application_settings, mysql_connection_settings
+from .pydantic_models import (
+    api_docs_settings,
+    application_settings,
+    cache_settings,
+    metrics_settings,
+    mysql_connection_settings,
+    wallet_settings,
+)
 
 pymysql.install_as_MySQLdb()
 
@@ -33,8 +40,75 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # JSON is rendered and parsed with orjson; internal clients can opt in to
+    # MessagePack with "Accept" and "Content-Type: application/msgpack".
+    "DEFAULT_RENDERER_CLASSES": [
+        "wallet.renderers.ORJSONRenderer",
+        "wallet.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "wallet.parsers.ORJSONParser",
+        "wallet.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Wallet
+
+# "locking" reads the wallet with SELECT ... FOR UPDATE before writing it back,
+# "conditional" applies the delta with a single conditional UPDATE statement,
+# "optimistic" writes it with a compare-and-swap on the wallet version.
+WALLET_WRITE_MODE = wallet_settings.WALLET_WRITE_MODE
+
+# Version conflicts, deadlocks and lock wait timeouts are retried up to
+# MAX_ATTEMPTS times with a jittered backoff (BACKOFF in seconds).
+WALLET_WRITE_MAX_ATTEMPTS = wallet_settings.WALLET_WRITE_MAX_ATTEMPTS
+WALLET_WRITE_RETRY_BACKOFF = wallet_settings.WALLET_WRITE_RETRY_BACKOFF
+
+# "direct" creates every transaction in its own request, "group_commit" queues
+# them per wallet and commits them in batches (MAX_WAIT and TIMEOUT in seconds).
+WALLET_SUBMISSION_MODE = wallet_settings.WALLET_SUBMISSION_MODE
+WALLET_GROUP_COMMIT_MAX_DEPTH = wallet_settings.WALLET_GROUP_COMMIT_MAX_DEPTH
+WALLET_GROUP_COMMIT_BATCH_SIZE = wallet_settings.WALLET_GROUP_COMMIT_BATCH_SIZE
+WALLET_GROUP_COMMIT_MAX_WAIT = wallet_settings.WALLET_GROUP_COMMIT_MAX_WAIT
+WALLET_GROUP_COMMIT_WORKERS = wallet_settings.WALLET_GROUP_COMMIT_WORKERS
+WALLET_GROUP_COMMIT_TIMEOUT = wallet_settings.WALLET_GROUP_COMMIT_TIMEOUT
+
+# Seconds a created txid stays in the cache that answers retried POSTs.
+WALLET_TXID_CACHE_TIMEOUT = wallet_settings.WALLET_TXID_CACHE_TIMEOUT
+
+# Seconds a wallet detail or list response stays cached, 0 disables the cache.
+# Responses are invalidated through generations kept in the cache, so every
+# process must share one cache backend (e.g. Redis or Memcached).
+WALLET_RESPONSE_CACHE_TIMEOUT = wallet_settings.WALLET_RESPONSE_CACHE_TIMEOUT
+
+# Wallets tracked per metric by the lock contention profile of every process
+# (lock wait time, NOWAIT failures and lock conflicts), 0 disables it.
+WALLET_CONTENTION_CAPACITY = wallet_settings.WALLET_CONTENTION_CAPACITY
+
+# Threads, and so database connections, running the reads of the async
+# endpoints under /api/async/; any number of clients wait on the event loop.
+WALLET_ASYNC_READ_WORKERS = wallet_settings.WALLET_ASYNC_READ_WORKERS
+
+# Metrics
+
+# Per-view request metrics are served on /metrics. Every worker process writes
+# its totals to METRICS_DIR at most every FLUSH_INTERVAL seconds, so a scrape
+# of any worker covers all of them; empty serves the answering process only.
+METRICS_DIR = metrics_settings.METRICS_DIR
+METRICS_FLUSH_INTERVAL = metrics_settings.METRICS_FLUSH_INTERVAL
+
+# API docs
+
+# The OpenAPI document is served on /swagger.json with an ETag and loaded by
+# the Swagger UI on /swagger/. It is read from API_SCHEMA_FILE, written at build
+# time by "manage.py generate_api_schema", or generated once per process on
+# first request when empty. drf-yasg is only imported by the docs routes.
+API_SCHEMA_FILE = api_docs_settings.API_SCHEMA_FILE
+SWAGGER_SETTINGS = {"SPEC_URL": "api-schema"}
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -57,6 +131,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "wallet.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -91,10 +166,21 @@ WSGI_APPLICATION = "onhires_drf_test_task.wsgi.application"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 
+# The backend keeps a connection pool per process: POOL_SIZE idle connections
+# are kept, MAX_OVERFLOW more are opened under load, a checkout waits up to
+# TIMEOUT seconds for a free one, connections older than RECYCLE seconds are
+# replaced (keep it below MySQL's wait_timeout) and PRE_PING checks an idle one
+# before reuse. Every worker process has its own pool.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
-        "POOL_OPTIONS": {"POOL_SIZE": 10, "MAX_OVERFLOW": 10, "RECYCLE": 24 * 60 * 60},
+        "ENGINE": "wallet.backends.mysql",
+        "POOL_OPTIONS": {
+            "POOL_SIZE": mysql_connection_settings.DB_POOL_SIZE,
+            "MAX_OVERFLOW": mysql_connection_settings.DB_MAX_OVERFLOW,
+            "RECYCLE": mysql_connection_settings.DB_POOL_RECYCLE,
+            "TIMEOUT": mysql_connection_settings.DB_POOL_TIMEOUT,
+            "PRE_PING": mysql_connection_settings.DB_POOL_PRE_PING,
+        },
         "NAME": mysql_connection_settings.DB_NAME.get_secret_value(),
         "USER": mysql_connection_settings.DB_USER.get_secret_value(),
         "PASSWORD": mysql_connection_settings.DB_PASS.get_secret_value(),
@@ -104,6 +190,17 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": cache_settings.CACHE_BACKEND,
+        "LOCATION": cache_settings.CACHE_LOCATION,
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
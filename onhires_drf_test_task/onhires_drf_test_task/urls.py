@@ -19,26 +19,13 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="API Documentation",
-        default_version="v1",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
+from wallet.api_schema import schema_json_view, swagger_ui_view
+from wallet.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("wallet.urls")),
-    path(
-        "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
+    path("metrics", metrics_view, name="metrics"),
+    path("swagger/", swagger_ui_view, name="schema-swagger-ui"),
+    path("swagger.json", schema_json_view, name="api-schema"),
 ]
@@ -1,57 +1,269 @@
 import typing
+from functools import cached_property
 
 from django.contrib import admin
-from django.db.models import QuerySet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.http import HttpRequest
+from django.template.response import TemplateResponse
+from django.urls import path, URLPattern
 from django.utils.translation import gettext_lazy as trans
 
+from . import contention
 from .models import Transaction, Wallet
 
 
-class BalanceRangeFilter(admin.SimpleListFilter):
+def estimated_row_count(model: type[Model], using: str) -> int | None:
+    """
+    Return the number of rows of a table estimated from its statistics.
+
+    InnoDB keeps the estimate in ``information_schema``, so reading it costs
+    nothing however large the table is, but it can be off by tens of percent.
+    Other databases return ``None``.
+    """
+    connection = connections[using]
+    if connection.vendor != "mysql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [model._meta.db_table],  # noqa: SLF001
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of a changelist that never counts a large table row by row.
+
+    An unfiltered list of a table estimated at more than ``exact_count_limit``
+    rows is counted from the table statistics. A filtered list is counted up
+    to ``exact_count_limit`` rows, so its pages stop there and a larger result
+    has to be narrowed down by a filter or a search.
+    """
+
+    exact_count_limit = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        """Return the estimated or bounded number of rows of the list."""
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return queryset.order_by()[: self.exact_count_limit].count()
+
+
+class RangeListFilter(admin.SimpleListFilter):
+    """
+    Filter on ranges of an indexed field.
+
+    ``ranges`` maps each choice to its label and to the bounds of the range,
+    as lookups of ``field_name``. While a range is selected and no other
+    ordering is asked for, the list is ordered by ``(field_name, id)``, so the
+    index reads the range in order and stops after one page.
+    """
+
+    field_name = ""
+    ranges: typing.ClassVar[dict[str, tuple[str, dict[str, int]]]] = {}
+
+    def lookups(self, _: typing.Any, model: typing.Any) -> list[tuple[str, str]]:  # noqa: ANN401, ARG002
+        """Return the ranges to choose from."""
+        return [(value, label) for value, (label, _bounds) in self.ranges.items()]
+
+    def queryset(self, _: typing.Any, queryset: QuerySet) -> QuerySet:  # noqa: ANN401
+        """Return the queryset limited to the selected range."""
+        if self.value() not in self.ranges:
+            return queryset
+        _label, bounds = self.ranges[self.value()]
+        return queryset.filter(**{
+            f"{self.field_name}__{lookup}": bound for lookup, bound in bounds.items()
+        })
+
+
+class BalanceRangeFilter(RangeListFilter):
     title = trans("Balance Range")
     parameter_name = "balance_range"
+    # The wallet row holds the total balance of sharded wallets too.
+    field_name = "balance"
+    ranges: typing.ClassVar = {
+        "<50": (trans("Less than 50"), {"lt": 50}),
+        "50-100": (trans("50 to 100"), {"gte": 50, "lte": 100}),
+        "100-500": (trans("100 to 500"), {"gt": 100, "lte": 500}),
+        "500+": (trans("More than 500"), {"gt": 500}),
+    }
+
+
+class AmountRangeFilter(RangeListFilter):
+    title = trans("Amount Range")
+    parameter_name = "amount_range"
+    field_name = "amount"
+    ranges: typing.ClassVar = {
+        "<0": (trans("Debits"), {"lt": 0}),
+        "0-100": (trans("0 to 100"), {"gte": 0, "lte": 100}),
+        "100-1000": (trans("100 to 1000"), {"gt": 100, "lte": 1000}),
+        "1000+": (trans("More than 1000"), {"gt": 1000}),
+    }
+
+
+class WalletIdFilter(admin.SimpleListFilter):
+    """Filter on a wallet typed in by its id, instead of listing every wallet."""
+
+    title = trans("Wallet ID")
+    parameter_name = "wallet_id"
+    template = "admin/wallet/input_filter.html"
 
     def lookups(self, _: typing.Any, model: typing.Any) -> list[tuple[str, str]]:  # noqa: ANN401, ARG002, PLR6301
-        """Return the balance range lookups."""
-        return [
-            ("<50", trans("Less than 50")),
-            ("50-100", trans("50 to 100")),
-            ("100-500", trans("100 to 500")),
-            ("500+", trans("More than 500")),
-        ]
+        """Return no choices, the wallet id is typed in."""
+        return []
+
+    def has_output(self) -> bool:  # noqa: PLR6301
+        """Return that the input is always shown."""
+        return True
+
+    def choices(self, changelist: typing.Any) -> typing.Iterator[dict]:  # noqa: ANN401
+        """Return the current value and the parameters the input keeps."""
+        yield {
+            "value": self.value() or "",
+            "selected": self.value() is None,
+            "hidden_params": [
+                (name, value)
+                for name, values in changelist.filter_params.items()
+                if name != self.parameter_name
+                for value in values
+            ],
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+        }
 
     def queryset(self, _: typing.Any, queryset: QuerySet) -> QuerySet:  # noqa: ANN401
-        """Return the queryset based on the balance range."""
+        """Return the transactions of the wallet, none for an invalid id."""
         value = self.value()
-        if value == "<50":
-            return queryset.filter(balance__lt=50)
-        if value == "50-100":
-            return queryset.filter(balance__gte=50, balance__lte=100)
-        if value == "100-500":
-            return queryset.filter(balance__gt=100, balance__lte=500)
-        if value == "500+":
-            return queryset.filter(balance__gt=500)
-        return queryset
+        if value is None:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(wallet_id=int(value))
+
+
+class ScalableAdminMixin:
+    """
+    Changelist that stays fast on tables of hundreds of millions of rows.
+
+    Pages are counted by ``EstimatedCountPaginator``, without the count of the
+    whole table next to a filtered one nor facet counts. A numeric search
+    matches ``search_id_fields`` exactly, through their indexes, and
+    ``search_fields`` should only use indexed ``^`` prefix or ``=`` lookups.
+    Selecting a ``RangeListFilter`` orders the list along its index.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    search_id_fields: tuple[str, ...] = ("id",)
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> tuple[QuerySet, bool]:
+        """Also match the id fields exactly when the search is a number."""
+        results, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        term = search_term.strip()
+        if term.isdigit() and self.search_id_fields:
+            results |= queryset.filter(
+                Q.create(
+                    [(field, int(term)) for field in self.search_id_fields],
+                    connector=Q.OR,
+                )
+            )
+        return results, may_have_duplicates
+
+    def get_ordering(self, request: HttpRequest) -> list[str] | tuple[str, ...]:
+        """Order by the field of a selected range filter, then by id."""
+        for list_filter in self.list_filter:
+            if (
+                isinstance(list_filter, type)
+                and issubclass(list_filter, RangeListFilter)
+                and list_filter.parameter_name in request.GET
+            ):
+                return (list_filter.field_name, "id")
+        return super().get_ordering(request)
 
 
 @admin.register(Wallet)
-class WalletAdmin(admin.ModelAdmin):
+class WalletAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("id", "label", "balance")
-    search_fields = ("id", "label")
-    list_filter = ("label", BalanceRangeFilter)
-    ordering = ("id", "label", "balance")
+    search_fields = ("^label",)
+    list_filter = (BalanceRangeFilter,)
+    ordering = ("id",)
+    hot_wallets_limit = 50
+    hot_wallets_captions: typing.ClassVar = {
+        contention.WAIT_SECONDS: trans("Lock wait time (seconds)"),
+        contention.NOWAIT_FAILURES: trans("NOWAIT lock failures"),
+        contention.LOCK_CONFLICTS: trans("Deadlocks and lock wait timeouts"),
+    }
+
+    def get_urls(self) -> list[URLPattern]:
+        """Add the hot wallets report to the wallet admin URLs."""
+        return [
+            path(
+                "hot-wallets/",
+                self.admin_site.admin_view(self.hot_wallets_view),
+                name="wallet_wallet_hot_wallets",
+            ),
+            *super().get_urls(),
+        ]
+
+    def hot_wallets_view(self, request: HttpRequest) -> TemplateResponse:
+        """Show the wallets with the most lock contention in this process."""
+        report = contention.get_profile().report(self.hot_wallets_limit)
+        wallet_pks = {
+            row["wallet"] for metric in contention.METRICS for row in report[metric]
+        }
+        labels = {
+            pk: wallet.label
+            for pk, wallet in Wallet.objects.in_bulk(wallet_pks).items()
+        }
+        tables = [
+            (
+                caption,
+                [{**row, "label": labels.get(row["wallet"])} for row in report[metric]],
+            )
+            for metric, caption in self.hot_wallets_captions.items()
+        ]
+        return TemplateResponse(
+            request,
+            "admin/wallet/wallet/hot_wallets.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": trans("Hot wallets"),
+                "opts": self.model._meta,  # noqa: SLF001
+                "report": report,
+                "tables": tables,
+            },
+        )
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("id", "txid", "wallet", "amount")
-    search_fields = ("id", "txid", "wallet__label", "wallet__id")
-    list_filter = ("wallet", "amount")
-    ordering = ("id", "txid", "wallet", "amount")
+    list_select_related = ("wallet",)
+    search_fields = ("^txid",)
+    search_id_fields = ("id", "wallet_id")
+    list_filter = (WalletIdFilter, AmountRangeFilter)
+    autocomplete_fields = ("wallet",)
+    ordering = ("id",)
 
     def wallet(self, obj: Transaction) -> str:  # noqa: PLR6301
         """Return the wallet label."""
         return obj.wallet.label
 
-    wallet.admin_order_field = "wallet__label"
+    # Sorting by label would sort the whole table, the wallet id is indexed.
+    wallet.admin_order_field = "wallet_id"
     wallet.short_description = "Wallet Label"
@@ -0,0 +1,147 @@
+import random
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import F, Func, Max, Min, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import ArchivedTransaction, Transaction, WalletStats
+
+
+@dataclass
+class _StatsChange:
+    """The net change of the stats of one wallet."""
+
+    count: int = 0
+    credits: Decimal = Decimal(0)
+    debits: Decimal = Decimal(0)
+    min_amount: Decimal | None = None
+    max_amount: Decimal | None = None
+
+    def add(self, amount: Decimal) -> None:
+        """Count a created transaction."""
+        self.count += 1
+        if amount > 0:
+            self.credits += amount
+        else:
+            self.debits += amount
+        self.min_amount = (
+            amount if self.min_amount is None else min(self.min_amount, amount)
+        )
+        self.max_amount = (
+            amount if self.max_amount is None else max(self.max_amount, amount)
+        )
+
+    def remove(self, amount: Decimal) -> None:
+        """Uncount a deleted transaction."""
+        self.count -= 1
+        if amount > 0:
+            self.credits -= amount
+        else:
+            self.debits -= amount
+
+    def updates(self) -> dict:
+        """Return the update expressions applying the change to a stats row."""
+        updates = {
+            "transaction_count": F("transaction_count") + self.count,
+            "total_credits": F("total_credits") + self.credits,
+            "total_debits": F("total_debits") + self.debits,
+        }
+        if self.min_amount is not None:
+            low, high = Value(self.min_amount), Value(self.max_amount)
+            updates["min_amount"] = Least(Coalesce("min_amount", low), low)
+            updates["max_amount"] = Greatest(Coalesce("max_amount", high), high)
+        return updates
+
+
+def _apply(wallet_pk: int, index: int, change: _StatsChange) -> None:
+    rows = WalletStats.objects.filter(wallet_id=wallet_pk, index=index)
+    if not rows.update(**change.updates()):
+        WalletStats.objects.bulk_create(
+            [WalletStats(wallet_id=wallet_pk, index=index)], ignore_conflicts=True
+        )
+        rows.update(**change.updates())
+
+
+def _bound(wallet_pk: int, ordering: str) -> Func:
+    """Return the first amount of the wallet in ``ordering``, archive included."""
+    hot, archived = (
+        Subquery(
+            model.objects.filter(wallet_id=wallet_pk)
+            .order_by(ordering)
+            .values("amount")[:1]
+        )
+        for model in (Transaction, ArchivedTransaction)
+    )
+    pick = Greatest if ordering.startswith("-") else Least
+    return pick(Coalesce(hot, archived), Coalesce(archived, hot))
+
+
+def _refresh_bounds(wallet_pk: int, amount: Decimal) -> None:
+    """Look up again the bounds that may have been the removed amount."""
+    WalletStats.objects.filter(wallet_id=wallet_pk, min_amount=amount).update(
+        min_amount=_bound(wallet_pk, "amount")
+    )
+    WalletStats.objects.filter(wallet_id=wallet_pk, max_amount=amount).update(
+        max_amount=_bound(wallet_pk, "-amount")
+    )
+
+
+def record_changes(
+    added: Iterable[tuple[int, Decimal]] = (),
+    removed: Iterable[tuple[int, Decimal]] = (),
+    shard_counts: Mapping[int, int] | None = None,
+) -> None:
+    """
+    Apply created and deleted transactions to the stats of their wallets.
+
+    Must run in the atomic block that writes the transaction rows, after the
+    rows are written. Counts and totals are moved with one UPDATE per wallet,
+    on a random one of ``shard_count`` rows for a sharded wallet. Removing an
+    amount that was a bound of the wallet looks the bound up again on the
+    ``(wallet, amount)`` indexes of the transactions and of the archive, so no
+    path reads the whole history.
+    """
+    shard_counts = shard_counts or {}
+    removed = list(removed)
+    changes: dict[int, _StatsChange] = {}
+    for wallet_pk, amount in added:
+        changes.setdefault(wallet_pk, _StatsChange()).add(amount)
+    for wallet_pk, amount in removed:
+        changes.setdefault(wallet_pk, _StatsChange()).remove(amount)
+
+    for wallet_pk in sorted(changes):
+        index = random.randrange(max(shard_counts.get(wallet_pk, 0), 1))  # noqa: S311
+        _apply(wallet_pk, index, changes[wallet_pk])
+    for wallet_pk, amount in removed:
+        _refresh_bounds(wallet_pk, amount)
+
+
+def wallet_stats(wallet_pks: Iterable[int]) -> dict[int, dict]:
+    """Return the stats of the wallets with a single grouped query."""
+    stats = {
+        wallet_pk: {
+            "transaction_count": 0,
+            "total_credits": Decimal(0),
+            "total_debits": Decimal(0),
+            "min_amount": None,
+            "max_amount": None,
+        }
+        for wallet_pk in wallet_pks
+    }
+    rows = (
+        WalletStats.objects.filter(wallet_id__in=stats)
+        .order_by()
+        .values("wallet_id")
+        .annotate(
+            transaction_count=Sum("transaction_count"),
+            total_credits=Sum("total_credits"),
+            total_debits=Sum("total_debits"),
+            min_amount=Min("min_amount"),
+            max_amount=Max("max_amount"),
+        )
+    )
+    for row in rows:
+        stats[row.pop("wallet_id")] = row
+    return stats
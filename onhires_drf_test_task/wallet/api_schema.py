@@ -0,0 +1,117 @@
+import functools
+import hashlib
+import logging
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.views.decorators.http import etag, require_safe
+from rest_framework import permissions
+
+logger = logging.getLogger(__name__)
+
+TITLE = "API Documentation"
+VERSION = "v1"
+
+
+class Schema(NamedTuple):
+    """An OpenAPI document ready to be served."""
+
+    content: bytes
+    etag: str
+
+
+@functools.cache
+def schema_view_class() -> type:
+    """
+    Return the drf-yasg schema view, importing drf-yasg on first use.
+
+    drf-yasg and its validators take a noticeable share of a worker boot, and
+    only the documentation needs them.
+    """
+    from drf_yasg import openapi  # noqa: PLC0415
+    from drf_yasg.views import get_schema_view  # noqa: PLC0415
+
+    return get_schema_view(
+        openapi.Info(title=TITLE, default_version=VERSION),
+        public=True,
+        permission_classes=[permissions.AllowAny],
+    )
+
+
+def generate_schema() -> bytes:
+    """
+    Return the OpenAPI document of the API as JSON.
+
+    It is generated without a request, so it names no host and the Swagger UI
+    sends its requests to the host it was loaded from.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson  # noqa: PLC0415
+    from drf_yasg.openapi import Info  # noqa: PLC0415
+
+    view_class = schema_view_class()
+    generator = view_class.generator_class(
+        Info(title=TITLE, default_version=VERSION), VERSION
+    )
+    document = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(document)
+
+
+_schema_lock = threading.Lock()
+
+
+@functools.cache
+def _load_schema(path: str) -> Schema:
+    content = None
+    if path:
+        try:
+            content = Path(path).read_bytes()
+        except OSError:
+            logger.warning("API schema file %s is unreadable, generating it.", path)
+    if content is None:
+        content = generate_schema()
+    return Schema(content, hashlib.sha256(content).hexdigest()[:32])
+
+
+def get_schema() -> Schema:
+    """
+    Return the schema of this process, loaded or generated on first use.
+
+    It is read from ``API_SCHEMA_FILE`` when set, as written at build time by
+    the generate_api_schema command, and generated otherwise. Concurrent first
+    requests wait for a single generation.
+    """
+    with _schema_lock:
+        return _load_schema(settings.API_SCHEMA_FILE)
+
+
+def reset() -> None:
+    """Drop the schema of this process, so the next request loads it again."""
+    with _schema_lock:
+        _load_schema.cache_clear()
+
+
+@require_safe
+@etag(lambda request: get_schema().etag)  # noqa: ARG005
+def schema_json_view(request: HttpRequest) -> HttpResponse:  # noqa: ARG001
+    """Serve the OpenAPI document, answering 304 to a matching ETag."""
+    response = HttpResponse(get_schema().content, content_type="application/json")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+@functools.cache
+def _swagger_ui_view() -> Callable:
+    from drf_yasg.renderers import SwaggerUIRenderer  # noqa: PLC0415
+
+    # Only the HTML renderer: the document itself is served by
+    # schema_json_view, never generated per request.
+    return schema_view_class().as_view(renderer_classes=[SwaggerUIRenderer])
+
+
+def swagger_ui_view(request: HttpRequest) -> HttpResponse:
+    """Serve the Swagger UI, which loads the document from ``api-schema``."""
+    return _swagger_ui_view()(request)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class WalletConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wallet"
+
+    def ready(self) -> None:  # noqa: PLR6301
+        """Connect the signal receivers and register the full-text lookup."""
+        from django.db.models import CharField  # noqa: PLC0415
+
+        from . import signals  # noqa: F401, PLC0415
+        from .lookups import FullTextMatch  # noqa: PLC0415
+
+        CharField.register_lookup(FullTextMatch)
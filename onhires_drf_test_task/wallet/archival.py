@@ -0,0 +1,189 @@
+import datetime
+import json
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import caching, pagination, versions
+from .models import ArchivedTransaction, Transaction, Wallet
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE = 0.1
+WALLET_CHUNK_SIZE = 1000
+
+ARCHIVED_FIELDS = ["id", "txid", "amount", "wallet_id", "created_at"]
+
+
+@dataclass(frozen=True)
+class ArchivePolicy:
+    """
+    Which transactions of a wallet are archived.
+
+    ``before`` selects transactions created before it, ``keep_latest`` the
+    ones beyond the newest ``keep_latest`` of the wallet. With both set a
+    transaction must match both to be archived.
+    """
+
+    before: datetime.datetime | None = None
+    keep_latest: int | None = None
+
+    def criteria(self, wallet_pk: int) -> Q | None:
+        """Return the condition selecting the archived transactions of a wallet."""
+        criteria = Q()
+        if self.before is not None:
+            criteria &= Q(created_at__lt=self.before)
+        if self.keep_latest:
+            # The oldest kept transaction is found on the (wallet, created_at,
+            # id) index; every transaction before its key is archived.
+            kept = (
+                Transaction.objects.filter(wallet_id=wallet_pk)
+                .order_by("-created_at", "-id")
+                .values_list("created_at", "id")
+            )
+            oldest_kept = next(
+                iter(kept[self.keep_latest - 1 : self.keep_latest]), None
+            )
+            if oldest_kept is None:
+                return None
+            criteria &= pagination.keyset_after(
+                "created_at", *oldest_kept, descending=True
+            )
+        return criteria
+
+    def to_json(self) -> dict:
+        """Return the policy as stored in a checkpoint."""
+        state = asdict(self)
+        if self.before is not None:
+            state["before"] = self.before.isoformat()
+        return state
+
+
+class ArchiveCheckpoint:
+    """The last wallet completed by an archival run, stored as JSON."""
+
+    def __init__(self, path: Path | None, policy: ArchivePolicy) -> None:
+        """Load the position of a previous run with the same policy."""
+        self.path = path
+        self.policy = policy
+        self.wallet_pk = 0
+        if path is not None and path.exists():
+            state = json.loads(path.read_text())
+            if state.get("policy") == policy.to_json():
+                self.wallet_pk = state["wallet"]
+
+    def mark(self, wallet_pk: int) -> None:
+        """Record a completed wallet and persist the checkpoint."""
+        self.wallet_pk = wallet_pk
+        if self.path is None:
+            return
+        state = {"policy": self.policy.to_json(), "wallet": wallet_pk}
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        tmp_path.write_text(json.dumps(state))
+        tmp_path.replace(self.path)
+
+
+def _wallet_pks(after: int) -> Iterator[int]:
+    """Yield the wallet ids above ``after`` in order, reading them in chunks."""
+    while True:
+        chunk = list(
+            Wallet.objects.filter(pk__gt=after)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:WALLET_CHUNK_SIZE]
+        )
+        yield from chunk
+        if len(chunk) < WALLET_CHUNK_SIZE:
+            return
+        after = chunk[-1]
+
+
+def move_batch(wallet_pk: int, ids: list[int], criteria: Q) -> int:
+    """
+    Move transactions of a wallet to the archive and return how many moved.
+
+    The wallet row is written first, as every transaction write does, which
+    moves its version so cached list ETags change. The rows are then locked
+    and checked again, so a transaction changed or moved to another wallet
+    since it was selected is left alone. Balances are not touched: a moved
+    transaction still counts in the ledger of its wallet.
+    """
+    with transaction.atomic():
+        Wallet.objects.filter(pk=wallet_pk).update(version=versions.bump_version())
+        rows = list(
+            Transaction.objects.select_for_update()
+            .filter(criteria, pk__in=ids, wallet_id=wallet_pk)
+            .values(*ARCHIVED_FIELDS)
+        )
+        ArchivedTransaction.objects.bulk_create(
+            ArchivedTransaction(**row) for row in rows
+        )
+        Transaction.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+        caching.invalidate_wallets(wallet_pk)
+    return len(rows)
+
+
+def archive_wallet(
+    wallet_pk: int,
+    policy: ArchivePolicy,
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = DEFAULT_PAUSE,
+    on_batch: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Archive the transactions of a wallet selected by the policy.
+
+    Candidates are read in primary key order, ``batch_size`` at a time, each
+    batch moved in its own short transaction followed by a ``pause`` of that
+    many seconds. Returns the number of moved transactions.
+    """
+    criteria = policy.criteria(wallet_pk)
+    if criteria is None:
+        return 0
+
+    moved, last_pk = 0, 0
+    while True:
+        ids = list(
+            Transaction.objects.filter(criteria, wallet_id=wallet_pk, pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return moved
+        count = move_batch(wallet_pk, ids, criteria)
+        moved += count
+        last_pk = ids[-1]
+        if on_batch is not None:
+            on_batch(wallet_pk, count)
+        if len(ids) < batch_size:
+            return moved
+        time.sleep(pause)
+
+
+def archive_transactions(
+    policy: ArchivePolicy,
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = DEFAULT_PAUSE,
+    checkpoint_path: Path | None = None,
+    on_batch: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Archive the transactions selected by the policy, wallet by wallet.
+
+    Wallets are walked in primary key order and every completed wallet is
+    written to ``checkpoint_path``, so an interrupted run with the same policy
+    resumes after the last completed wallet. Returns the number of moved
+    transactions.
+    """
+    checkpoint = ArchiveCheckpoint(checkpoint_path, policy)
+    moved = 0
+    for wallet_pk in _wallet_pks(checkpoint.wallet_pk):
+        moved += archive_wallet(
+            wallet_pk, policy, batch_size=batch_size, pause=pause, on_batch=on_batch
+        )
+        checkpoint.mark(wallet_pk)
+    return moved
@@ -0,0 +1,79 @@
+import functools
+import threading
+import typing
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse
+from django.views import View
+
+from . import metrics
+
+_executor_lock = threading.Lock()
+
+
+@functools.cache
+def _build_executor(workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wallet-reads")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process wide executor running the async reads."""
+    with _executor_lock:
+        return _build_executor(settings.WALLET_ASYNC_READ_WORKERS)
+
+
+def serve(view: Callable, request: HttpRequest, kwargs: dict) -> HttpResponse:
+    """
+    Run a synchronous read view and return its response rendered and detached.
+
+    Connections are checked before and closed after as Django does around a
+    request, honouring ``CONN_MAX_AGE``, so an executor thread keeps at most
+    one of them. The response is copied into a plain one, which the handler
+    sends without rendering it on a thread of its own.
+    """
+    close_old_connections()
+    try:
+        with metrics.collecting_queries(request):
+            response = view(request, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+    finally:
+        close_old_connections()
+    detached = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        detached[header] = value
+    detached.cookies = response.cookies
+    return detached
+
+
+class AsyncReadView(View):
+    """
+    Serve a read action of a viewset from the event loop.
+
+    Django's async ORM runs every query on a thread bound to the request until
+    its response has been sent, so a slow client would hold that thread and
+    its database connection. Here the whole action, from filtering to
+    rendering, runs on ``WALLET_ASYNC_READ_WORKERS`` threads and the response
+    is sent from the event loop, which waits on any number of clients. The
+    filtering, pagination, ETags and response cache are those of the
+    synchronous endpoint. Writes are served by the synchronous endpoints only.
+    """
+
+    http_method_names: typing.ClassVar[list[str]] = ["get", "head", "options"]
+    viewset_view: Callable | None = None
+
+    @classmethod
+    def for_action(cls, viewset: type, action: str) -> Callable:
+        """Return the view serving ``action`` of ``viewset`` asynchronously."""
+        view = cls.as_view(viewset_view=viewset.as_view({"get": action}))
+        view.metrics_name = f"async:{viewset.__name__}.{action}"
+        return view
+
+    async def get(self, request: HttpRequest, **kwargs: typing.Any) -> HttpResponse:  # noqa: ANN401
+        """Run the action on the read executor."""
+        read = sync_to_async(serve, thread_sensitive=False, executor=get_executor())
+        return await read(self.viewset_view, request, kwargs)
@@ -0,0 +1,15 @@
+from django.db.backends.mysql import base
+
+from wallet.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """MySQL backend taking its connections from a pool kept per process."""
+
+    def check_pooled_connection(self, connection: object) -> bool:
+        """Return whether an idle connection still answers a ping."""
+        try:
+            connection.ping(False)  # noqa: FBT003
+        except self.Database.Error:
+            return False
+        return True
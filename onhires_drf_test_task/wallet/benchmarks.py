@@ -0,0 +1,655 @@
+import asyncio
+import functools
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+import typing
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from decimal import Decimal
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import got_request_exception
+from django.db import connection, connections, OperationalError
+from django.utils import timezone
+
+from . import aggregates, caching, reconciliation, serializers, services
+from .models import Transaction, Wallet
+
+SCENARIOS = ("uniform", "hot", "mixed", "deep_pagination", "bulk_filters")
+
+LABEL_PREFIX = "loadbench-"
+SEED_AMOUNT = Decimal("1000000.00")
+HISTORY_AMOUNT = Decimal("0.01")
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+LOCKED_MESSAGE = serializers.WALLET_LOCKED_MESSAGE.encode()
+
+OK = "ok"
+LOCK_ERROR = "lock_error"
+REJECTED = "rejected"
+SERVER_ERROR = "server_error"
+
+
+@dataclass(frozen=True)
+class LoadPlan:
+    """
+    What a benchmark run sends, and the wallets it sends it to.
+
+    ``requests`` are split evenly over ``processes`` times ``threads``
+    workers. ``history`` transactions are created up front on the first
+    wallet, which the pagination and filter scenarios read.
+    """
+
+    scenario: str
+    requests: int = 1000
+    threads: int = 4
+    processes: int = 1
+    wallets: int = 100
+    history: int = 1000
+    read_ratio: float = 0.8
+    shard_count: int = 0
+    seed: int = 0
+    host: str = "localhost"
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    wallet_pks: tuple[int, ...] = ()
+    started_at: str = ""
+
+    @property
+    def workers(self) -> int:
+        """Return the number of workers over every process."""
+        return self.processes * self.threads
+
+    def share(self, worker: int) -> int:
+        """Return the number of requests sent by a worker."""
+        base, remainder = divmod(self.requests, self.workers)
+        return base + (worker < remainder)
+
+
+@dataclass
+class WorkerResult:
+    """Samples of one or more workers and the amounts acknowledged to them."""
+
+    samples: list[tuple[str, str, float]] = field(default_factory=list)
+    acknowledged: defaultdict[int, Decimal] = field(
+        default_factory=functools.partial(defaultdict, Decimal)
+    )
+
+    def merge(self, other: "WorkerResult") -> None:
+        """Add the samples and amounts of another result."""
+        self.samples += other.samples
+        for wallet_pk, amount in other.acknowledged.items():
+            self.acknowledged[wallet_pk] += amount
+
+
+def wsgi_environ(  # noqa: PLR0913
+    plan: LoadPlan,
+    method: str,
+    path: str,
+    query: str = "",
+    *,
+    body: bytes = b"",
+    accept: str = JSON,
+) -> dict:
+    """Return the WSGI environ of a request, as a threaded server builds it."""
+    return {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": plan.host,
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": plan.host,
+        "HTTP_ACCEPT": accept,
+        "CONTENT_TYPE": JSON,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": plan.threads > 1,
+        "wsgi.multiprocess": plan.processes > 1,
+        "wsgi.run_once": False,
+    }
+
+
+def asgi_scope(plan: LoadPlan, path: str, query: str = "") -> dict:
+    """Return the ASGI scope of a GET request, as an ASGI server builds it."""
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", plan.host.encode()), (b"accept", JSON.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": (plan.host, 80),
+    }
+
+
+_exceptions = threading.local()
+
+
+def _remember_exception(**kwargs: object) -> None:  # noqa: ARG001
+    """Keep the exception of a failed request for the worker that sent it."""
+    _exceptions.last = sys.exc_info()[1]
+
+
+class Worker:
+    """
+    Send the requests of a scenario through the full WSGI stack.
+
+    Requests go through Django's ``WSGIHandler``, the one a WSGI server
+    calls, so middleware, routing, views and rendering all run as served.
+    """
+
+    def __init__(self, plan: LoadPlan, handler: WSGIHandler, index: int) -> None:
+        """Prepare the worker with its own random sequence."""
+        self.plan = plan
+        self.handler = handler
+        self.index = index
+        self.rng = random.Random(f"{plan.seed}-{index}")  # noqa: S311
+        self.sent = 0
+        self.cursor_path: str | None = None
+        self.result = WorkerResult()
+
+    def run(self) -> WorkerResult:
+        """Send the share of requests of this worker."""
+        scenario = getattr(self, f"scenario_{self.plan.scenario}")
+        try:
+            for _ in range(self.plan.share(self.index)):
+                scenario()
+        finally:
+            connections.close_all()
+        return self.result
+
+    def call(  # noqa: PLR0913
+        self,
+        operation: str,
+        method: str,
+        path: str,
+        query: str = "",
+        *,
+        body: bytes = b"",
+        accept: str = JSON,
+    ) -> tuple[int, bytes]:
+        """Send a request, record its latency and outcome, return the response."""
+        self.sent += 1
+        environ = wsgi_environ(self.plan, method, path, query, body=body, accept=accept)
+        statuses = []
+        _exceptions.last = None
+
+        start = time.perf_counter()
+        response = self.handler(
+            environ, lambda status, *_: statuses.append(int(status.split()[0]))
+        )
+        try:
+            content = b"".join(response)
+        finally:
+            response.close()
+        latency = time.perf_counter() - start
+
+        status = statuses[0]
+        self.result.samples.append((operation, self.outcome(status, content), latency))
+        return status, content
+
+    @staticmethod
+    def outcome(status: int, content: bytes) -> str:
+        """Classify a response, telling failed locks from other errors."""
+        exc = _exceptions.last
+        if isinstance(exc, OperationalError) and services.is_lock_conflict(exc):
+            return LOCK_ERROR
+        if status < 400:  # noqa: PLR2004
+            return OK
+        if status >= 500:  # noqa: PLR2004
+            return SERVER_ERROR
+        # A wallet still locked after the retries is answered with a 400.
+        if LOCKED_MESSAGE in content:
+            return LOCK_ERROR
+        return REJECTED
+
+    def write(self, wallet_pk: int) -> None:
+        """Create a transaction, a credit or a smaller debit."""
+        cents = self.rng.randint(1, 10_000)
+        if self.rng.random() < 0.4:  # noqa: PLR2004
+            cents = -self.rng.randint(1, 5_000)
+        amount = Decimal(cents) / 100
+        body = json.dumps({
+            "txid": f"{self.plan.run_id}-{self.index}-{self.sent}",
+            "wallet": wallet_pk,
+            "amount": str(amount),
+        }).encode()
+        status, _ = self.call(
+            "create_transaction", "POST", "/api/transactions/", body=body
+        )
+        if status == 201:  # noqa: PLR2004
+            self.result.acknowledged[wallet_pk] += amount
+
+    def random_wallet(self) -> int:
+        """Return one of the benchmark wallets."""
+        return self.rng.choice(self.plan.wallet_pks)
+
+    def scenario_uniform(self) -> None:
+        """Write to a wallet picked uniformly."""
+        self.write(self.random_wallet())
+
+    def scenario_hot(self) -> None:
+        """Write to the same wallet every time."""
+        self.write(self.plan.wallet_pks[0])
+
+    def scenario_mixed(self) -> None:
+        """Read a wallet or its transactions, or write to it."""
+        wallet_pk = self.random_wallet()
+        if self.rng.random() >= self.plan.read_ratio:
+            self.write(wallet_pk)
+        elif self.rng.random() < 0.5:  # noqa: PLR2004
+            self.call("retrieve_wallet", "GET", f"/api/wallets/{wallet_pk}/")
+        else:
+            query = urlencode({"wallet": wallet_pk, "ordering": "-created_at"})
+            self.call("list_transactions", "GET", "/api/transactions/", query)
+
+    def scenario_deep_pagination(self) -> None:
+        """Read a deep offset page or the next keyset page of the history."""
+        wallet_pk = self.plan.wallet_pks[0]
+        params = {"wallet": wallet_pk, "ordering": "-created_at"}
+        if self.sent % 2:
+            pages = max(self.plan.history // settings.REST_FRAMEWORK["PAGE_SIZE"], 1)
+            params["page"] = self.rng.randint(max(pages // 2, 1), pages)
+            self.call("offset_page", "GET", "/api/transactions/", urlencode(params))
+            return
+
+        if self.cursor_path is None:
+            path, query = (
+                "/api/transactions/",
+                urlencode({
+                    **params,
+                    "pagination": "cursor",
+                }),
+            )
+        else:
+            url = urlsplit(self.cursor_path)
+            path, query = url.path, url.query
+        status, content = self.call("keyset_page", "GET", path, query)
+        self.cursor_path = json.loads(content).get("next") if status == 200 else None  # noqa: PLR2004
+
+    def scenario_bulk_filters(self) -> None:
+        """Read filters matching many rows, or export the history."""
+        choice = self.rng.randrange(3)
+        if choice == 0:
+            query = urlencode({
+                "created_after": self.plan.started_at,
+                "ordering": "-created_at",
+            })
+            self.call("filter_transactions", "GET", "/api/transactions/", query)
+        elif choice == 1:
+            query = urlencode({"balance_min": 0})
+            self.call("filter_wallets", "GET", "/api/wallets/", query)
+        else:
+            query = urlencode({"wallet": self.plan.wallet_pks[0]})
+            self.call(
+                "export_transactions",
+                "GET",
+                "/api/transactions/export/",
+                query,
+                accept=NDJSON,
+            )
+
+
+def run_process(plan: LoadPlan, process: int) -> WorkerResult:
+    """Run the threads of one process and merge their results."""
+    handler = WSGIHandler()
+    got_request_exception.connect(_remember_exception, dispatch_uid=__name__)
+    first = process * plan.threads
+    result = WorkerResult()
+    with ThreadPoolExecutor(max_workers=plan.threads) as pool:
+        for worker_result in pool.map(
+            lambda index: Worker(plan, handler, index).run(),
+            range(first, first + plan.threads),
+        ):
+            result.merge(worker_result)
+    return result
+
+
+def prepare(plan: LoadPlan) -> LoadPlan:
+    """Create and fund the benchmark wallets and the history of the first one."""
+    wallet_pks = []
+    for index in range(plan.wallets):
+        wallet = Wallet.objects.create(
+            label=f"{LABEL_PREFIX}{plan.run_id}-{index}", balance=Decimal(0)
+        )
+        wallet_pks.append(wallet.pk)
+    started_at = timezone.now()
+
+    items = [
+        {"txid": f"{plan.run_id}-seed-{pk}", "wallet": pk, "amount": SEED_AMOUNT}
+        for pk in wallet_pks
+    ]
+    items += [
+        {
+            "txid": f"{plan.run_id}-history-{index}",
+            "wallet": wallet_pks[0],
+            "amount": HISTORY_AMOUNT,
+        }
+        for index in range(plan.history)
+    ]
+    batch_size = serializers.BulkTransactionSerializer.MAX_ITEMS
+    for start in range(0, len(items), batch_size):
+        services.ingest_transactions(items[start : start + batch_size])
+
+    if plan.shard_count:
+        for pk in wallet_pks:
+            services.shard_wallet(pk, plan.shard_count)
+    return replace(
+        plan, wallet_pks=tuple(wallet_pks), started_at=started_at.isoformat()
+    )
+
+
+def cleanup(plan: LoadPlan) -> None:
+    """Delete the benchmark wallets and their transactions."""
+    Transaction.objects.filter(wallet_id__in=plan.wallet_pks).delete()
+    Wallet.objects.filter(pk__in=plan.wallet_pks).delete()
+    caching.invalidate_wallets(*plan.wallet_pks)
+
+
+def check_invariants(plan: LoadPlan, acknowledged: dict[int, Decimal]) -> dict:
+    """
+    Check the benchmark wallets once the load is over.
+
+    Every balance must equal the sum of its transactions, the funding plus
+    the amounts acknowledged to the clients, and its stats must count every
+    transaction.
+    """
+    ledger = reconciliation.ledger_totals(wallet_id__in=plan.wallet_pks)
+    counts = Counter(
+        Transaction.objects.filter(wallet_id__in=plan.wallet_pks).values_list(
+            "wallet_id", flat=True
+        )
+    )
+    stats = aggregates.wallet_stats(plan.wallet_pks)
+    checks = Counter(ledger_drifts=0, acknowledged_mismatches=0, stats_mismatches=0)
+    for wallet in Wallet.objects.filter(pk__in=plan.wallet_pks):
+        balance = wallet.balance
+        expected = SEED_AMOUNT + acknowledged.get(wallet.pk, Decimal(0))
+        if wallet.pk == plan.wallet_pks[0]:
+            expected += HISTORY_AMOUNT * plan.history
+        checks["ledger_drifts"] += balance != ledger.get(wallet.pk, Decimal(0))
+        checks["acknowledged_mismatches"] += balance != expected
+        checks["stats_mismatches"] += (
+            stats[wallet.pk]["transaction_count"] != counts[wallet.pk]
+        )
+    return {**checks, "ok": not any(checks.values())}
+
+
+def _milliseconds(latencies: list[float]) -> dict[str, float]:
+    """Return the latency percentiles, in milliseconds."""
+    if not latencies:
+        return {}
+    cuts = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 99
+    )
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+    }
+
+
+def summarize(plan: LoadPlan, result: WorkerResult, duration: float) -> dict:
+    """Return the machine-readable report of a scenario run."""
+    outcomes = Counter({OK: 0, LOCK_ERROR: 0, REJECTED: 0, SERVER_ERROR: 0})
+    by_operation = defaultdict(list)
+    for operation, outcome, latency in result.samples:
+        outcomes[outcome] += 1
+        by_operation[operation].append(latency)
+    total = len(result.samples)
+    return {
+        "scenario": plan.scenario,
+        "plan": {
+            key: value
+            for key, value in asdict(plan).items()
+            if key not in {"wallet_pks", "started_at", "scenario"}
+        },
+        "requests": total,
+        "duration_seconds": round(duration, 3),
+        "throughput": round(total / duration, 1) if duration else 0.0,
+        "latency_ms": _milliseconds([sample[2] for sample in result.samples]),
+        "outcomes": dict(outcomes),
+        "lock_error_rate": round(outcomes[LOCK_ERROR] / total, 4) if total else 0.0,
+        "operations": {
+            operation: {"requests": len(latencies), **_milliseconds(latencies)}
+            for operation, latencies in sorted(by_operation.items())
+        },
+    }
+
+
+def environment() -> dict:
+    """Return what a result depends on besides the plan, to compare releases."""
+    return {
+        "database": connection.vendor,
+        "write_mode": settings.WALLET_WRITE_MODE,
+        "submission_mode": settings.WALLET_SUBMISSION_MODE,
+        "django": django.get_version(),
+        "python": platform.python_version(),
+    }
+
+
+def run_scenario(plan: LoadPlan, *, keep: bool = False) -> dict:
+    """
+    Run a scenario on fresh wallets and return its report.
+
+    With more than one process the workers are forked, each running its
+    threads against its own connections. The wallets are deleted afterwards
+    unless ``keep`` is set.
+    """
+    plan = prepare(plan)
+    # Rejected and conflicting requests are expected under load; logging each
+    # of them would slow the run and bury the report.
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    start = time.perf_counter()
+    try:
+        if plan.processes <= 1:
+            result = run_process(plan, 0)
+        else:
+            # Connections must not be shared with the forked workers.
+            connections.close_all()
+            result = WorkerResult()
+            with ProcessPoolExecutor(
+                max_workers=plan.processes, initializer=django.setup
+            ) as pool:
+                for process_result in pool.map(
+                    run_process, [plan] * plan.processes, range(plan.processes)
+                ):
+                    result.merge(process_result)
+        duration = time.perf_counter() - start
+        report = summarize(plan, result, duration)
+        report["invariants"] = check_invariants(plan, result.acknowledged)
+    finally:
+        request_logger.setLevel(level)
+        if not keep:
+            cleanup(plan)
+    return report
+
+
+READ_INTERFACES = ("wsgi", "asgi")
+READ_PREFIXES = {"wsgi": "/api/", "asgi": "/api/async/"}
+
+
+def read_requests(plan: LoadPlan) -> list[tuple[str, str, str]]:
+    """Return the reads of a comparison, the same sequence for every path."""
+    rng = random.Random(plan.seed)  # noqa: S311
+    history_query = urlencode({"wallet": plan.wallet_pks[0], "ordering": "-created_at"})
+    reads = []
+    for _ in range(plan.requests):
+        choice = rng.randrange(3)
+        if choice == 0:
+            wallet_pk = rng.choice(plan.wallet_pks)
+            reads.append(("retrieve_wallet", f"wallets/{wallet_pk}/", ""))
+        elif choice == 1:
+            query = urlencode({"balance_min": 0})
+            reads.append(("list_wallets", "wallets/", query))
+        else:
+            reads.append(("list_transactions", "transactions/", history_query))
+    return reads
+
+
+class SlowReaders:
+    """
+    Clients reading their responses slowly, through the WSGI or ASGI handler.
+
+    Each of ``clients`` clients sends its share of the reads one after the
+    other and takes ``client_delay`` seconds to receive every body. Behind
+    WSGI a worker thread writes the body, so it is held for the whole delay
+    and the clients queue for ``plan.threads`` threads; behind ASGI the event
+    loop awaits the client and the async endpoints need threads only for the
+    database work.
+    """
+
+    def __init__(self, plan: LoadPlan, *, clients: int, client_delay: float) -> None:
+        """Prepare the clients and their reads."""
+        self.plan = plan
+        self.clients = clients
+        self.client_delay = client_delay
+        self.reads = read_requests(plan)
+        self.result = WorkerResult()
+        self.peak_threads = 0
+
+    def sample_threads(self) -> None:
+        """Keep the highest number of live threads seen."""
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def wsgi_read(self, handler: WSGIHandler, path: str, query: str) -> int:
+        """Serve a read on the calling thread, held until the client has it."""
+        statuses = []
+        environ = wsgi_environ(self.plan, "GET", path, query)
+        response = handler(
+            environ, lambda status, *_: statuses.append(int(status.split()[0]))
+        )
+        try:
+            b"".join(response)
+            self.sample_threads()
+            time.sleep(self.client_delay)
+        finally:
+            response.close()
+        return statuses[0]
+
+    async def asgi_read(self, handler: ASGIHandler, path: str, query: str) -> int:
+        """Serve a read on the event loop, waiting on the client to take it."""
+        statuses = []
+        received = False
+
+        async def receive() -> dict:
+            nonlocal received
+            if received:
+                # The client stays connected; the handler cancels this wait.
+                await asyncio.Event().wait()
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+            elif not message.get("more_body"):
+                self.sample_threads()
+                await asyncio.sleep(self.client_delay)
+
+        await handler(asgi_scope(self.plan, path, query), receive, send)
+        return statuses[0]
+
+    async def client(self, index: int, read: typing.Callable) -> None:
+        """Send the reads of one client one after the other."""
+        for operation, path, query in self.reads[index :: self.clients]:
+            start = time.perf_counter()
+            status = await read(path, query)
+            latency = time.perf_counter() - start
+            outcome = OK if status < 400 else REJECTED  # noqa: PLR2004
+            if status >= 500:  # noqa: PLR2004
+                outcome = SERVER_ERROR
+            self.result.samples.append((operation, outcome, latency))
+
+    async def run(self, interface: str) -> None:
+        """Run every client concurrently against one interface."""
+        prefix = READ_PREFIXES[interface]
+        if interface == "asgi":
+            asgi_handler = ASGIHandler()
+
+            async def read(path: str, query: str) -> int:
+                return await self.asgi_read(asgi_handler, prefix + path, query)
+
+            await asyncio.gather(*(self.client(i, read) for i in range(self.clients)))
+            return
+
+        wsgi_handler = WSGIHandler()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.plan.threads) as pool:
+
+            async def read(path: str, query: str) -> int:
+                return await loop.run_in_executor(
+                    pool, self.wsgi_read, wsgi_handler, prefix + path, query
+                )
+
+            await asyncio.gather(*(self.client(i, read) for i in range(self.clients)))
+            # Connections of the pool threads are not closed by a request.
+            for _ in range(self.plan.threads):
+                pool.submit(connections.close_all)
+
+
+def compare_read_paths(
+    plan: LoadPlan,
+    *,
+    clients: int,
+    client_delay: float,
+    interfaces: typing.Iterable[str] = READ_INTERFACES,
+    keep: bool = False,
+) -> list[dict]:
+    """
+    Send the same slow-client reads through the WSGI and ASGI paths.
+
+    The reads go to the synchronous endpoints under WSGI and to the async ones
+    under ASGI, on the same fresh wallets, and one report is returned per
+    interface with the peak number of threads of the process.
+    """
+    plan = prepare(plan)
+    reports = []
+    try:
+        for interface in interfaces:
+            readers = SlowReaders(plan, clients=clients, client_delay=client_delay)
+            start = time.perf_counter()
+            asyncio.run(readers.run(interface))
+            duration = time.perf_counter() - start
+            report = summarize(
+                replace(plan, scenario="slow_reads"), readers.result, duration
+            )
+            report.update(
+                interface=interface,
+                clients=clients,
+                client_delay=client_delay,
+                peak_threads=readers.peak_threads,
+            )
+            reports.append(report)
+    finally:
+        if not keep:
+            cleanup(plan)
+    return reports
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+WALLET_GENERATION_KEY = "wallet:generation:{}"
+LIST_GENERATION_KEY = "wallet:generation:list"
+DETAIL_RESPONSE_KEY = "wallet:response:detail:{}:{}"
+LIST_RESPONSE_KEY = "wallet:response:list:{}:{}"
+
+_stats = Counter(hits=0, misses=0, invalidations=0)
+_stats_lock = threading.Lock()
+
+
+def _record(event: str, count: int = 1) -> None:
+    with _stats_lock:
+        _stats[event] += count
+
+
+def stats() -> dict[str, int]:
+    """Return the hit, miss and invalidation counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def uses_response_cache() -> bool:
+    """Return whether wallet responses are cached."""
+    return settings.WALLET_RESPONSE_CACHE_TIMEOUT > 0
+
+
+def _generation(key: str) -> int:
+    generation = cache.get(key)
+    if generation is None:
+        # A counter recreated after eviction must not repeat an old value.
+        cache.add(key, time.time_ns())
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(keys: list[str]) -> None:
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def invalidate_wallets(*wallet_pks: int) -> None:
+    """
+    Bump the generations of the wallets and of the wallet list.
+
+    The generations are bumped right away and again once the surrounding
+    transaction commits, so a response computed from the uncommitted state is
+    never stored under the generation that follows the commit.
+    """
+    if not uses_response_cache():
+        return
+
+    keys = [WALLET_GENERATION_KEY.format(pk) for pk in wallet_pks]
+    keys.append(LIST_GENERATION_KEY)
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+    _record("invalidations", len(wallet_pks))
+
+
+def cached_response(
+    key: str,
+    load: Callable[[], Response],
+) -> Response:
+    """Return the cached data of a response, loading and caching it on a miss."""
+    data = cache.get(key)
+    if data is not None:
+        _record("hits")
+        return Response(data)
+
+    _record("misses")
+    response = load()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.WALLET_RESPONSE_CACHE_TIMEOUT)
+    return response
+
+
+def detail_key(wallet_pk: int) -> str:
+    """Return the response cache key of a wallet at its current generation."""
+    generation = _generation(WALLET_GENERATION_KEY.format(wallet_pk))
+    return DETAIL_RESPONSE_KEY.format(wallet_pk, generation)
+
+
+def list_key(request: Request) -> str:
+    """Return the response cache key of a wallet list page and its filters."""
+    generation = _generation(LIST_GENERATION_KEY)
+    digest = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return LIST_RESPONSE_KEY.format(generation, digest)
@@ -0,0 +1,121 @@
+import functools
+import heapq
+import threading
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.utils import timezone
+
+WAIT_SECONDS = "wait_seconds"
+NOWAIT_FAILURES = "nowait_failures"
+LOCK_CONFLICTS = "lock_conflicts"
+METRICS = (WAIT_SECONDS, NOWAIT_FAILURES, LOCK_CONFLICTS)
+
+
+class SpaceSaving:
+    """
+    Heaviest keys of a weighted stream, in memory bounded by ``capacity``.
+
+    The space-saving algorithm keeps at most ``capacity`` counters. A new key
+    arriving when all are taken replaces the smallest one and inherits its
+    count as ``error``, so a reported count overestimates the true one by at
+    most its error, and every key heavier than the smallest counter is kept.
+    The smallest counter is found on a heap with lazily dropped stale entries.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Start with no counters."""
+        self.capacity = capacity
+        self.counts: dict[int, float] = {}
+        self.errors: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []
+
+    def add(self, key: int, weight: float = 1) -> None:
+        """Add ``weight`` to the counter of ``key``."""
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            floor, evicted = self._pop_smallest()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_smallest(self) -> tuple[float, int]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def top(self, limit: int) -> list[tuple[int, float, float]]:
+        """Return up to ``limit`` ``(key, count, error)`` by decreasing count."""
+        keys = heapq.nlargest(limit, self.counts, key=self.counts.__getitem__)
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+
+class ContentionProfile:
+    """Heaviest wallets by lock wait time, NOWAIT failures and lock conflicts."""
+
+    def __init__(self, capacity: int) -> None:
+        """Start an empty profile keeping ``capacity`` wallets per metric."""
+        self.capacity = capacity
+        self.since = timezone.now()
+        self.sketches = {metric: SpaceSaving(capacity) for metric in METRICS}
+        self._lock = threading.Lock()
+
+    def add(self, metric: str, wallet_pks: Iterable[int], weight: float = 1) -> None:
+        """Add ``weight`` to every wallet of a lock request."""
+        sketch = self.sketches[metric]
+        with self._lock:
+            for wallet_pk in wallet_pks:
+                sketch.add(wallet_pk, weight)
+
+    def report(self, limit: int) -> dict:
+        """Return the ``limit`` heaviest wallets of every metric."""
+        with self._lock:
+            tops = {
+                metric: sketch.top(limit) for metric, sketch in self.sketches.items()
+            }
+        return {
+            "capacity": self.capacity,
+            "since": self.since,
+            **{
+                metric: [
+                    {"wallet": wallet_pk, "value": value, "error": error}
+                    for wallet_pk, value, error in top
+                ]
+                for metric, top in tops.items()
+            },
+        }
+
+
+_profile_lock = threading.Lock()
+
+
+@functools.cache
+def _build_profile(capacity: int) -> ContentionProfile:
+    return ContentionProfile(capacity)
+
+
+def get_profile() -> ContentionProfile:
+    """Return the process wide contention profile."""
+    with _profile_lock:
+        return _build_profile(settings.WALLET_CONTENTION_CAPACITY)
+
+
+def reset() -> None:
+    """Drop the contention recorded by this process."""
+    with _profile_lock:
+        _build_profile.cache_clear()
+
+
+def record(metric: str, wallet_pks: Iterable[int], weight: float = 1) -> None:
+    """Add ``weight`` to every wallet of a lock request, unless disabled."""
+    if settings.WALLET_CONTENTION_CAPACITY:
+        get_profile().add(metric, wallet_pks, weight)
@@ -0,0 +1,104 @@
+import hashlib
+from collections.abc import Callable
+
+from django.db.models import Max
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import versions
+from .models import Wallet, WalletDeletions, WalletShard
+
+WALLET_DELETIONS_PK = 1
+
+
+def wallet_version(wallet_pk: int) -> int | None:
+    """
+    Return the version of a wallet, or ``None`` when it does not exist.
+
+    A plain wallet costs one primary key lookup; a sharded wallet adds one
+    lookup of its shards, so a shard rewritten on its own is seen too.
+    """
+    row = (
+        Wallet.objects.filter(pk=wallet_pk)
+        .values_list("version", "shard_count")
+        .first()
+    )
+    if row is None:
+        return None
+    version, shard_count = row
+    if shard_count:
+        shard_version = WalletShard.objects.filter(wallet_id=wallet_pk).aggregate(
+            version=Max("version")
+        )["version"]
+        version = max(version, shard_version or 0)
+    return version
+
+
+def wallets_version(*, deletions: bool) -> tuple[int, ...]:
+    """
+    Return the highest version over every wallet and shard.
+
+    Versions only grow, so any change raises the maximum, and each maximum is
+    read from the end of an index. With ``deletions`` the version of the
+    wallet deletions is included too, which is what changes on a deletion.
+    """
+    wallet_version = Wallet.objects.aggregate(version=Max("version"))["version"]
+    shard_version = WalletShard.objects.aggregate(version=Max("version"))["version"]
+    version = max(wallet_version or 0, shard_version or 0)
+    if not deletions:
+        return (version,)
+    deletions_version = (
+        WalletDeletions.objects.filter(pk=WALLET_DELETIONS_PK)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version, deletions_version or 0
+
+
+def record_wallet_deletion() -> None:
+    """Move the version of the wallet deletions forward."""
+    updated = WalletDeletions.objects.filter(pk=WALLET_DELETIONS_PK).update(
+        version=versions.bump_version()
+    )
+    if not updated:
+        WalletDeletions.objects.get_or_create(
+            pk=WALLET_DELETIONS_PK, defaults={"version": versions.next_version()}
+        )
+
+
+def make_etag(request: Request, *parts: object) -> str:
+    """Return a strong ETag of the requested representation at a version."""
+    key = "|".join([
+        request.build_absolute_uri(),
+        request.accepted_renderer.media_type,
+        *map(str, parts),
+    ])
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def conditional_response(
+    request: Request,
+    etag: str | None,
+    load: Callable[[], Response],
+) -> Response:
+    """
+    Answer ``If-None-Match`` with 304 before loading the response.
+
+    ``etag`` must be computed before ``load`` runs, so a change that happens in
+    between yields a body newer than its ETag and is never hidden by a 304.
+    """
+    if etag is None:
+        return load()
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (
+        if_none_match.strip() == "*" or etag in parse_etags(if_none_match)
+    ):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response = load()
+    if response.status_code == status.HTTP_200_OK:
+        response["ETag"] = etag
+    return response
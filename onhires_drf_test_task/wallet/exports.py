@@ -0,0 +1,62 @@
+import csv
+import json
+from collections.abc import Iterable, Iterator
+from decimal import Decimal
+
+from rest_framework import serializers
+
+TRANSACTION_EXPORT_FIELDS = ["id", "txid", "wallet", "amount", "created_at"]
+TRANSACTION_EXPORT_COLUMNS = ["id", "txid", "wallet_id", "amount", "created_at"]
+
+# Formats timestamps the way ``TransactionSerializer`` does.
+_format_datetime = serializers.DateTimeField().to_representation
+
+
+class _Echo:
+    """File-like object that returns what is written instead of buffering it."""
+
+    @staticmethod
+    def write(value: str) -> str:
+        """Return the written value."""
+        return value
+
+
+def _format_amount(amount: Decimal) -> str:
+    """Format an amount the way ``TransactionSerializer`` does."""
+    return f"{amount:.2f}"
+
+
+def iter_transactions_ndjson(rows: Iterable[tuple]) -> Iterator[str]:
+    """Yield transaction rows as newline delimited JSON objects."""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for pk, txid, wallet_id, amount, created_at in rows:
+        yield (
+            dumps({
+                "id": pk,
+                "txid": txid,
+                "wallet": wallet_id,
+                "amount": _format_amount(amount),
+                "created_at": _format_datetime(created_at),
+            })
+            + "\n"
+        )
+
+
+def iter_transactions_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    """Yield transaction rows as CSV lines, starting with the header."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(TRANSACTION_EXPORT_FIELDS)
+    for pk, txid, wallet_id, amount, created_at in rows:
+        yield writer.writerow((
+            pk,
+            txid,
+            wallet_id,
+            _format_amount(amount),
+            _format_datetime(created_at),
+        ))
+
+
+TRANSACTION_EXPORT_FORMATS = {
+    "ndjson": iter_transactions_ndjson,
+    "csv": iter_transactions_csv,
+}
@@ -1,14 +1,131 @@
 import typing
 
 import django_filters
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request
+from rest_framework.views import APIView
 
-from .models import Wallet
+from .models import ArchivedTransaction, Transaction, Wallet
+
+# Length of the ngram tokens of the MySQL full-text index, ``ngram_token_size``.
+NGRAM_TOKEN_SIZE = 2
+
+
+def fulltext_query(terms: list[str]) -> str:
+    """
+    Return the boolean mode query requiring every term as a phrase.
+
+    The ngram parser turns a phrase into its consecutive tokens, so a phrase
+    matches the labels containing it. Terms shorter than a token are left out.
+    """
+    return " ".join(f'+"{term}"' for term in terms if len(term) >= NGRAM_TOKEN_SIZE)
 
 
 class WalletFilter(django_filters.FilterSet):
     balance_min = django_filters.NumberFilter(field_name="balance", lookup_expr="gte")
     balance_max = django_filters.NumberFilter(field_name="balance", lookup_expr="lte")
+    # Case insensitive like the label collation, so the prefix is a range of
+    # the ``(label, id)`` index.
+    label_prefix = django_filters.CharFilter(
+        field_name="label", lookup_expr="istartswith"
+    )
+    q = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Wallet
-        fields: typing.ClassVar = ["label", "balance_min", "balance_max"]
+        fields: typing.ClassVar = [
+            "label",
+            "label_prefix",
+            "q",
+            "balance_min",
+            "balance_max",
+        ]
+
+    @staticmethod
+    def filter_search(queryset: QuerySet, name: str, value: str) -> QuerySet:  # noqa: ARG004
+        """
+        Return the wallets whose label contains every word of ``value``.
+
+        On MySQL the full-text index finds the candidates and the words are
+        then checked on those only. Elsewhere every label is scanned, with the
+        same results.
+        """
+        terms = value.replace('"', " ").split()
+        if not terms:
+            return queryset
+        contains = Q.create(
+            [("label__icontains", term) for term in terms], connector=Q.AND
+        )
+        query = fulltext_query(terms)
+        if query and connections[queryset.db].vendor == "mysql":
+            contains &= Q(label__fulltext=query)
+        return queryset.filter(contains)
+
+
+class TransactionFilter(django_filters.FilterSet):
+    created_after = django_filters.IsoDateTimeFilter(
+        field_name="created_at", lookup_expr="gte"
+    )
+    created_before = django_filters.IsoDateTimeFilter(
+        field_name="created_at", lookup_expr="lt"
+    )
+
+    class Meta:
+        model = Transaction
+        fields: typing.ClassVar = [
+            "wallet",
+            "txid",
+            "amount",
+            "created_after",
+            "created_before",
+        ]
+
+
+class ArchivedTransactionFilter(TransactionFilter):
+    class Meta(TransactionFilter.Meta):
+        model = ArchivedTransaction
+
+
+class WalletOrderingFilter(OrderingFilter):
+    """
+    Ordering filter reading wallets filtered by a label prefix in label order.
+
+    Without an explicit ordering, ``label_prefix`` orders by ``(label, id)``,
+    so the ``(label, id)`` index serves the prefix and the ordering together.
+    """
+
+    def get_ordering(
+        self,
+        request: Request,
+        queryset: QuerySet,
+        view: APIView,
+    ) -> list[str] | None:
+        """Return ``label, id`` for a label prefix without ``ordering``."""
+        params = request.query_params
+        if self.ordering_param not in params and params.get("label_prefix"):
+            return ["label", "id"]
+        return super().get_ordering(request, queryset, view)
+
+
+class IdOrderingFilter(OrderingFilter):
+    """
+    Ordering filter that breaks ties by ``id``.
+
+    ``id`` follows the direction of the last requested field, so an ordering
+    like ``-created_at`` within a wallet matches the ``(wallet, created_at,
+    id)`` index exactly and pages stay stable under ``OFFSET``.
+    """
+
+    def get_ordering(
+        self,
+        request: Request,
+        queryset: QuerySet,
+        view: APIView,
+    ) -> list[str] | None:
+        """Return the requested ordering followed by ``id``."""
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or {"id", "pk"} & {term.lstrip("-") for term in ordering}:
+            return ordering
+        return [*ordering, "-id" if ordering[-1].startswith("-") else "id"]
@@ -0,0 +1,251 @@
+import functools
+import threading
+import time
+import typing
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection, IntegrityError
+
+from . import services
+from .models import Transaction
+
+SUBMISSION_MODE_DIRECT = "direct"
+SUBMISSION_MODE_GROUP_COMMIT = "group_commit"
+
+
+class QueueFullError(Exception):
+    """Raised when the group commit queue reached its maximum depth."""
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """Result of a queued transaction: the created row or the rejection detail."""
+
+    transaction: Transaction | None = None
+    detail: str | None = None
+
+
+@dataclass
+class Submission:
+    """A transaction waiting in the group commit queue."""
+
+    txid: str
+    wallet_pk: int
+    amount: Decimal
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class _Partition:
+    """Pending submissions of the wallets served by one worker thread."""
+
+    condition: threading.Condition = field(default_factory=threading.Condition)
+    pending: dict[int, deque[Submission]] = field(default_factory=dict)
+    thread: threading.Thread | None = None
+
+
+def _ingest(items: list[dict[str, typing.Any]]) -> list[Outcome]:
+    """Commit the items as one batch and return the outcome of every item."""
+    result = services.ingest_transactions(items)
+    rejected = {item["index"]: item["detail"] for item in result.rejected}
+
+    # Backends without RETURNING, such as MySQL, leave bulk created rows
+    # without a primary key.
+    missing = [row for row in result.transactions if row.pk is None]
+    if missing:
+        ids = dict(
+            Transaction.objects.filter(
+                txid__in=[row.txid for row in missing]
+            ).values_list("txid", "id")
+        )
+        for row in missing:
+            row.pk = ids[row.txid]
+
+    created = {row.txid: row for row in result.transactions}
+    return [
+        Outcome(detail=rejected[index])
+        if index in rejected
+        else Outcome(transaction=created[item["txid"]])
+        for index, item in enumerate(items)
+    ]
+
+
+def commit_batch(batch: list[Submission]) -> None:
+    """Commit a batch of one wallet and resolve the future of every submission."""
+    items = [
+        {
+            "txid": submission.txid,
+            "wallet": submission.wallet_pk,
+            "amount": submission.amount,
+        }
+        for submission in batch
+    ]
+    try:
+        try:
+            outcomes = _ingest(items)
+        except IntegrityError:
+            # A txid of the batch was created concurrently, commit the items
+            # one by one so that only the conflicting ones are rejected.
+            outcomes = []
+            for item in items:
+                try:
+                    outcomes.extend(_ingest([item]))
+                except IntegrityError:
+                    outcomes.append(
+                        Outcome(detail="Transaction with this txid already exists.")
+                    )
+    except Exception as exc:  # noqa: BLE001
+        for submission in batch:
+            submission.future.set_exception(exc)
+        return
+
+    for submission, outcome in zip(batch, outcomes, strict=True):
+        submission.future.set_result(outcome)
+
+
+class GroupCommitQueue:
+    """
+    Coalesce concurrent transactions per wallet into batched commits.
+
+    Submissions are queued per wallet, and every wallet is served by one of
+    ``workers`` threads. A worker waits up to ``max_wait`` seconds for the
+    batch of a wallet to fill, then commits up to ``batch_size`` submissions
+    through ``services.ingest_transactions``: the wallet is locked once, each
+    item is checked against the running balance, the accepted rows are
+    inserted with one ``bulk_create`` and the batch commits once. Every caller
+    gets the outcome of its own submission through a future.
+
+    With ``start_workers=False`` nothing runs in the background and pending
+    submissions are committed by ``drain()`` in the calling thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_depth: int,
+        batch_size: int,
+        max_wait: float,
+        workers: int = 1,
+        start_workers: bool = True,
+    ) -> None:
+        """Create the queue; worker threads start with the first submission."""
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.start_workers = start_workers
+        self._partitions = [_Partition() for _ in range(workers)]
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        """Return the number of submissions waiting to be committed."""
+        return self._depth
+
+    def submit(self, txid: str, wallet_pk: int, amount: Decimal) -> Future:
+        """Queue a transaction and return the future of its ``Outcome``."""
+        with self._depth_lock:
+            if self._depth >= self.max_depth:
+                raise QueueFullError
+            self._depth += 1
+
+        submission = Submission(txid, wallet_pk, amount)
+        partition = self._partitions[wallet_pk % len(self._partitions)]
+        with partition.condition:
+            partition.pending.setdefault(wallet_pk, deque()).append(submission)
+            partition.condition.notify()
+            if self.start_workers and partition.thread is None:
+                partition.thread = threading.Thread(
+                    target=self._work, args=(partition,), daemon=True
+                )
+                partition.thread.start()
+        return submission.future
+
+    def drain(self) -> None:
+        """Commit every pending submission in the calling thread."""
+        for partition in self._partitions:
+            while batch := self._take_batch(partition, wait=False):
+                commit_batch(batch)
+
+    def close(self) -> None:
+        """Stop the worker threads once the pending submissions are committed."""
+        self._closed = True
+        for partition in self._partitions:
+            with partition.condition:
+                partition.condition.notify_all()
+            if partition.thread is not None:
+                partition.thread.join()
+
+    def _work(self, partition: _Partition) -> None:
+        """Commit batches of the partition until the queue is closed."""
+        try:
+            while batch := self._take_batch(partition, wait=True):
+                close_old_connections()
+                commit_batch(batch)
+        finally:
+            connection.close()
+
+    def _take_batch(
+        self,
+        partition: _Partition,
+        *,
+        wait: bool,
+    ) -> list[Submission] | None:
+        """Pop the next batch of the partition, waiting for one if requested."""
+        with partition.condition:
+            if wait:
+                while not partition.pending and not self._closed:
+                    partition.condition.wait()
+                # Give concurrent submissions a chance to join the batch.
+                deadline = time.monotonic() + self.max_wait
+                while (
+                    partition.pending
+                    and len(next(iter(partition.pending.values()))) < self.batch_size
+                    and (remaining := deadline - time.monotonic()) > 0
+                    and not self._closed
+                ):
+                    partition.condition.wait(remaining)
+            if not partition.pending:
+                return None
+
+            wallet_pk, pending = next(iter(partition.pending.items()))
+            batch = [
+                pending.popleft() for _ in range(min(self.batch_size, len(pending)))
+            ]
+            # The wallet moves to the end so that busy wallets take turns.
+            del partition.pending[wallet_pk]
+            if pending:
+                partition.pending[wallet_pk] = pending
+
+        with self._depth_lock:
+            self._depth -= len(batch)
+        return batch
+
+
+def uses_group_commit() -> bool:
+    """Return whether transactions are created through the group commit queue."""
+    return settings.WALLET_SUBMISSION_MODE == SUBMISSION_MODE_GROUP_COMMIT
+
+
+_queue_lock = threading.Lock()
+
+
+@functools.cache
+def _build_queue() -> GroupCommitQueue:
+    return GroupCommitQueue(
+        max_depth=settings.WALLET_GROUP_COMMIT_MAX_DEPTH,
+        batch_size=settings.WALLET_GROUP_COMMIT_BATCH_SIZE,
+        max_wait=settings.WALLET_GROUP_COMMIT_MAX_WAIT,
+        workers=settings.WALLET_GROUP_COMMIT_WORKERS,
+    )
+
+
+def get_queue() -> GroupCommitQueue:
+    """Return the process wide group commit queue."""
+    with _queue_lock:
+        return _build_queue()
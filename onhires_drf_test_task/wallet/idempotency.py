@@ -0,0 +1,91 @@
+import datetime
+import typing
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ArchivedTransaction, Transaction
+
+# Bumped whenever the cached payload changes shape.
+CACHE_KEY_PREFIX = "wallet:txid:v2:"
+
+
+@dataclass(frozen=True)
+class RecordedTransaction:
+    """The stored payload of a transaction, enough to answer a replayed POST."""
+
+    pk: int
+    txid: str
+    wallet_pk: int
+    amount: Decimal
+    created_at: datetime.datetime
+
+    def matches(self, data: typing.Mapping[str, typing.Any]) -> bool:
+        """Return whether a request payload repeats this transaction."""
+        try:
+            return (
+                int(data.get("wallet")) == self.wallet_pk
+                and Decimal(str(data.get("amount"))) == self.amount
+            )
+        except (InvalidOperation, TypeError, ValueError):
+            return False
+
+    def to_instance(self) -> Transaction:
+        """Build an unsaved ``Transaction`` carrying the recorded values."""
+        return Transaction(
+            pk=self.pk,
+            txid=self.txid,
+            wallet_id=self.wallet_pk,
+            amount=self.amount,
+            created_at=self.created_at,
+        )
+
+
+def _cache_key(txid: str) -> str:
+    return f"{CACHE_KEY_PREFIX}{txid}"
+
+
+def remember(instance: Transaction) -> None:
+    """Record a created transaction in the recent txid cache."""
+    cache.set(
+        _cache_key(instance.txid),
+        (instance.pk, instance.wallet_id, str(instance.amount), instance.created_at),
+        settings.WALLET_TXID_CACHE_TIMEOUT,
+    )
+
+
+def forget(txid: str) -> None:
+    """Drop a transaction whose payload changed or that was deleted."""
+    cache.delete(_cache_key(txid))
+
+
+def lookup(txid: str) -> RecordedTransaction | None:
+    """
+    Return the recorded transaction with the given txid.
+
+    The recent txid cache answers first; on a miss the unique ``txid`` indexes
+    of the transaction table and then of the archive are read without any
+    lock and the result is cached. Neither path touches the wallet row.
+    """
+    cached = cache.get(_cache_key(txid))
+    if cached is not None:
+        pk, wallet_pk, amount, created_at = cached
+        return RecordedTransaction(pk, txid, wallet_pk, Decimal(amount), created_at)
+
+    row = None
+    for model in (Transaction, ArchivedTransaction):
+        row = (
+            model.objects.filter(txid=txid)
+            .values_list("pk", "wallet_id", "amount", "created_at")
+            .first()
+        )
+        if row is not None:
+            break
+    else:
+        return None
+    pk, wallet_pk, amount, created_at = row
+    recorded = RecordedTransaction(pk, txid, wallet_pk, amount, created_at)
+    remember(recorded.to_instance())
+    return recorded
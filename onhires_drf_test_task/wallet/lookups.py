@@ -0,0 +1,27 @@
+from django.db import NotSupportedError
+from django.db.models import Lookup
+
+
+class FullTextMatch(Lookup):
+    """
+    ``field__fulltext=query`` matching a boolean mode query on MySQL.
+
+    The column needs a ``FULLTEXT`` index, see migration 0010 for the label
+    of wallets. Other databases have no such index and refuse the lookup.
+    """
+
+    lookup_name = "fulltext"
+
+    def as_mysql(self, compiler: object, connection: object) -> tuple[str, list]:
+        """Return ``MATCH (column) AGAINST (query IN BOOLEAN MODE)``."""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)", [
+            *lhs_params,
+            *rhs_params,
+        ]
+
+    def as_sql(self, compiler: object, connection: object) -> tuple[str, list]:  # noqa: ARG002, PLR6301
+        """Refuse the lookup outside MySQL."""
+        msg = "Full-text lookups are only supported on MySQL."
+        raise NotSupportedError(msg)
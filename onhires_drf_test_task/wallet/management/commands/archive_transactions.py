@@ -0,0 +1,77 @@
+import typing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from wallet import archival
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old transactions to the archive table in small batches. Wallet "
+        "balances are left as they are and txids stay unique across both tables."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--before",
+            help="Archive transactions created before this ISO 8601 timestamp.",
+        )
+        parser.add_argument(
+            "--keep-latest",
+            type=int,
+            help="Archive transactions beyond the newest N of every wallet.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=archival.DEFAULT_BATCH_SIZE,
+            help="Number of transactions moved by a single transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=archival.DEFAULT_PAUSE,
+            help="Seconds to sleep between batches to throttle the load.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="File storing the last completed wallet; an existing one is resumed.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Run the archival and print the number of moved transactions."""
+        before, value = None, options["before"]
+        if value is not None:
+            before = parse_datetime(value)
+            if before is None:
+                msg = f"Invalid --before timestamp: {value}."
+                raise CommandError(msg)
+            if is_naive(before):
+                before = make_aware(before)
+        keep_latest = options["keep_latest"]
+        if before is None and keep_latest is None:
+            msg = "Pass --before, --keep-latest or both."
+            raise CommandError(msg)
+        if (keep_latest is not None and keep_latest < 0) or options["batch_size"] < 1:
+            msg = (
+                "--keep-latest must not be negative and --batch-size must be positive."
+            )
+            raise CommandError(msg)
+
+        def report(wallet_pk: int, moved: int) -> None:
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Wallet {wallet_pk}: archived {moved} transactions.")
+
+        moved = archival.archive_transactions(
+            archival.ArchivePolicy(before=before, keep_latest=keep_latest),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            checkpoint_path=options["checkpoint"],
+            on_batch=report,
+        )
+        self.stdout.write(f"Archived {moved} transactions.", self.style.SUCCESS)
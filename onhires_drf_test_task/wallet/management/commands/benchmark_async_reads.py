@@ -0,0 +1,147 @@
+import json
+import typing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from wallet import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the same reads from slow clients through the WSGI handler to "
+        "the synchronous endpoints and through the ASGI handler to the async "
+        "ones, and report throughput, latency percentiles and peak threads. "
+        "Runs against the configured database on wallets of its own, which "
+        "are deleted afterwards."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--interface",
+            choices=benchmarks.READ_INTERFACES,
+            action="append",
+            help="Run only the given interface, may be repeated.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="Number of reads per interface, over every client.",
+        )
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=500,
+            help="Number of concurrent clients.",
+        )
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.05,
+            help="Seconds a client takes to receive a response body.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Number of WSGI worker threads.",
+        )
+        parser.add_argument(
+            "--wallets",
+            type=int,
+            default=100,
+            help="Number of wallets created for the run.",
+        )
+        parser.add_argument(
+            "--history",
+            type=int,
+            default=1000,
+            help="Number of transactions of the wallet whose history is read.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random reads, for repeatable runs.",
+        )
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Host header of the requests; must be in ALLOWED_HOSTS.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["text", "json"],
+            default="text",
+            help="Print a summary or the JSON report.",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="Also write the JSON report to this file.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the benchmark wallets and transactions.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Run the interfaces, report them and fail on an unsuccessful read."""
+        if min(options["requests"], options["clients"], options["threads"]) < 1:
+            msg = "--requests, --clients and --threads must be positive."
+            raise CommandError(msg)
+        if options["wallets"] < 1 or options["history"] < 0:
+            msg = "--wallets must be positive and --history must not be negative."
+            raise CommandError(msg)
+        if options["client_delay"] < 0:
+            msg = "--client-delay must not be negative."
+            raise CommandError(msg)
+
+        plan = benchmarks.LoadPlan(
+            scenario="slow_reads",
+            requests=options["requests"],
+            threads=options["threads"],
+            wallets=options["wallets"],
+            history=options["history"],
+            seed=options["seed"],
+            host=options["host"],
+        )
+        results = benchmarks.compare_read_paths(
+            plan,
+            clients=options["clients"],
+            client_delay=options["client_delay"],
+            interfaces=options["interface"] or benchmarks.READ_INTERFACES,
+            keep=options["keep"],
+        )
+        if options["format"] == "text":
+            for result in results:
+                self.write_summary(result)
+
+        report = {"environment": benchmarks.environment(), "results": results}
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(report, indent=2))
+        if options["output"] is not None:
+            options["output"].write_text(json.dumps(report, indent=2))
+
+        failed = [
+            result["interface"]
+            for result in results
+            if result["outcomes"][benchmarks.OK] != result["requests"]
+        ]
+        if failed:
+            msg = "Reads failed through: " + ", ".join(failed) + "."
+            raise CommandError(msg)
+
+    def write_summary(self, result: dict) -> None:
+        """Print the headline figures of an interface."""
+        interface, requests = result["interface"], result["requests"]
+        throughput, peak_threads = result["throughput"], result["peak_threads"]
+        p50, p95, p99 = (result["latency_ms"].get(key) for key in ("p50", "p95", "p99"))
+        self.stdout.write(
+            f"{interface}: {requests} requests, {throughput} req/s, "
+            f"p50 {p50} ms, p95 {p95} ms, p99 {p99} ms, "
+            f"peak threads {peak_threads}"
+        )
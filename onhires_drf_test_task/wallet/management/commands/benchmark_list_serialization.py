@@ -0,0 +1,104 @@
+import functools
+import time
+import typing
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import QuerySet
+from rest_framework import serializers as rest_serializers
+from rest_framework.renderers import JSONRenderer
+
+from wallet import serializers
+from wallet.models import Transaction, Wallet
+
+TARGETS = {
+    "transactions": (
+        Transaction,
+        serializers.TransactionSerializer,
+        serializers.LeanTransactionSerializer,
+    ),
+    "wallets": (
+        Wallet,
+        serializers.WalletSerializer,
+        serializers.LeanWalletSerializer,
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the CPU time of list serialization through the model "
+        "serializers and through the lean values() path."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000,
+            help="Number of rows serialized per run, like one large list page.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of runs per path; the fastest run is reported.",
+        )
+        parser.add_argument(
+            "--target",
+            choices=sorted(TARGETS),
+            action="append",
+            help="Benchmark only the given list, may be repeated.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Time both paths on the stored rows and check that they render alike."""
+        renderer = JSONRenderer()
+        for target in options["target"] or sorted(TARGETS):
+            model, serializer_class, lean_serializer_class = TARGETS[target]
+            queryset = model.objects.order_by("id")[: options["rows"]]
+
+            full = functools.partial(self.serialize, serializer_class, queryset)
+            lean = functools.partial(
+                self.serialize_lean, lean_serializer_class, queryset
+            )
+
+            if renderer.render(full()) != renderer.render(lean()):
+                msg = f"The lean {target} output differs from the serializer output."
+                raise CommandError(msg)
+
+            full_time = self.best_time(full, options["repeat"])
+            lean_time = self.best_time(lean, options["repeat"])
+            rows = len(lean())
+            self.stdout.write(
+                f"{target}: {rows} rows, serializer {full_time * 1000:.2f} ms, "
+                f"lean {lean_time * 1000:.2f} ms, "
+                f"{full_time / lean_time if lean_time else 0:.1f}x faster"
+            )
+
+    @staticmethod
+    def serialize(
+        serializer_class: type[rest_serializers.ModelSerializer],
+        queryset: QuerySet,
+    ) -> list:
+        """Serialize model instances through the model serializer."""
+        return serializer_class(list(queryset), many=True).data
+
+    @staticmethod
+    def serialize_lean(
+        lean_serializer_class: type[serializers.LeanListSerializer],
+        queryset: QuerySet,
+    ) -> list:
+        """Serialize ``values()`` rows through the lean serializer."""
+        lean_serializer = lean_serializer_class()
+        return lean_serializer.to_representation(list(lean_serializer.values(queryset)))
+
+    @staticmethod
+    def best_time(run: typing.Callable[[], typing.Any], repeat: int) -> float:
+        """Return the fastest of ``repeat`` runs, in seconds."""
+        best = float("inf")
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        return best
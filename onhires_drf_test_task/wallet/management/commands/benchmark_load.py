@@ -0,0 +1,153 @@
+import json
+import typing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from wallet import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent requests through the full API stack and report "
+        "throughput, latency percentiles, lock errors and balance checks. "
+        "Runs against the configured database on wallets of its own, which "
+        "are deleted afterwards."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--scenario",
+            choices=benchmarks.SCENARIOS,
+            action="append",
+            help="Run only the given scenario, may be repeated.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Number of requests per scenario, over every worker.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of concurrent threads per process.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of forked processes, each running --threads threads.",
+        )
+        parser.add_argument(
+            "--wallets",
+            type=int,
+            default=100,
+            help="Number of wallets created for every scenario.",
+        )
+        parser.add_argument(
+            "--history",
+            type=int,
+            default=1000,
+            help="Number of transactions paginated, filtered and exported.",
+        )
+        parser.add_argument(
+            "--read-ratio",
+            type=float,
+            default=0.8,
+            help="Share of reads in the mixed scenario.",
+        )
+        parser.add_argument(
+            "--shard-count",
+            type=int,
+            default=0,
+            help="Spread the balance of every wallet over this many shards.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random requests, for repeatable runs.",
+        )
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Host header of the requests; must be in ALLOWED_HOSTS.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["text", "json"],
+            default="text",
+            help="Print a summary or the JSON report.",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="Also write the JSON report to this file.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the benchmark wallets and transactions.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Run the scenarios, report them and fail on a broken invariant."""
+        if min(options["requests"], options["threads"], options["processes"]) < 1:
+            msg = "--requests, --threads and --processes must be positive."
+            raise CommandError(msg)
+        if options["wallets"] < 1 or options["history"] < 0:
+            msg = "--wallets must be positive and --history must not be negative."
+            raise CommandError(msg)
+        if not 0 <= options["read_ratio"] <= 1:
+            msg = "--read-ratio must be between 0 and 1."
+            raise CommandError(msg)
+
+        results = []
+        for scenario in options["scenario"] or benchmarks.SCENARIOS:
+            plan = benchmarks.LoadPlan(
+                scenario=scenario,
+                requests=options["requests"],
+                threads=options["threads"],
+                processes=options["processes"],
+                wallets=options["wallets"],
+                history=options["history"],
+                read_ratio=options["read_ratio"],
+                shard_count=options["shard_count"],
+                seed=options["seed"],
+                host=options["host"],
+            )
+            result = benchmarks.run_scenario(plan, keep=options["keep"])
+            results.append(result)
+            if options["format"] == "text":
+                self.write_summary(result)
+
+        report = {"environment": benchmarks.environment(), "results": results}
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(report, indent=2))
+        if options["output"] is not None:
+            options["output"].write_text(json.dumps(report, indent=2))
+
+        failed = [
+            result["scenario"] for result in results if not result["invariants"]["ok"]
+        ]
+        if failed:
+            msg = "Balance invariants failed for: " + ", ".join(failed) + "."
+            raise CommandError(msg)
+
+    def write_summary(self, result: dict) -> None:
+        """Print the headline figures of a scenario."""
+        scenario, requests = result["scenario"], result["requests"]
+        throughput, lock_error_rate = result["throughput"], result["lock_error_rate"]
+        p50, p95, p99 = (result["latency_ms"].get(key) for key in ("p50", "p95", "p99"))
+        ok = result["invariants"]["ok"]
+        invariants = "ok" if ok else "FAILED"
+        self.stdout.write(
+            f"{scenario}: {requests} requests, {throughput} req/s, "
+            f"p50 {p50} ms, p95 {p95} ms, p99 {p99} ms, "
+            f"lock errors {lock_error_rate:.2%}, "
+            f"invariants {invariants}",
+            self.style.SUCCESS if ok else self.style.ERROR,
+        )
@@ -0,0 +1,31 @@
+import typing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from wallet import api_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI document of the API and write it to a file, "
+        "to be served from API_SCHEMA_FILE instead of being generated by "
+        "every server process."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--output",
+            type=Path,
+            required=True,
+            help="File the JSON document is written to.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Generate the document and write it."""
+        output = options["output"]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        content = api_schema.generate_schema()
+        output.write_bytes(content)
+        self.stdout.write(f"Wrote {len(content)} bytes to {output}.")
@@ -0,0 +1,67 @@
+import typing
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from wallet import reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute wallet balances from their transactions and report, "
+        "or repair, the wallets whose balance drifted."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:  # noqa: PLR6301
+        """Add the command arguments."""
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=reconciliation.DEFAULT_RANGE_SIZE,
+            help="Number of wallet ids aggregated by a single grouped query.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes checking ranges in parallel.",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help=(
+                "Reset drifted balances to the sum of their transactions. "
+                "Wallets whose balance was set directly, e.g. an opening "
+                "balance, are reported as drifted and would be reset as well."
+            ),
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="File storing completed ranges; an existing one is resumed.",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:  # noqa: ANN401, ARG002
+        """Run the reconciliation and print the drifted wallets."""
+
+        def report(start: int, stop: int, drifts: list) -> None:
+            for drift in drifts:
+                status = " (repaired)" if drift.repaired else ""
+                self.stdout.write(
+                    f"Wallet {drift.wallet_pk}: balance {drift.balance:.2f}, "
+                    f"ledger {drift.ledger_balance:.2f}{status}"
+                )
+            self.stdout.write(
+                f"Checked wallets {start}-{stop - 1}: {len(drifts)} drifted.",
+                self.style.SUCCESS if not drifts else self.style.WARNING,
+            )
+
+        drifts = reconciliation.reconcile_balances(
+            range_size=options["range_size"],
+            workers=options["workers"],
+            repair=options["repair"],
+            checkpoint_path=options["checkpoint"],
+            on_range=report,
+        )
+        repaired = sum(drift.repaired for drift in drifts)
+        self.stdout.write(f"Found {len(drifts)} drifted wallets, repaired {repaired}.")
@@ -0,0 +1,483 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS, OperationalError
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpRequest, HttpResponse
+
+from . import pool, services
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Counters by key name: metric name, help text and label names.
+COUNTERS = {
+    "requests": (
+        "wallet_http_requests_total",
+        "Requests served.",
+        ("view", "status"),
+    ),
+    "queries": (
+        "wallet_db_queries_total",
+        "SQL statements executed while serving requests.",
+        ("view",),
+    ),
+    "query_seconds": (
+        "wallet_db_query_seconds_total",
+        "Time spent executing SQL statements.",
+        ("view",),
+    ),
+    "lock_wait_seconds": (
+        "wallet_db_lock_wait_seconds_total",
+        "Time spent in SELECT ... FOR UPDATE statements, waiting included.",
+        ("view",),
+    ),
+    "lock_failures": (
+        "wallet_db_lock_failures_total",
+        "Statements failed on a deadlock, lock wait timeout or NOWAIT lock.",
+        ("view",),
+    ),
+    "render_seconds": (
+        "wallet_http_render_seconds_total",
+        "Time spent serializing response bodies.",
+        ("view",),
+    ),
+}
+# Connection pool statistics by key name: metric name, help text and type,
+# labelled by database alias.
+POOL = {
+    "idle": (
+        "wallet_db_pool_idle_connections",
+        "Pooled connections waiting for a checkout.",
+        "gauge",
+    ),
+    "checked_out": (
+        "wallet_db_pool_checked_out_connections",
+        "Pooled connections in use.",
+        "gauge",
+    ),
+    "overflow": (
+        "wallet_db_pool_overflow_connections",
+        "Connections open beyond the pool size.",
+        "gauge",
+    ),
+    "checkouts": (
+        "wallet_db_pool_checkouts_total",
+        "Connections taken from the pool.",
+        "counter",
+    ),
+    "created": (
+        "wallet_db_pool_connections_created_total",
+        "Connections opened by the pool.",
+        "counter",
+    ),
+    "recycled": (
+        "wallet_db_pool_recycled_total",
+        "Connections replaced at checkout for their age.",
+        "counter",
+    ),
+    "failed_checks": (
+        "wallet_db_pool_failed_checks_total",
+        "Idle connections replaced after failing their check at checkout.",
+        "counter",
+    ),
+    "waits": (
+        "wallet_db_pool_waits_total",
+        "Checkouts that waited for a connection to be given back.",
+        "counter",
+    ),
+    "wait_seconds": (
+        "wallet_db_pool_wait_seconds_total",
+        "Time spent waiting for a connection to be given back.",
+        "counter",
+    ),
+    "timeouts": (
+        "wallet_db_pool_timeouts_total",
+        "Checkouts that gave up waiting for a connection.",
+        "counter",
+    ),
+}
+LATENCY = (
+    "wallet_http_request_duration_seconds",
+    "Request latency, rendering included.",
+)
+
+UNMATCHED_VIEW = "unmatched"
+
+Key = tuple[str | int, ...]
+
+
+class Registry:
+    """
+    Metric totals of this process, kept without locks on the request path.
+
+    Every thread adds to its own dict, so no two threads ever write the same
+    one; a scrape copies each dict, which is atomic under the GIL. With
+    ``METRICS_DIR`` set, the totals are also written to ``<pid>.json`` in it
+    at most every ``METRICS_FLUSH_INTERVAL`` seconds, so the process answering
+    a scrape can add those of the other workers of a multi-process server.
+    """
+
+    def __init__(self) -> None:
+        """Start with no recorded values."""
+        self._local = threading.local()
+        self._shards: list[defaultdict[Key, float]] = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = 0.0
+
+    def shard(self) -> defaultdict[Key, float]:
+        """Return the values of the current thread."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            values = self._local.shard = defaultdict(float)
+            with self._shards_lock:
+                self._shards.append(values)
+            return values
+
+    def totals(self) -> defaultdict[Key, float]:
+        """
+        Return the values of every thread of this process added up.
+
+        The statistics of the connection pools of the process are included.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals = defaultdict(float)
+        for values in shards:
+            for key, value in values.copy().items():
+                totals[key] += value
+        for alias, stats in pool.stats().items():
+            for name, value in stats.items():
+                totals["pool", name, alias] = value
+        return totals
+
+    def reset(self) -> None:
+        """Forget every recorded value of this process."""
+        with self._shards_lock:
+            self._shards.clear()
+            self._local = threading.local()
+            self._next_flush = 0.0
+
+    def connection(self) -> BaseDatabaseWrapper:
+        """
+        Return the default database connection of the current thread.
+
+        Django keeps connections per thread as well, and looking one up costs
+        more than the rest of the bookkeeping of a request.
+        """
+        try:
+            return self._local.connection
+        except AttributeError:
+            self._local.connection = connections[DEFAULT_DB_ALIAS]
+            return self._local.connection
+
+    def maybe_flush(self, now: float) -> None:
+        """Write the totals when the flush interval has passed."""
+        if now < self._next_flush or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_flush = now + settings.METRICS_FLUSH_INTERVAL
+            if settings.METRICS_DIR:
+                self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self) -> None:
+        """Write the totals of this process to its file in ``METRICS_DIR``."""
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{os.getpid()}.json"
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(list(self.totals().items())))
+        tmp_path.replace(path)
+
+    def collect(self) -> defaultdict[Key, float]:
+        """
+        Return the totals of this process and of the other flushed processes.
+
+        Files of exited processes are kept, so counters do not go back when a
+        worker is replaced, but their connection gauges are left out; clear
+        the directory when the server is restarted.
+        """
+        totals = self.totals()
+        if not settings.METRICS_DIR:
+            return totals
+        own_name = f"{os.getpid()}.json"
+        for path in Path(settings.METRICS_DIR).glob("*.json"):
+            if path.name == own_name:
+                continue
+            try:
+                items = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            alive = _is_alive(path.stem)
+            for key, value in items:
+                if key[0] == "pool" and key[1] in pool.GAUGES and not alive:
+                    continue
+                totals[tuple(key)] += value
+        return totals
+
+
+def _is_alive(pid: str) -> bool:
+    """Return whether the process of a metrics file is still running."""
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # It runs under another user.
+        return True
+    return True
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """
+    Values of one request, and the database execute wrapper collecting them.
+
+    They are added to the registry under the view once the request is done.
+    """
+
+    __slots__ = (
+        "lock_failures",
+        "lock_wait_seconds",
+        "queries",
+        "query_seconds",
+        "render_seconds",
+        "view",
+    )
+
+    def __init__(self) -> None:
+        """Start with no statements run."""
+        self.view = UNMATCHED_VIEW
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.lock_wait_seconds = 0.0
+        self.lock_failures = 0
+        self.render_seconds = 0.0
+
+    def __call__(
+        self,
+        execute: Callable,
+        sql: str,
+        params: object,
+        many: bool,  # noqa: FBT001
+        context: dict,
+    ) -> object:
+        """Time a statement and count it, as a failed lock too if it is one."""
+        locking = " FOR UPDATE" in sql
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if locking or services.is_lock_conflict(exc):
+                self.lock_failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.query_seconds += elapsed
+            if locking:
+                self.lock_wait_seconds += elapsed
+
+    def record(self, status: int, elapsed: float) -> None:
+        """Add the request to the totals of the current thread."""
+        values = registry.shard()
+        view = self.view
+        values["requests", view, status] += 1
+        values["latency", view, bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        values["latency_seconds", view] += elapsed
+        if self.queries:
+            values["queries", view] += self.queries
+            values["query_seconds", view] += self.query_seconds
+        if self.lock_wait_seconds:
+            values["lock_wait_seconds", view] += self.lock_wait_seconds
+        if self.lock_failures:
+            values["lock_failures", view] += self.lock_failures
+        if self.render_seconds:
+            values["render_seconds", view] += self.render_seconds
+
+
+def view_name(view_func: Callable, method: str) -> str:
+    """
+    Return the label of a view, e.g. ``WalletViewSet.list``.
+
+    Viewsets are named by their class and the action routed for the method,
+    views with a ``metrics_name`` by it, other views by their function.
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return getattr(
+            view_func, "metrics_name", getattr(view_func, "__name__", UNMATCHED_VIEW)
+        )
+    method = method.lower()
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+@contextlib.contextmanager
+def collecting_queries(request: HttpRequest) -> Iterator[None]:
+    """
+    Count the statements run by the current thread in the request metrics.
+
+    For views handing their database work to another thread, whose
+    connection the middleware does not wrap.
+    """
+    metrics = getattr(request, "metrics", None)
+    if metrics is None:
+        yield
+        return
+    wrappers = registry.connection().execute_wrappers
+    wrappers.append(metrics)
+    try:
+        yield
+    finally:
+        wrappers.pop()
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, SQL statements and rendering time of every request.
+
+    Place it first, so the latency covers the other middleware. Streamed
+    responses are timed until their first byte. It runs natively under both
+    WSGI and ASGI; under ASGI the statements are those of the views using
+    ``collecting_queries``, as the others run on threads of their own.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        """Wrap the next handler."""
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """Serve the request with the execute wrapper installed."""
+        if iscoroutinefunction(self):
+            return self.acall(request)
+        metrics = request.metrics = RequestMetrics()
+        start = time.perf_counter()
+        # The wrapper is pushed directly, as execute_wrapper() does without
+        # the cost of a context manager.
+        wrappers = registry.connection().execute_wrappers
+        wrappers.append(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrappers.pop()
+        self.record(request, response, start)
+        return response
+
+    async def acall(self, request: HttpRequest) -> HttpResponse:
+        """Serve the request on the event loop."""
+        request.metrics = RequestMetrics()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, start)
+        return response
+
+    @staticmethod
+    def record(request: HttpRequest, response: HttpResponse, start: float) -> None:
+        """Add the request under its resolved view."""
+        now = time.perf_counter()
+        metrics = request.metrics
+        # The view is read from the resolver match rather than in a
+        # process_view() hook, which Django would run on a thread under ASGI.
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            metrics.view = view_name(match.func, request.method)
+        metrics.record(response.status_code, now - start)
+        registry.maybe_flush(now)
+
+    def process_template_response(  # noqa: PLR6301
+        self, request: HttpRequest, response: HttpResponse
+    ) -> HttpResponse:
+        """Time the rendering that follows, which serializes the body."""
+        metrics = request.metrics
+        start = time.perf_counter()
+
+        def rendered(_response: HttpResponse) -> None:
+            metrics.render_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def _labels(names: Iterable[str], values: Iterable[object]) -> str:
+    pairs = []
+    for name, value in zip(names, values, strict=True):
+        escaped = (
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def exposition(totals: dict[Key, float]) -> str:
+    """Return the totals in the Prometheus text exposition format."""
+    by_kind: defaultdict[str, list[tuple[Key, float]]] = defaultdict(list)
+    for (kind, *labels), value in sorted(totals.items(), key=str):
+        by_kind[kind].append((tuple(labels), value))
+
+    lines = []
+    for kind, (name, help_text, label_names) in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines.extend(
+            f"{name}{_labels(label_names, labels)} {_number(value)}"
+            for labels, value in by_kind[kind]
+        )
+
+    for name, (metric, help_text, metric_type) in POOL.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+        lines.extend(
+            metric + _labels(("database",), (alias,)) + " " + _number(value)
+            for (stat, alias), value in by_kind["pool"]
+            if stat == name
+        )
+
+    name, help_text = LATENCY
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    buckets: defaultdict[str, list[float]] = defaultdict(
+        lambda: [0.0] * (len(LATENCY_BUCKETS) + 1)
+    )
+    for (view, index), value in by_kind["latency"]:
+        buckets[view][index] += value
+    sums = {view: value for (view,), value in by_kind["latency_seconds"]}
+    for view, counts in sorted(buckets.items()):
+        cumulative = 0.0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts, strict=True):
+            cumulative += count
+            labels = _labels(("view", "le"), (view, bound))
+            lines.append(f"{name}_bucket{labels} {_number(cumulative)}")
+        labels = _labels(("view",), (view,))
+        lines += [
+            f"{name}_sum{labels} {_number(sums.get(view, 0.0))}",
+            f"{name}_count{labels} {_number(cumulative)}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:  # noqa: ARG001
+    """Serve the metrics of every process in the Prometheus text format."""
+    return HttpResponse(exposition(registry.collect()), content_type=CONTENT_TYPE)
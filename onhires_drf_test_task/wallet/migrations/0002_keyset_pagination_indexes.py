@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:42
+import typing
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0001_initial"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["amount", "id"], name="wallet_tran_amount_bb2fbd_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallet",
+            index=models.Index(
+                fields=["label", "id"], name="wallet_wall_label_dbf251_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallet",
+            index=models.Index(
+                fields=["balance", "id"], name="wallet_wall_balance_44072a_idx"
+            ),
+        ),
+    ]
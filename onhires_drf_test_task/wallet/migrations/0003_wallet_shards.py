@@ -0,0 +1,59 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:46
+import typing
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import wallet.validators
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0002_keyset_pagination_indexes"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.AddField(
+            model_name="wallet",
+            name="shard_count",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="WalletShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=18,
+                        validators=[wallet.validators.validate_wallet_balance],
+                    ),
+                ),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="wallet.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("wallet", "index"), name="wallet_shard_unique_index"
+                    )
+                ],
+            },
+        ),
+    ]
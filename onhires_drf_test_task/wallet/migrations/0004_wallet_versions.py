@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-17 03:55
+import typing
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0003_wallet_shards"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.AddField(
+            model_name="wallet",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="walletshard",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="wallet",
+            index=models.Index(
+                fields=["version"], name="wallet_wall_version_ed8acb_idx"
+            ),
+        ),
+    ]
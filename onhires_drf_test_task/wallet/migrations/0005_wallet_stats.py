@@ -0,0 +1,109 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:07
+import typing
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, Max, Min, Sum, When
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_wallet_stats(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """Compute the stats of the wallets that already have transactions."""
+    transaction_model = apps.get_model("wallet", "Transaction")
+    wallet_stats_model = apps.get_model("wallet", "WalletStats")
+    total_field = DecimalField(max_digits=30, decimal_places=2)
+    rows = (
+        transaction_model.objects.order_by()
+        .values("wallet_id")
+        .annotate(
+            transaction_count=Count("id"),
+            total_credits=Sum(
+                Case(
+                    When(amount__gt=0, then="amount"),
+                    default=0,
+                    output_field=total_field,
+                )
+            ),
+            total_debits=Sum(
+                Case(
+                    When(amount__lt=0, then="amount"),
+                    default=0,
+                    output_field=total_field,
+                )
+            ),
+            min_amount=Min("amount"),
+            max_amount=Max("amount"),
+        )
+    )
+    wallet_stats_model.objects.bulk_create(
+        (wallet_stats_model(**row) for row in rows.iterator()),
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0004_wallet_versions"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.CreateModel(
+            name="WalletStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField(default=0)),
+                ("transaction_count", models.BigIntegerField(default=0)),
+                (
+                    "total_credits",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=30),
+                ),
+                (
+                    "total_debits",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=30),
+                ),
+                (
+                    "min_amount",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=18, null=True
+                    ),
+                ),
+                (
+                    "max_amount",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=18, null=True
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["wallet", "amount"], name="wallet_tran_wallet__f66c0f_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="walletstats",
+            name="wallet",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stats",
+                to="wallet.wallet",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="walletstats",
+            constraint=models.UniqueConstraint(
+                fields=("wallet", "index"), name="wallet_stats_unique_index"
+            ),
+        ),
+        migrations.RunPython(backfill_wallet_stats, migrations.RunPython.noop),
+    ]
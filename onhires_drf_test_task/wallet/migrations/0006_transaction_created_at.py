@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:09
+import typing
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0005_wallet_stats"),
+    ]
+
+    # The column is added as nullable first, which needs no table rebuild;
+    # 0007 backfills it in batches and 0008 makes it required.
+    operations: typing.ClassVar = [
+        migrations.AddField(
+            model_name="transaction",
+            name="created_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:09
+import typing
+
+from django.db import migrations, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def backfill_created_at(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """
+    Stamp the transactions created before ``created_at`` existed.
+
+    Rows are updated in primary key ranges of ``BACKFILL_BATCH_SIZE``, each
+    range in its own short transaction. They get the earliest timestamp the
+    application has stamped so far, or the current time, so they sort before
+    every newer transaction and among themselves by id.
+    """
+    transaction_model = apps.get_model("wallet", "Transaction")
+    bounds = transaction_model.objects.aggregate(
+        first=Min("created_at"), low=Min("id"), high=Max("id")
+    )
+    if bounds["low"] is None:
+        return
+
+    created_at = bounds["first"] or timezone.now()
+    for start in range(bounds["low"], bounds["high"] + 1, BACKFILL_BATCH_SIZE):
+        with transaction.atomic():
+            transaction_model.objects.filter(
+                id__gte=start,
+                id__lt=start + BACKFILL_BATCH_SIZE,
+                created_at__isnull=True,
+            ).update(created_at=created_at)
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own instead of holding one long transaction.
+    atomic = False
+
+    dependencies: typing.ClassVar = [
+        ("wallet", "0006_transaction_created_at"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
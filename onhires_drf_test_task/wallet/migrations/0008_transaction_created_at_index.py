@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:09
+import typing
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0007_backfill_transaction_created_at"),
+    ]
+
+    # InnoDB applies both operations in place while writes go on.
+    operations: typing.ClassVar = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["wallet", "created_at", "id"],
+                name="wallet_tran_wallet__32ed9f_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-17 04:13
+import typing
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0008_transaction_created_at_index"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.CreateModel(
+            name="ArchivedTransaction",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("txid", models.CharField(max_length=255, unique=True)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=18)),
+                ("created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_transactions",
+                        to="wallet.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["wallet", "created_at", "id"],
+                        name="wallet_arch_wallet__8c7a59_idx",
+                    ),
+                    models.Index(
+                        fields=["wallet", "amount"],
+                        name="wallet_arch_wallet__7e6aea_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-17 05:02
+import typing
+
+from django.db import migrations
+
+INDEX_NAME = "wallet_wall_label_ngram_idx"
+
+
+def add_fulltext_index(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """
+    Index the wallet labels for full-text search on MySQL.
+
+    The ngram parser splits labels into ``ngram_token_size`` character tokens,
+    so any part of a label can be searched, not only whole words. Adding the
+    first FULLTEXT index of a table rebuilds it, which blocks writes to the
+    wallets until it is done. Other databases have no such index.
+
+    The stopword list is read when the index is built, and the ngram parser
+    drops every token containing a stopword, so with the default list a label
+    such as "Payroll" has no ``pa`` or ``ay`` tokens. The index is built with
+    stopwords disabled for the session; the server should also run with
+    ``innodb_ft_enable_stopword=OFF`` so table rebuilds keep every token.
+    """
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    try:
+        schema_editor.execute(
+            f"ALTER TABLE wallet_wallet ADD FULLTEXT INDEX {INDEX_NAME} (label) "
+            "WITH PARSER ngram"
+        )
+    finally:
+        schema_editor.execute("SET SESSION innodb_ft_enable_stopword = DEFAULT")
+
+
+def drop_fulltext_index(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """Drop the full-text index of the wallet labels."""
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(f"ALTER TABLE wallet_wallet DROP INDEX {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0009_archived_transactions"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
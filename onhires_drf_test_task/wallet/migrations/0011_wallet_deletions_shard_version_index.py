@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-17 05:01
+import typing
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0010_wallet_label_fulltext_index"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.CreateModel(
+            name="WalletDeletions",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="walletshard",
+            index=models.Index(
+                fields=["version"], name="wallet_wall_version_bf12d0_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-17 06:12
+import typing
+
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery, Sum
+
+
+def shard_totals(apps: typing.Any) -> Subquery:  # noqa: ANN401
+    """Return the subquery summing the shards of the outer wallet."""
+    wallet_shard_model = apps.get_model("wallet", "WalletShard")
+    return Subquery(
+        wallet_shard_model.objects.filter(wallet=OuterRef("pk"))
+        .order_by()
+        .values("wallet")
+        .annotate(total=Sum("balance"))
+        .values("total")
+    )
+
+
+def add_shard_balances(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """
+    Store the total balance of sharded wallets in their wallet row.
+
+    Only sharded wallets are updated, and they all have shard rows.
+    """
+    wallet_model = apps.get_model("wallet", "Wallet")
+    wallet_model.objects.filter(shard_count__gt=0).update(
+        balance=F("balance") + shard_totals(apps)
+    )
+
+
+def remove_shard_balances(apps: typing.Any, schema_editor: typing.Any) -> None:  # noqa: ANN401, ARG001
+    """Take the shard balances back out of the wallet rows."""
+    wallet_model = apps.get_model("wallet", "Wallet")
+    wallet_model.objects.filter(shard_count__gt=0).update(
+        balance=F("balance") - shard_totals(apps)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies: typing.ClassVar = [
+        ("wallet", "0011_wallet_deletions_shard_version_index"),
+    ]
+
+    operations: typing.ClassVar = [
+        migrations.RunPython(add_shard_balances, remove_shard_balances),
+    ]
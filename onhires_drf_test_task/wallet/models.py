@@ -2,7 +2,7 @@ import typing
 
 from django.db import models
 
-from . import validators
+from . import validators, versions
 
 
 class Wallet(models.Model):
@@ -14,16 +14,118 @@ class Wallet(models.Model):
         decimal_places=2,
         validators=[validators.validate_wallet_balance],
     )
+    # A wallet with shards also spreads its balance over ``shard_count``
+    # ``WalletShard`` rows, 0 means it has none. The balance above is always
+    # the total, so the ``(balance, id)`` index orders every wallet.
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    # Moves forward with every change of the wallet or of its transactions,
+    # see ``versions.next_version``. ETags are derived from it.
+    version = models.PositiveBigIntegerField(default=0)
 
     def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:  # noqa: ANN401
-        """Override save to include validation."""
+        """Override save to include validation and move the version forward."""
         validators.validate_wallet_balance(self.balance)
+        self.version = versions.next_version(self.version)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = [*kwargs["update_fields"], "version"]
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         """Return the label and balance of the wallet."""
         return f"{self.label} - {self.balance:.2f}"
 
+    class Meta:
+        # Keyset pagination walks these indexes for each ordering field.
+        indexes: typing.ClassVar = [
+            models.Index(fields=["label", "id"]),
+            models.Index(fields=["balance", "id"]),
+            models.Index(fields=["version"]),
+        ]
+
+
+class WalletShard(models.Model):
+    """Model to store a slice of a sharded wallet balance."""
+
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="shards",
+        on_delete=models.CASCADE,
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        validators=[validators.validate_wallet_balance],
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        """Return the wallet, the shard index and the balance of the shard."""
+        return f"{self.wallet_id}/{self.index} - {self.balance:.2f}"
+
+    class Meta:
+        constraints: typing.ClassVar = [
+            models.UniqueConstraint(
+                fields=["wallet", "index"], name="wallet_shard_unique_index"
+            ),
+        ]
+        # The wallet list ETag reads the highest shard version.
+        indexes: typing.ClassVar = [models.Index(fields=["version"])]
+
+
+class WalletDeletions(models.Model):
+    """
+    Single row versioning the deletions of wallets.
+
+    A deleted wallet takes its version with it, so the highest version of the
+    remaining wallets would not move. Every deletion moves this one forward
+    instead, see ``etags.record_wallet_deletion``.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        """Return the version of the wallet deletions."""
+        return str(self.version)
+
+
+class WalletStats(models.Model):
+    """
+    Model to store running aggregates of the transactions of a wallet.
+
+    The aggregates of a wallet are the sum of its rows, one per ``index``.
+    Sharded wallets spread their updates over up to ``shard_count`` rows like
+    their balance, so a row may hold negative counts and totals on its own.
+    """
+
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="stats",
+        on_delete=models.CASCADE,
+    )
+    index = models.PositiveSmallIntegerField(default=0)
+    transaction_count = models.BigIntegerField(default=0)
+    total_credits = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    # The sum of the negative amounts, so credits plus debits is the net total.
+    total_debits = models.DecimalField(max_digits=30, decimal_places=2, default=0)
+    min_amount = models.DecimalField(
+        max_digits=18, decimal_places=2, null=True, blank=True
+    )
+    max_amount = models.DecimalField(
+        max_digits=18, decimal_places=2, null=True, blank=True
+    )
+
+    def __str__(self) -> str:
+        """Return the wallet, the row index and the transaction count."""
+        return f"{self.wallet_id}/{self.index} - {self.transaction_count}"
+
+    class Meta:
+        constraints: typing.ClassVar = [
+            models.UniqueConstraint(
+                fields=["wallet", "index"], name="wallet_stats_unique_index"
+            ),
+        ]
+
 
 class Transaction(models.Model):
     """Model to store transactions."""
@@ -35,6 +137,7 @@ class Transaction(models.Model):
         related_name="transactions",
         on_delete=models.PROTECT,
     )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
         """Return the transaction id and amount."""
@@ -43,4 +146,39 @@ class Transaction(models.Model):
     class Meta:
         indexes: typing.ClassVar = [
             models.Index(fields=["wallet"]),
+            models.Index(fields=["amount", "id"]),
+            # Finds the smallest and largest amount of a wallet for its stats.
+            models.Index(fields=["wallet", "amount"]),
+            # Serves the history of a wallet in either time order.
+            models.Index(fields=["wallet", "created_at", "id"]),
+        ]
+
+
+class ArchivedTransaction(models.Model):
+    """
+    Model to store transactions moved out of ``Transaction`` by archival.
+
+    Rows keep the id, txid and timestamp they had in ``Transaction``; a txid
+    is unique across both tables.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    txid = models.CharField(max_length=255, unique=True)
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    wallet = models.ForeignKey(
+        Wallet,
+        related_name="archived_transactions",
+        on_delete=models.PROTECT,
+    )
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        """Return the transaction id and amount."""
+        return f"{self.txid} - {self.amount:.2f}"
+
+    class Meta:
+        indexes: typing.ClassVar = [
+            models.Index(fields=["wallet", "created_at", "id"]),
+            models.Index(fields=["wallet", "amount"]),
         ]
@@ -0,0 +1,276 @@
+import base64
+import binascii
+import json
+import typing
+from collections.abc import Iterator
+
+from django.db.models import Model, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+
+def keyset_order_by(field: str, *, descending: bool) -> list[str]:
+    """Return the ``order_by`` terms of a ``(field, id)`` keyset."""
+    prefix = "-" if descending else ""
+    if field == "id":
+        return [f"{prefix}id"]
+    return [f"{prefix}{field}", f"{prefix}id"]
+
+
+def keyset_after(field: str, value: typing.Any, pk: int, *, descending: bool) -> Q:  # noqa: ANN401
+    """Return the condition selecting the rows that follow a ``(field, id)`` key."""
+    lookup = "lt" if descending else "gt"
+    if field == "id":
+        return Q(**{f"id__{lookup}": pk})
+    return Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": pk})
+
+
+def iter_keyset(
+    queryset: QuerySet,
+    field: str,
+    columns: list[str],
+    *,
+    descending: bool,
+    chunk_size: int,
+) -> Iterator[tuple]:
+    """
+    Yield ``values_list`` rows of the whole queryset in keyset order.
+
+    Rows are fetched in chunks of ``chunk_size``, each chunk starting from the
+    key of the previous one, so memory stays flat even on database drivers
+    that buffer the complete result set of a query.
+    """
+    key_columns = [field, "id"] if field != "id" else ["id"]
+    queryset = queryset.order_by(*keyset_order_by(field, descending=descending))
+    rows_queryset = queryset.values_list(*columns, *key_columns)
+    width = len(columns)
+
+    chunk = list(rows_queryset[:chunk_size])
+    while chunk:
+        for row in chunk:
+            yield row[:width]
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        value = last[width] if field != "id" else None
+        chunk = list(
+            rows_queryset.filter(
+                keyset_after(field, value, last[-1], descending=descending)
+            )[:chunk_size]
+        )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over ``(ordering field, id)`` keys.
+
+    The cursor stores the key of the first or last row of the page, so every
+    page is a range scan starting from that key instead of skipping ``OFFSET``
+    rows, and no ``COUNT(*)`` is run. The ordering comes from the view's
+    ``OrderingFilter``; ``id`` breaks ties so that every key is unique.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,
+    ) -> list[Model]:
+        """Return the page of rows that follows or precedes the cursor."""
+        self.request = request
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request, queryset)
+        reverse = cursor is not None and cursor["reverse"]
+        # Walking backwards flips the ordering and the key comparison, the
+        # page is then reversed back into the requested order.
+        descending = self.descending != reverse
+
+        if cursor is not None:
+            queryset = queryset.filter(
+                keyset_after(
+                    self.field, cursor["value"], cursor["id"], descending=descending
+                )
+            )
+        rows = list(
+            queryset.order_by(*keyset_order_by(self.field, descending=descending))[
+                : self.page_size + 1
+            ]
+        )
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data: list) -> Response:
+        """Return the page with links to the neighbouring pages."""
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:  # noqa: PLR6301
+        """Return the schema of the paginated response."""
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self) -> str | None:
+        """Return the link to the next page."""
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        """Return the link to the previous page."""
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @staticmethod
+    def get_ordering(
+        request: Request,
+        queryset: QuerySet,
+        view: APIView | None,
+    ) -> tuple[str, bool]:
+        """Return the leading ordering field of the view and its direction."""
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        term = ordering[0] if ordering else "id"
+        field = term.lstrip("-")
+        return "id" if field == "pk" else field, term.startswith("-")
+
+    def encode_cursor(self, row: Model | dict, *, reverse: bool) -> str:
+        """Return the URL of the page that starts after the given row."""
+        if isinstance(row, dict):
+            value, pk = row[self.field], row["id"]
+        else:
+            value, pk = getattr(row, self.field), row.pk
+        position = {
+            "f": self.field,
+            "v": None if self.field == "id" else str(value),
+            "id": pk,
+            "r": int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(position, separators=(",", ":")).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def decode_cursor(
+        self,
+        request: Request,
+        queryset: QuerySet,
+    ) -> dict[str, typing.Any] | None:
+        """Return the position stored in the request cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if position["f"] != self.field:
+                raise NotFound(self.invalid_cursor_message)
+            value = position["v"]
+            if self.field != "id":
+                value = queryset.model._meta.get_field(self.field).to_python(value)  # noqa: SLF001
+            return {
+                "value": value,
+                "id": int(position["id"]),
+                "reverse": bool(position["r"]),
+            }
+        except (
+            binascii.Error,
+            json.JSONDecodeError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset mode.
+
+    Requests that pass ``pagination=cursor`` or a ``cursor`` are paginated by
+    ``KeysetPagination``, every other request keeps the page number format.
+    """
+
+    mode_query_param = "pagination"
+    keyset_class = KeysetPagination
+    keyset = None
+
+    def uses_keyset(self, request: Request) -> bool:
+        """Return whether the request opted in to keyset pagination."""
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,
+    ) -> list[Model] | None:
+        """Paginate by keyset when requested, by page number otherwise."""
+        if self.uses_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data: list) -> Response:
+        """Return the response in the format of the selected mode."""
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view: APIView) -> list[dict]:
+        """Document the keyset mode parameters next to the page number ones."""
+        return [
+            *super().get_schema_operation_parameters(view),
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` to paginate by keyset.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.keyset_class.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The keyset pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
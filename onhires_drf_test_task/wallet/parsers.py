@@ -0,0 +1,58 @@
+import typing
+
+import msgpack
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .renderers import MessagePackRenderer, ORJSONRenderer
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSON parser built on orjson.
+
+    It accepts the same documents as ``JSONParser`` and yields the same data;
+    like its strict mode, it rejects ``NaN`` and ``Infinity``.
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(  # noqa: PLR6301
+        self,
+        stream: typing.BinaryIO,
+        media_type: str | None = None,  # noqa: ARG002
+        parser_context: dict | None = None,
+    ) -> typing.Any:  # noqa: ANN401
+        """Parse the incoming JSON body."""
+        body = stream.read()
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if encoding.lower().replace("_", "-") not in {"utf-8", "utf8"}:
+            body = body.decode(encoding)
+
+        try:
+            return orjson.loads(body)
+        except (orjson.JSONDecodeError, UnicodeDecodeError) as exc:
+            msg = f"JSON parse error - {exc}"
+            raise ParseError(msg) from exc
+
+
+class MessagePackParser(BaseParser):
+    """Parser of MessagePack bodies sent by service-to-service clients."""
+
+    media_type = "application/msgpack"
+    renderer_class = MessagePackRenderer
+
+    def parse(  # noqa: PLR6301
+        self,
+        stream: typing.BinaryIO,
+        media_type: str | None = None,  # noqa: ARG002
+        parser_context: dict | None = None,  # noqa: ARG002
+    ) -> typing.Any:  # noqa: ANN401
+        """Parse the incoming MessagePack body."""
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            msg = f"MessagePack parse error - {exc}"
+            raise ParseError(msg) from exc
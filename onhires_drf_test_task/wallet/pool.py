@@ -0,0 +1,264 @@
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+
+from django.db import OperationalError
+
+# Values of the pool statistics that go up and down, the others only go up.
+GAUGES = ("idle", "checked_out", "overflow")
+
+
+class PoolTimeoutError(OperationalError):
+    """No connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Connections of one database kept open for reuse by this process.
+
+    At most ``size`` idle connections are kept, and up to ``max_overflow``
+    more are opened under load and closed when given back. A checkout waits
+    up to ``timeout`` seconds while every connection is taken. A connection
+    older than ``recycle`` seconds is replaced at checkout, and with
+    ``pre_ping`` an idle one is checked before it is handed out. The most
+    recently returned connection is reused first, so the rest can age out.
+    """
+
+    def __init__(
+        self,
+        *,
+        size: int,
+        max_overflow: int,
+        recycle: float,
+        timeout: float,
+        pre_ping: bool,
+    ) -> None:
+        """Start with no connection open."""
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+        self._idle: deque[object] = deque()
+        self._opened_at: dict[int, float] = {}
+        self._checked_out = 0
+        self._condition = threading.Condition()
+        self._counters = Counter()
+
+    def acquire(
+        self, connect: Callable[[], object], check: Callable[[object], bool]
+    ) -> tuple[object, bool]:
+        """
+        Return a connection, and whether it was reused rather than opened.
+
+        ``connect`` opens a connection and ``check`` tells whether an idle one
+        still works. Raise ``PoolTimeoutError`` when none frees up in time.
+        """
+        connection = self._take()
+        try:
+            if connection is not None:
+                opened_at = self._opened_at[id(connection)]
+                if time.monotonic() - opened_at >= self.recycle:
+                    self._count("recycled")
+                elif self.pre_ping and not check(connection):
+                    self._count("failed_checks")
+                else:
+                    return connection, True
+                self._forget(connection)
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._checked_out -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = time.monotonic()
+            self._counters["created"] += 1
+        return connection, False
+
+    def _take(self) -> object | None:
+        """Reserve a connection, idle or yet to be opened, waiting if needed."""
+        deadline = None
+        with self._condition:
+            while not self._idle and (
+                self._checked_out >= self.size + self.max_overflow
+            ):
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                    self._counters["waits"] += 1
+                if now >= deadline:
+                    self._counters["timeouts"] += 1
+                    self._counters["wait_seconds"] += self.timeout
+                    msg = (
+                        f"No database connection became free within "
+                        f"{self.timeout} seconds."
+                    )
+                    raise PoolTimeoutError(msg)
+                self._condition.wait(deadline - now)
+            if deadline is not None:
+                self._counters["wait_seconds"] += time.monotonic() - (
+                    deadline - self.timeout
+                )
+            self._checked_out += 1
+            self._counters["checkouts"] += 1
+            return self._idle.pop() if self._idle else None
+
+    def release(
+        self, connection: object, *, reset: bool = False, discard: bool = False
+    ) -> None:
+        """
+        Take a connection back, closing it when broken or beyond ``size``.
+
+        With ``reset`` an open transaction is rolled back first.
+        """
+        if reset and not discard:
+            try:
+                connection.rollback()
+            except Exception:  # noqa: BLE001
+                discard = True
+        with self._condition:
+            self._checked_out -= 1
+            keep = not discard and len(self._idle) < self.size
+            if keep:
+                self._idle.append(connection)
+            self._condition.notify()
+        if not keep:
+            self._forget(connection)
+
+    def _count(self, name: str) -> None:
+        with self._condition:
+            self._counters[name] += 1
+
+    def _forget(self, connection: object) -> None:
+        """Close a connection that leaves the pool."""
+        with self._condition:
+            self._opened_at.pop(id(connection), None)
+        with contextlib.suppress(Exception):
+            connection.close()
+
+    def dispose(self) -> None:
+        """Close every idle connection."""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection in idle:
+            self._forget(connection)
+
+    def stats(self) -> dict[str, float]:
+        """Return the connection counts and the counters of the pool."""
+        with self._condition:
+            idle, checked_out = len(self._idle), self._checked_out
+            counters = dict(self._counters)
+        return {
+            "idle": idle,
+            "checked_out": checked_out,
+            "overflow": max(idle + checked_out - self.size, 0),
+            **counters,
+        }
+
+
+_pools: dict[str, tuple[tuple, ConnectionPool]] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, settings_dict: dict) -> ConnectionPool | None:
+    """
+    Return the pool of a database alias in this process, if it is pooled.
+
+    A forked process gets pools of its own, and one is replaced when the
+    database it connects to changes, as when the test database is set up.
+    """
+    options = settings_dict.get("POOL_OPTIONS")
+    if not options:
+        return None
+    key = (
+        os.getpid(),
+        *(settings_dict.get(name) for name in ("NAME", "HOST", "PORT", "USER")),
+    )
+    with _pools_lock:
+        current = _pools.get(alias)
+        if current is not None and current[0] == key:
+            return current[1]
+        pool = ConnectionPool(
+            size=options.get("POOL_SIZE", 10),
+            max_overflow=options.get("MAX_OVERFLOW", 10),
+            recycle=options.get("RECYCLE", 3600),
+            timeout=options.get("TIMEOUT", 30),
+            pre_ping=options.get("PRE_PING", True),
+        )
+        _pools[alias] = (key, pool)
+    if current is not None and current[1].pid == os.getpid():
+        current[1].dispose()
+    return pool
+
+
+def stats() -> dict[str, dict[str, float]]:
+    """Return the statistics of every pool of this process by alias."""
+    with _pools_lock:
+        pools = {alias: pool for alias, (_key, pool) in _pools.items()}
+    return {
+        alias: pool.stats() for alias, pool in pools.items() if pool.pid == os.getpid()
+    }
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database wrapper taking its connections from the pool of its alias.
+
+    Django still opens and closes a connection around every request as set by
+    ``CONN_MAX_AGE``, but opening takes an idle pooled connection, whose
+    session was set up when it was first opened, and closing gives it back,
+    rolled back if a transaction was left open. A connection closed inside an
+    atomic block is closed for real, as the wrapper keeps referring to it.
+    ``POOL_OPTIONS`` of the database settings configure the pool; without
+    them connections are not pooled.
+    """
+
+    pool: ConnectionPool | None = None
+    pool_reused = False
+
+    def get_new_connection(self, conn_params: dict) -> object:
+        """Take a connection from the pool, or open one without a pool."""
+        self.pool = get_pool(self.alias, self.settings_dict)
+        connect = functools.partial(super().get_new_connection, conn_params)
+        if self.pool is None:
+            self.pool_reused = False
+            return connect()
+        connection, self.pool_reused = self.pool.acquire(
+            connect, self.check_pooled_connection
+        )
+        return connection
+
+    def init_connection_state(self) -> None:
+        """Set up the session of new connections only."""
+        if not self.pool_reused:
+            super().init_connection_state()
+
+    def check_pooled_connection(self, connection: object) -> bool:
+        """Return whether an idle connection still answers."""
+        try:
+            with contextlib.closing(connection.cursor()) as cursor:
+                cursor.execute("SELECT 1")
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self) -> None:
+        # The connection goes back to the pool it came from, even if the
+        # settings have moved the alias to another one since.
+        if self.pool is None or self.connection is None:
+            super()._close()
+            return
+        discard = self.in_atomic_block or (
+            self.errors_occurred and not self.is_usable()
+        )
+        with self.wrap_database_errors:
+            self.pool.release(
+                self.connection, reset=not self.autocommit, discard=discard
+            )
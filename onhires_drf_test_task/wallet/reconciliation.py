@@ -0,0 +1,181 @@
+import json
+import typing
+from collections.abc import Callable
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.db import connections, transaction
+from django.db.models import Max, Min, Sum
+
+from . import caching, services, versions
+from .models import ArchivedTransaction, Transaction, Wallet
+
+DEFAULT_RANGE_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class BalanceDrift:
+    """A wallet whose balance differs from the sum of its transactions."""
+
+    wallet_pk: int
+    balance: Decimal
+    ledger_balance: Decimal
+    repaired: bool = False
+
+
+class Checkpoint:
+    """Completed wallet id ranges of a reconciliation run, stored as JSON."""
+
+    def __init__(self, path: Path | None, range_size: int) -> None:
+        """Load the completed ranges of a previous run with the same range size."""
+        self.path = path
+        self.range_size = range_size
+        self.completed: dict[int, int] = {}
+        if path is not None and path.exists():
+            state = json.loads(path.read_text())
+            if state.get("range_size") == range_size:
+                self.completed = {
+                    int(start): drifts for start, drifts in state["completed"].items()
+                }
+
+    def mark(self, start: int, drifts: int) -> None:
+        """Record a completed range and persist the checkpoint."""
+        self.completed[start] = drifts
+        if self.path is None:
+            return
+        state = {"range_size": self.range_size, "completed": self.completed}
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        tmp_path.write_text(json.dumps(state))
+        tmp_path.replace(self.path)
+
+
+def ledger_totals(**filters: typing.Any) -> dict[int, Decimal]:  # noqa: ANN401
+    """Return the transaction sums of the matching wallets, archived ones included."""
+    totals: dict[int, Decimal] = {}
+    for model in (Transaction, ArchivedTransaction):
+        for wallet_pk, total in (
+            model.objects.filter(**filters)
+            .order_by()
+            .values_list("wallet_id")
+            .annotate(total=Sum("amount"))
+        ):
+            totals[wallet_pk] = totals.get(wallet_pk, Decimal(0)) + total
+    return totals
+
+
+def wallet_id_ranges(range_size: int) -> list[tuple[int, int]]:
+    """Split the wallet id space into half-open ``[start, stop)`` ranges."""
+    bounds = Wallet.objects.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return []
+    return [
+        (start, min(start + range_size, bounds["high"] + 1))
+        for start in range(bounds["low"], bounds["high"] + 1, range_size)
+    ]
+
+
+def repair_wallet_balance(wallet_pk: int) -> BalanceDrift | None:
+    """
+    Reset a wallet balance to the sum of its transactions.
+
+    The drift is re-checked under a row lock held only for this wallet, so
+    transactions committed after the range scan are not overwritten. A sharded
+    wallet gets the ledger sum spread over its shards. A ledger sum below zero
+    cannot be stored as a balance and is left unrepaired.
+    Returns ``None`` when the wallet turns out to be consistent.
+    """
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().filter(pk=wallet_pk).first()
+        if wallet is None:
+            return None
+
+        ledger_balance = ledger_totals(wallet_id=wallet_pk).get(wallet_pk, Decimal(0))
+        balance = wallet.balance
+        if balance == ledger_balance:
+            return None
+
+        repaired = ledger_balance >= Decimal(0)
+        if repaired and wallet.shard_count:
+            services.shard_wallet(wallet_pk, wallet.shard_count, ledger_balance)
+        elif repaired:
+            Wallet.objects.filter(pk=wallet_pk).update(
+                balance=ledger_balance, version=versions.bump_version()
+            )
+            caching.invalidate_wallets(wallet_pk)
+        return BalanceDrift(wallet_pk, balance, ledger_balance, repaired)
+
+
+def reconcile_range(start: int, stop: int) -> list[BalanceDrift]:
+    """
+    Compare the balances of wallets ``start <= id < stop`` with their ledgers.
+
+    Every side is read with one grouped query inside a single transaction,
+    which gives a consistent snapshot without locking any rows.
+    """
+    with transaction.atomic():
+        ledger = ledger_totals(wallet_id__gte=start, wallet_id__lt=stop)
+        balances = Wallet.objects.filter(pk__gte=start, pk__lt=stop).values_list(
+            "pk", "balance"
+        )
+        return [
+            BalanceDrift(pk, balance, ledger.get(pk, Decimal(0)))
+            for pk, balance in balances
+            if balance != ledger.get(pk, Decimal(0))
+        ]
+
+
+def reconcile_balances(
+    *,
+    range_size: int = DEFAULT_RANGE_SIZE,
+    workers: int = 1,
+    repair: bool = False,
+    checkpoint_path: Path | None = None,
+    on_range: Callable[[int, int, list[BalanceDrift]], None] | None = None,
+) -> list[BalanceDrift]:
+    """
+    Reconcile every wallet balance with the sum of its transactions.
+
+    The wallet id space is split into ranges of ``range_size`` ids that are
+    checked in a pool of ``workers`` processes. The workers only read; drifted
+    wallets are repaired one by one by the calling process. Completed ranges
+    are written to ``checkpoint_path`` so an interrupted run resumes where it
+    stopped. Returns the drifts found by this run.
+    """
+    checkpoint = Checkpoint(checkpoint_path, range_size)
+    ranges = [
+        bounds
+        for bounds in wallet_id_ranges(range_size)
+        if bounds[0] not in checkpoint.completed
+    ]
+    found = []
+
+    def complete(start: int, stop: int, drifts: list[BalanceDrift]) -> None:
+        if repair:
+            drifts = [
+                repaired
+                for drift in drifts
+                if (repaired := repair_wallet_balance(drift.wallet_pk)) is not None
+            ]
+        checkpoint.mark(start, len(drifts))
+        found.extend(drifts)
+        if on_range is not None:
+            on_range(start, stop, drifts)
+
+    if workers <= 1:
+        for start, stop in ranges:
+            complete(start, stop, reconcile_range(start, stop))
+        return found
+
+    # Connections must not be shared with the forked workers.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        futures = {
+            pool.submit(reconcile_range, start, stop): (start, stop)
+            for start, stop in ranges
+        }
+        for future in as_completed(futures):
+            complete(*futures[future], future.result())
+    return found
@@ -0,0 +1,123 @@
+import json
+import typing
+from decimal import Decimal
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class DecimalJSONEncoder(JSONEncoder):
+    """
+    Encoder of the stock JSON renderer that keeps Decimals exact.
+
+    The stock encoder turns a Decimal into a float. Serializer fields format
+    balances and amounts as strings already, so only raw Decimals, such as
+    aggregates in diagnostics payloads, are affected: they become their exact
+    string instead.
+    """
+
+    def default(self, obj: typing.Any) -> typing.Any:  # noqa: ANN401
+        """Encode a Decimal as its string and the rest like the stock encoder."""
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+# Types orjson and msgpack do not serialize natively, such as Decimal, lazy
+# strings and querysets, fall back to the same encoder.
+_encoder = DecimalJSONEncoder()
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Base renderer of streamed exports.
+
+    Export rows are written straight into a streaming response, so the
+    renderer only serves content negotiation and renders the payloads that are
+    not streamed, such as validation errors, as JSON.
+    """
+
+    charset = "utf-8"
+
+    def render(  # noqa: PLR6301
+        self,
+        data: typing.Any,  # noqa: ANN401
+        accepted_media_type: str | None = None,  # noqa: ARG002
+        renderer_context: dict | None = None,  # noqa: ARG002
+    ) -> bytes:
+        """Render a payload that is not streamed as JSON."""
+        if data is None:
+            return b""
+        return json.dumps(data, cls=DecimalJSONEncoder, ensure_ascii=False).encode()
+
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer built on orjson.
+
+    The compact output is byte-identical to ``JSONRenderer`` with
+    ``DecimalJSONEncoder``: datetimes and Decimals go through that encoder and
+    line separators are escaped the same way. Indented output, as requested by
+    the browsable API, and non-default JSON settings are left to
+    ``JSONRenderer``.
+    """
+
+    encoder_class = DecimalJSONEncoder
+
+    def render(
+        self,
+        data: typing.Any,  # noqa: ANN401
+        accepted_media_type: str | None = None,
+        renderer_context: dict | None = None,
+    ) -> bytes:
+        """Render ``data`` into compact JSON."""
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack renderer for service-to-service clients.
+
+    The payload carries the same values as the JSON one. Raw Decimals are
+    encoded by ``DecimalJSONEncoder`` as exact strings.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(  # noqa: PLR6301
+        self,
+        data: typing.Any,  # noqa: ANN401
+        accepted_media_type: str | None = None,  # noqa: ARG002
+        renderer_context: dict | None = None,  # noqa: ARG002
+    ) -> bytes:
+        """Render ``data`` into MessagePack."""
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_encoder.default, datetime=False)
@@ -1,10 +1,21 @@
+import functools
+import typing
+from collections.abc import Callable
 from decimal import Decimal
 from typing import ClassVar
 
-from django.db import transaction
-from rest_framework import serializers
+from django.db.models import QuerySet
+from rest_framework import exceptions, serializers
 
-from .models import Transaction, Wallet
+from . import services
+from .models import ArchivedTransaction, Transaction, Wallet
+
+NEGATIVE_BALANCE_MESSAGE = "Transaction denied: Wallet balance cannot be negative."
+WALLET_LOCKED_MESSAGE = "The wallet is currently locked. Please try again later."
+WALLET_MISSING_MESSAGE = "Wallet does not exist."
+TRANSACTION_CHANGED_MESSAGE = (
+    "The transaction was changed concurrently. Please try again."
+)
 
 
 class WalletSerializer(serializers.ModelSerializer):
@@ -12,11 +23,63 @@ class WalletSerializer(serializers.ModelSerializer):
         model = Wallet
         fields: ClassVar[list[str]] = ["id", "label", "balance"]
 
+    def update(self, instance: Wallet, validated_data: dict) -> Wallet:
+        """Spread a new balance of a sharded wallet over its shards."""
+        if instance.shard_count and "balance" in validated_data:
+            instance.balance = services.shard_wallet(
+                instance.pk, instance.shard_count, validated_data.pop("balance")
+            ).balance
+        return super().update(instance, validated_data)
+
+
+class WalletStatsSerializer(serializers.Serializer):
+    """Represent the transaction aggregates of a wallet."""
+
+    transaction_count = serializers.IntegerField()
+    total_credits = serializers.DecimalField(max_digits=30, decimal_places=2)
+    total_debits = serializers.DecimalField(max_digits=30, decimal_places=2)
+    min_amount = serializers.DecimalField(
+        max_digits=18, decimal_places=2, allow_null=True
+    )
+    max_amount = serializers.DecimalField(
+        max_digits=18, decimal_places=2, allow_null=True
+    )
+
+
+class WalletShardingSerializer(serializers.Serializer):
+    """Validate the number of shards requested for a wallet."""
+
+    shard_count = serializers.IntegerField(
+        min_value=0, max_value=services.MAX_WALLET_SHARDS
+    )
+
+
+class BulkTransactionSerializer(serializers.Serializer):
+    """Validate the shape of a single bulk ingestion item."""
+
+    MAX_ITEMS = 10_000
+
+    txid = serializers.CharField(max_length=255)
+    wallet = serializers.IntegerField(min_value=1)
+    amount = serializers.DecimalField(max_digits=18, decimal_places=2)
+
 
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
-        fields: ClassVar[list[str]] = ["id", "txid", "wallet", "amount"]
+        fields: ClassVar[list[str]] = ["id", "txid", "wallet", "amount", "created_at"]
+
+    def validate_txid(self, value: str) -> str:
+        """Validate that the txid is not taken by an archived transaction."""
+        archived = ArchivedTransaction.objects.filter(txid=value)
+        if self.instance is not None:
+            # Archived rows keep their id, this one is reported by the write.
+            archived = archived.exclude(pk=self.instance.pk)
+        if archived.exists():
+            raise serializers.ValidationError(
+                "transaction with this txid already exists."
+            )
+        return value
 
     def validate(self, data: dict) -> dict:  # noqa: PLR6301
         """Validate that the transaction will not cause a negative wallet balance."""
@@ -35,31 +98,43 @@ class TransactionSerializer(serializers.ModelSerializer):
 
         return data
 
-    def create(self, validated_data: dict) -> Transaction:  # noqa: PLR6301
-        """Create a transaction and update the wallet balance atomically."""
+    @staticmethod
+    def write_with_deltas(
+        deltas: dict[int, Decimal],
+        write: Callable[[], typing.Any],
+        wallets: list[Wallet],
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> typing.Any:  # noqa: ANN401
+        """Apply the deltas through the configured write mode and report failures."""
         try:
-            with transaction.atomic():
-                wallet = Wallet.objects.select_for_update(nowait=True).get(
-                    pk=validated_data["wallet"].pk
-                )
-
-                new_balance = wallet.balance + validated_data["amount"]
-
-                if new_balance < Decimal(0):
-                    raise serializers.ValidationError(
-                        "Transaction denied: Wallet balance cannot be negative."
-                    )
-
-                wallet.balance = new_balance
-                wallet.save()
-
-                return Transaction.objects.create(**validated_data)
-        except ZeroDivisionError as exc:
-            raise serializers.ValidationError(
-                "The wallet is currently locked. Please try again later."
-            ) from exc
-
-    def update(self, instance: Transaction, validated_data: dict) -> Transaction:  # noqa: PLR6301
+            return services.write_with_deltas(
+                deltas, write, services.shard_counts(*wallets), **kwargs
+            )
+        except services.InsufficientFundsError as exc:
+            raise serializers.ValidationError(NEGATIVE_BALANCE_MESSAGE) from exc
+        except services.WalletBusyError as exc:
+            raise serializers.ValidationError(WALLET_LOCKED_MESSAGE) from exc
+        except services.TransactionChangedError as exc:
+            raise serializers.ValidationError(TRANSACTION_CHANGED_MESSAGE) from exc
+        except Wallet.DoesNotExist as exc:
+            raise serializers.ValidationError({
+                "wallet": [WALLET_MISSING_MESSAGE]
+            }) from exc
+        except Transaction.DoesNotExist as exc:
+            raise exceptions.NotFound from exc
+
+    def create(self, validated_data: dict) -> Transaction:
+        """Create a transaction and update the wallet balance atomically."""
+        wallet, amount = validated_data["wallet"], validated_data["amount"]
+        return self.write_with_deltas(
+            {wallet.pk: amount},
+            lambda: Transaction.objects.create(**validated_data),
+            [wallet],
+            nowait=True,
+            added=[(wallet.pk, amount)],
+        )
+
+    def update(self, instance: Transaction, validated_data: dict) -> Transaction:
         """
         Update a transaction and update the wallet balance atomically.
 
@@ -67,49 +142,94 @@ class TransactionSerializer(serializers.ModelSerializer):
           the old wallet and added to the new wallet.
 
         """
-        try:
-            with transaction.atomic():
-                old_wallet = Wallet.objects.select_for_update().get(
-                    pk=instance.wallet.pk
+        old_wallet, old_amount = instance.wallet, instance.amount
+        new_wallet = validated_data.get("wallet", old_wallet)
+        new_amount = validated_data.get("amount", old_amount)
+
+        def write() -> Transaction:
+            row = services.unchanged_transaction(instance.pk, old_wallet.pk, old_amount)
+            if not row.update(**validated_data):
+                raise services.unmatched_transaction_error(instance.pk)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            return instance
+
+        return self.write_with_deltas(
+            services.move_deltas(old_wallet.pk, old_amount, new_wallet.pk, new_amount),
+            write,
+            [old_wallet, new_wallet],
+            added=[(new_wallet.pk, new_amount)],
+            removed=[(old_wallet.pk, old_amount)],
+        )
+
+
+class LeanListSerializer:
+    """
+    Read-only fast path producing the list output of a model serializer.
+
+    Rows are fetched with ``values()`` for the declared fields of
+    ``serializer_class`` and formatted directly, without model instances or
+    per-field serializer calls. The output equals the serializer's ``data``
+    for the same rows, so a view can switch between the two freely.
+    """
+
+    serializer_class: type[serializers.ModelSerializer]
+    extra_columns: ClassVar[list[str]] = []
+
+    def __init__(self) -> None:
+        """Use the field formatters built once per lean serializer class."""
+        self.fields = self.build_fields()
+        self.columns = [source for _, source, _ in self.fields]
+
+    @classmethod
+    @functools.cache
+    def build_fields(
+        cls,
+    ) -> list[tuple[str, str, Callable[[typing.Any], typing.Any] | None]]:
+        """Return the name, source column and formatter of every declared field."""
+        fields = []
+        for name, field in cls.serializer_class().fields.items():
+            if isinstance(field, serializers.DecimalField):
+                exponent = Decimal(1).scaleb(-field.decimal_places)
+                formatter = functools.partial(cls.format_decimal, exponent)
+            elif isinstance(
+                field,
+                serializers.IntegerField | serializers.PrimaryKeyRelatedField,
+            ):
+                formatter = None
+            elif isinstance(field, serializers.CharField):
+                formatter = str
+            else:
+                formatter = field.to_representation
+            fields.append((name, field.source, formatter))
+        return fields
+
+    @staticmethod
+    def format_decimal(exponent: Decimal, value: Decimal) -> str:
+        """Format a decimal the way ``DecimalField`` does for stored values."""
+        return f"{value.quantize(exponent):f}"
+
+    def values(self, queryset: QuerySet) -> QuerySet:
+        """Return the queryset of the row dicts this serializer formats."""
+        return queryset.values(*dict.fromkeys([*self.columns, *self.extra_columns]))
+
+    def to_representation(self, rows: typing.Iterable[dict]) -> list[dict]:
+        """Format the rows like the serializer would format their instances."""
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, formatter in self.fields:
+                value = row[source]
+                item[name] = (
+                    value if formatter is None or value is None else formatter(value)
                 )
-                new_wallet = validated_data.get("wallet", instance.wallet)
-                new_wallet = Wallet.objects.select_for_update().get(pk=new_wallet.pk)
-
-                old_amount = instance.amount
-                new_amount = validated_data.get("amount", instance.amount)
-
-                if old_wallet.pk != new_wallet.pk:
-                    old_wallet.balance -= old_amount
-                    if old_wallet.balance < Decimal(0):
-                        raise serializers.ValidationError(
-                            "Transaction denied: Wallet balance cannot be negative."
-                        )
-                    old_wallet.save()
-
-                    new_balance = new_wallet.balance + new_amount
-                    if new_balance < Decimal(0):
-                        raise serializers.ValidationError(
-                            "Transaction denied: Wallet balance cannot be negative."
-                        )
-                    new_wallet.balance = new_balance
-                    new_wallet.save()
-                else:
-                    amount_difference = new_amount - old_amount
-                    new_balance = old_wallet.balance + amount_difference
-                    if new_balance < Decimal(0):
-                        raise serializers.ValidationError(
-                            "Transaction denied: Wallet balance cannot be negative."
-                        )
-                    old_wallet.balance = new_balance
-                    old_wallet.save()
-
-                for attr, value in validated_data.items():
-                    setattr(instance, attr, value)
-                instance.save()
-
-                return instance
-
-        except ZeroDivisionError as exc:
-            raise serializers.ValidationError(
-                "The wallet is currently locked. Please try again later."
-            ) from exc
+            data.append(item)
+        return data
+
+
+class LeanTransactionSerializer(LeanListSerializer):
+    serializer_class = TransactionSerializer
+
+
+class LeanWalletSerializer(LeanListSerializer):
+    serializer_class = WalletSerializer
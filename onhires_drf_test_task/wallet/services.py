@@ -0,0 +1,566 @@
+import contextlib
+import random
+import threading
+import time
+import typing
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_DOWN
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F, QuerySet, Sum
+
+from . import aggregates, caching, contention, validators, versions
+from .models import ArchivedTransaction, Transaction, Wallet, WalletShard
+
+BULK_LOOKUP_CHUNK_SIZE = 1000
+BULK_CREATE_BATCH_SIZE = 1000
+
+WRITE_MODE_LOCKING = "locking"
+WRITE_MODE_CONDITIONAL = "conditional"
+WRITE_MODE_OPTIMISTIC = "optimistic"
+
+MAX_WALLET_SHARDS = 64
+
+# MySQL lock wait timeout and deadlock, SQLSTATE serialization failure and
+# PostgreSQL deadlock. SQLite reports a busy database by message only.
+LOCK_CONFLICT_ERROR_CODES = frozenset({1205, 1213})
+LOCK_CONFLICT_SQLSTATES = frozenset({"40001", "40P01"})
+
+T = typing.TypeVar("T")
+
+_write_stats = Counter(retries=0, give_ups=0)
+_write_stats_lock = threading.Lock()
+
+
+class InsufficientFundsError(Exception):
+    """Raised when a balance change would make a wallet balance negative."""
+
+    def __init__(self, wallet_pk: int) -> None:
+        """Store the wallet that rejected the change."""
+        super().__init__(f"Wallet {wallet_pk} balance cannot be negative.")
+        self.wallet_pk = wallet_pk
+
+
+class WalletBusyError(Exception):
+    """Raised when a wallet changed concurrently and the request should be retried."""
+
+    def __init__(self, wallet_pk: int) -> None:
+        """Store the wallet that could not be changed."""
+        super().__init__(f"Wallet {wallet_pk} is currently locked.")
+        self.wallet_pk = wallet_pk
+
+
+class TransactionChangedError(Exception):
+    """Raised when a transaction row changed between its read and its write."""
+
+    def __init__(self, transaction_pk: int) -> None:
+        """Store the transaction that changed."""
+        super().__init__(f"Transaction {transaction_pk} changed concurrently.")
+        self.transaction_pk = transaction_pk
+
+
+class WriteConflictError(Exception):
+    """Raised when a write attempt lost against a concurrent one and may be retried."""
+
+    def __init__(self, wallet_pk: int) -> None:
+        """Store the wallet the attempt conflicted on."""
+        super().__init__(f"Wallet {wallet_pk} changed concurrently.")
+        self.wallet_pk = wallet_pk
+
+
+class VersionConflictError(WriteConflictError):
+    """Raised when a wallet version changed between its read and its update."""
+
+
+class LockConflictError(WriteConflictError):
+    """Raised when the database aborted an attempt on a deadlock or a lock timeout."""
+
+
+@dataclass
+class BulkIngestResult:
+    """Outcome of a bulk transaction ingestion."""
+
+    created: int = 0
+    rejected: list[dict[str, typing.Any]] = field(default_factory=list)
+    transactions: list[Transaction] = field(default_factory=list)
+
+    def reject(self, index: int, txid: str, detail: str) -> None:
+        """Record a rejected item."""
+        self.rejected.append({"index": index, "txid": txid, "detail": detail})
+
+
+def is_lock_conflict(exc: OperationalError) -> bool:
+    """Return whether a database error is a deadlock or a lock wait timeout."""
+    if exc.args and exc.args[0] in LOCK_CONFLICT_ERROR_CODES:
+        return True
+    cause = exc.__cause__
+    sqlstate = getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)
+    return sqlstate in LOCK_CONFLICT_SQLSTATES or "database is locked" in str(exc)
+
+
+@contextlib.contextmanager
+def recorded_locks(wallet_pks: list[int], *, nowait: bool = False) -> Iterator[None]:
+    """
+    Record the locks taken in the block in the contention profile of wallets.
+
+    The time the block takes is recorded as lock wait. Deadlocks and lock wait
+    timeouts are recorded as lock conflicts. Other database errors of a
+    ``nowait`` block and ``WalletBusyError``, raised when ``SKIP LOCKED``
+    found the rows held, are recorded as NOWAIT failures.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except OperationalError as exc:
+        if is_lock_conflict(exc):
+            contention.record(contention.LOCK_CONFLICTS, wallet_pks)
+        elif nowait:
+            contention.record(contention.NOWAIT_FAILURES, wallet_pks)
+        raise
+    except WalletBusyError:
+        contention.record(contention.NOWAIT_FAILURES, wallet_pks)
+        raise
+    contention.record(contention.WAIT_SECONDS, wallet_pks, time.perf_counter() - start)
+
+
+def _record(event: str) -> None:
+    with _write_stats_lock:
+        _write_stats[event] += 1
+
+
+def write_stats() -> dict[str, int]:
+    """Return the write conflict retry and give-up counters of this process."""
+    with _write_stats_lock:
+        return dict(_write_stats)
+
+
+def move_deltas(
+    old_wallet_pk: int,
+    old_amount: Decimal,
+    new_wallet_pk: int,
+    new_amount: Decimal,
+) -> dict[int, Decimal]:
+    """Return the per-wallet deltas of replacing one transaction with another."""
+    deltas = {old_wallet_pk: -old_amount}
+    deltas[new_wallet_pk] = deltas.get(new_wallet_pk, Decimal(0)) + new_amount
+    return deltas
+
+
+def unchanged_transaction(pk: int, wallet_pk: int, amount: Decimal) -> QuerySet:
+    """
+    Return the transaction ``pk`` if it still has the wallet and amount read.
+
+    Writes computing their balance deltas from a read of the row update or
+    delete it through this queryset, so a row changed by a concurrent write
+    is matched by neither and its deltas are never applied twice.
+    """
+    return Transaction.objects.filter(pk=pk, wallet_id=wallet_pk, amount=amount)
+
+
+def unmatched_transaction_error(pk: int) -> Exception:
+    """Return the error of a write that matched no ``unchanged_transaction``."""
+    if Transaction.objects.filter(pk=pk).exists():
+        return TransactionChangedError(pk)
+    # A row archived or deleted since it was read must not come back.
+    return Transaction.DoesNotExist()
+
+
+def shard_counts(*wallets: Wallet) -> dict[int, int]:
+    """Return the shard count of every given wallet by primary key."""
+    return {wallet.pk: wallet.shard_count for wallet in wallets}
+
+
+def _split_balance(balance: Decimal, parts: int) -> list[Decimal]:
+    """Split a balance into ``parts`` even shares, the remainder goes first."""
+    share = (balance / parts).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+    return [balance - share * (parts - 1), *[share] * (parts - 1)]
+
+
+def shard_wallet(
+    wallet_pk: int,
+    shard_count: int,
+    balance: Decimal | None = None,
+) -> Wallet:
+    """
+    Spread the balance of a wallet over ``shard_count`` shard rows.
+
+    The current balance, or ``balance`` when given, is split evenly over fresh
+    shards and the wallet row keeps the total. A ``shard_count`` of 0 drops
+    the shards.
+    """
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().get(pk=wallet_pk)
+        shards = WalletShard.objects.filter(wallet=wallet)
+        if balance is None:
+            balance = wallet.balance
+        validators.validate_wallet_balance(balance)
+
+        shards.delete()
+        if shard_count:
+            WalletShard.objects.bulk_create(
+                WalletShard(
+                    wallet=wallet,
+                    index=index,
+                    balance=share,
+                    version=versions.next_version(),
+                )
+                for index, share in enumerate(_split_balance(balance, shard_count))
+            )
+        wallet.balance = balance
+        wallet.shard_count = shard_count
+        wallet.save(update_fields=["balance", "shard_count"])
+        return wallet
+
+
+def apply_shard_delta(wallet_pk: int, delta: Decimal, shard_count: int) -> None:
+    """
+    Apply a balance delta to a sharded wallet and its shards.
+
+    The wallet row holds the total, which the balance filters and ordering
+    read through the ``(balance, id)`` index, so the delta is applied to it
+    first by ``apply_balance_deltas``. That also locks the wallet row before
+    any of its shards, like every other path. A credit is then added to one
+    random shard with a single UPDATE. A debit takes the fullest shards that
+    no other transaction holds, one ``SELECT ... FOR UPDATE SKIP LOCKED`` at a
+    time, until they cover the amount. Every shard stays non-negative. The
+    locks of the wallet row and of its shards are recorded in the contention
+    profile of the wallet.
+    """
+    with recorded_locks([wallet_pk]):
+        apply_balance_deltas({wallet_pk: delta})
+        if delta >= 0:
+            updated = WalletShard.objects.filter(
+                wallet_id=wallet_pk,
+                index=random.randrange(shard_count),  # noqa: S311
+            ).update(balance=F("balance") + delta, version=versions.bump_version())
+            if not updated:
+                raise WalletBusyError(wallet_pk)
+            caching.invalidate_wallets(wallet_pk)
+            return
+
+        remaining, taken = -delta, []
+        while remaining > 0:
+            shard = (
+                WalletShard.objects.select_for_update(skip_locked=True)
+                .filter(wallet_id=wallet_pk, balance__gt=0)
+                .exclude(pk__in=[shard.pk for shard in taken])
+                .order_by("-balance")
+                .first()
+            )
+            if shard is None:
+                break
+            amount = min(shard.balance, remaining)
+            shard.balance -= amount
+            shard.version = versions.next_version(shard.version)
+            remaining -= amount
+            taken.append(shard)
+
+        if remaining > 0:
+            total = WalletShard.objects.filter(wallet_id=wallet_pk).aggregate(
+                total=Sum("balance")
+            )["total"] or Decimal(0)
+            if total < -delta:
+                raise InsufficientFundsError(wallet_pk)
+            raise WalletBusyError(wallet_pk)
+
+        WalletShard.objects.bulk_update(taken, ["balance", "version"])
+        caching.invalidate_wallets(wallet_pk)
+
+
+def apply_balance_deltas(deltas: dict[int, Decimal]) -> None:
+    """
+    Apply balance deltas with one conditional UPDATE per wallet.
+
+    Each statement is ``balance = balance + delta WHERE id = ? AND
+    balance + delta >= 0``, so the wallet row is locked by the statement
+    itself instead of by a preceding ``SELECT ... FOR UPDATE``. Wallets are
+    updated in primary key order. Must be called inside an atomic block: the
+    first rejected delta raises ``InsufficientFundsError``, or
+    ``Wallet.DoesNotExist`` when the wallet is gone, and the caller's
+    transaction is expected to roll back the deltas applied before it.
+    """
+    for wallet_pk in sorted(deltas):
+        delta = deltas[wallet_pk]
+        updated = Wallet.objects.filter(pk=wallet_pk, balance__gte=-delta).update(
+            balance=F("balance") + delta, version=versions.bump_version()
+        )
+        if not updated:
+            # The statement matched nothing, tell a missing wallet from a short one.
+            if not Wallet.objects.filter(pk=wallet_pk).exists():
+                raise Wallet.DoesNotExist
+            raise InsufficientFundsError(wallet_pk)
+        caching.invalidate_wallets(wallet_pk)
+
+
+def lock_wallets(
+    wallet_pks: typing.Iterable[int],
+    *,
+    nowait: bool = False,
+) -> dict[int, Wallet]:
+    """
+    Lock wallets with a single ``SELECT ... FOR UPDATE`` in primary key order.
+
+    Every path that locks several wallets goes through here, so concurrent
+    transactions over the same wallets take their row locks in the same order
+    and cannot deadlock on each other. The wait and the failures of every
+    lock request are recorded in the contention profile of its wallets.
+    """
+    wallet_pks = list(wallet_pks)
+    with recorded_locks(wallet_pks, nowait=nowait):
+        return {
+            wallet.pk: wallet
+            for wallet in Wallet.objects.select_for_update(nowait=nowait)
+            .filter(pk__in=wallet_pks)
+            .order_by("pk")
+        }
+
+
+def apply_locked_deltas(deltas: dict[int, Decimal], *, nowait: bool = False) -> None:
+    """
+    Apply balance deltas to wallets locked by ``lock_wallets``.
+
+    With ``nowait`` a wallet locked by another transaction raises
+    ``WalletBusyError`` right away; otherwise the lock is waited for.
+    """
+    try:
+        wallets = lock_wallets(deltas, nowait=nowait)
+    except OperationalError as exc:
+        if not nowait:
+            raise
+        raise WalletBusyError(min(deltas)) from exc
+
+    for wallet_pk in sorted(deltas):
+        wallet = wallets.get(wallet_pk)
+        if wallet is None:
+            raise Wallet.DoesNotExist
+        wallet.balance += deltas[wallet_pk]
+        if wallet.balance < Decimal(0):
+            raise InsufficientFundsError(wallet_pk)
+        wallet.save()
+
+
+def apply_versioned_deltas(deltas: dict[int, Decimal]) -> None:
+    """
+    Apply balance deltas with compare-and-swap updates on the wallet version.
+
+    Each wallet is read without a lock and written with ``UPDATE ... WHERE id
+    = ? AND version = ?``. No row is locked before its update, and an update
+    that finds another version raises ``VersionConflictError`` so the caller
+    can retry the whole transaction.
+    """
+    for wallet_pk in sorted(deltas):
+        balance, version = Wallet.objects.values_list("balance", "version").get(
+            pk=wallet_pk
+        )
+        new_balance = balance + deltas[wallet_pk]
+        if new_balance < Decimal(0):
+            raise InsufficientFundsError(wallet_pk)
+        updated = Wallet.objects.filter(pk=wallet_pk, version=version).update(
+            balance=new_balance, version=versions.next_version(version)
+        )
+        if not updated:
+            raise VersionConflictError(wallet_pk)
+        caching.invalidate_wallets(wallet_pk)
+
+
+def retry_on_conflict(attempt: Callable[[], T]) -> T:
+    """
+    Run ``attempt`` until it commits without a write conflict.
+
+    Conflicts are retried up to ``WALLET_WRITE_MAX_ATTEMPTS`` attempts in total,
+    sleeping a random time of up to ``WALLET_WRITE_RETRY_BACKOFF`` seconds
+    doubled on every retry. The last conflict raises ``WalletBusyError``. Each
+    attempt must run in its own transaction, so it reads the latest state.
+    """
+    for number in range(1, settings.WALLET_WRITE_MAX_ATTEMPTS):
+        try:
+            return attempt()
+        except WriteConflictError:
+            _record("retries")
+            backoff = settings.WALLET_WRITE_RETRY_BACKOFF * 2 ** (number - 1)
+            time.sleep(random.uniform(0, backoff))  # noqa: S311
+
+    try:
+        return attempt()
+    except WriteConflictError as exc:
+        _record("give_ups")
+        raise WalletBusyError(exc.wallet_pk) from exc
+
+
+def write_with_deltas(  # noqa: PLR0913
+    deltas: dict[int, Decimal],
+    write: Callable[[], T],
+    shard_counts: Mapping[int, int] | None = None,
+    *,
+    nowait: bool = False,
+    added: Iterable[tuple[int, Decimal]] = (),
+    removed: Iterable[tuple[int, Decimal]] = (),
+) -> T:
+    """
+    Apply balance deltas and the matching row write in one atomic block.
+
+    This is the single write path of transaction changes. Deltas of plain
+    wallets are applied before the write as selected by ``WALLET_WRITE_MODE``:
+    under ``SELECT ... FOR UPDATE`` locks (``locking``, waiting only with
+    ``nowait=False``), with conditional UPDATEs (``conditional``) or with
+    version compare-and-swap updates (``optimistic``). Deltas of sharded
+    wallets are then applied to their wallet row and their shards, still
+    before the write, so the shared lock the write takes on the wallet it
+    references is never upgraded. The ``(wallet, amount)`` pairs of the
+    created and deleted transaction rows are then applied to the wallet stats.
+
+    Version conflicts, deadlocks and lock wait timeouts roll the attempt back
+    and retry it. A deadlock inside an outer transaction has already aborted
+    that transaction, so it is only retried when this call owns the
+    transaction.
+    """
+    shard_counts = shard_counts or {}
+    plain = {pk: delta for pk, delta in deltas.items() if not shard_counts.get(pk)}
+    added, removed = list(added), list(removed)
+    mode = settings.WALLET_WRITE_MODE
+    owns_transaction = not transaction.get_connection().in_atomic_block
+
+    def attempt() -> T:
+        try:
+            with transaction.atomic():
+                if mode == WRITE_MODE_CONDITIONAL:
+                    apply_balance_deltas(plain)
+                elif mode == WRITE_MODE_OPTIMISTIC:
+                    apply_versioned_deltas(plain)
+                else:
+                    apply_locked_deltas(plain, nowait=nowait)
+                for pk in sorted(deltas):
+                    if shard_counts.get(pk):
+                        apply_shard_delta(pk, deltas[pk], shard_counts[pk])
+                result = write()
+                aggregates.record_changes(added, removed, shard_counts)
+                return result
+        except OperationalError as exc:
+            if owns_transaction and is_lock_conflict(exc):
+                raise LockConflictError(min(deltas)) from exc
+            raise
+
+    return retry_on_conflict(attempt)
+
+
+def _existing_txids(txids: list[str]) -> set[str]:
+    """Return the txids that are already stored or archived, querying in chunks."""
+    existing = set()
+    for start in range(0, len(txids), BULK_LOOKUP_CHUNK_SIZE):
+        chunk = txids[start : start + BULK_LOOKUP_CHUNK_SIZE]
+        for model in (Transaction, ArchivedTransaction):
+            existing.update(
+                model.objects.filter(txid__in=chunk).values_list("txid", flat=True)
+            )
+    return existing
+
+
+def _lock_wallet_balances(
+    wallet_ids: list[int],
+) -> tuple[dict[int, Wallet], dict[int, Decimal]]:
+    """Lock wallets in primary key order, return the balances."""
+    wallets = lock_wallets(wallet_ids)
+    balances = {pk: wallet.balance for pk, wallet in wallets.items()}
+    return wallets, balances
+
+
+def _write_wallet_balances(
+    wallets: dict[int, Wallet],
+    initial_balances: dict[int, Decimal],
+    balances: dict[int, Decimal],
+    touched: set[int],
+) -> None:
+    """Write the balances and versions of the locked wallets that got rows."""
+    changed = []
+    for pk in sorted(touched):
+        wallet = wallets[pk]
+        delta = balances[pk] - initial_balances[pk]
+        if wallet.shard_count and delta:
+            apply_shard_delta(pk, delta, wallet.shard_count)
+            continue
+        # A batch that nets out still adds rows, so the version moves anyway.
+        wallet.balance = balances[pk]
+        wallet.version = versions.next_version(wallet.version)
+        changed.append(wallet)
+    Wallet.objects.bulk_update(changed, ["balance", "version"])
+    caching.invalidate_wallets(*(wallet.pk for wallet in changed))
+
+
+def ingest_transactions(items: list[dict[str, typing.Any]]) -> BulkIngestResult:
+    """
+    Ingest a batch of transactions with a single atomic commit.
+
+    Every affected wallet is locked once, in primary key order, the summed
+    delta is written once per wallet and the accepted rows are inserted with
+    ``bulk_create``. Items are checked in submission order against the running
+    balance, so a debit may rely on a credit that precedes it in the batch.
+
+    Items that repeat a txid, reference a missing wallet, carry a zero amount
+    or would make a balance negative are rejected individually and reported
+    in the result; the rest of the batch is still committed.
+    """
+    result = BulkIngestResult()
+    candidates = []
+    seen_txids = set()
+    for index, item in enumerate(items):
+        if item["txid"] in seen_txids:
+            result.reject(index, item["txid"], "Duplicate txid within the batch.")
+            continue
+        seen_txids.add(item["txid"])
+        if item["amount"] == Decimal(0):
+            result.reject(
+                index,
+                item["txid"],
+                "Transaction denied: Wallet or amount not provided.",
+            )
+            continue
+        candidates.append((index, item))
+
+    # Known txids are looked up before taking any lock to keep the lock window
+    # short; a txid inserted concurrently still fails the batch on the
+    # unique index and rolls everything back.
+    existing_txids = _existing_txids([item["txid"] for _, item in candidates])
+    wallet_ids = sorted({item["wallet"] for _, item in candidates})
+
+    with transaction.atomic():
+        wallets, initial_balances = _lock_wallet_balances(wallet_ids)
+        balances = dict(initial_balances)
+
+        accepted = []
+        for index, item in candidates:
+            txid, wallet_id, amount = item["txid"], item["wallet"], item["amount"]
+            if txid in existing_txids:
+                result.reject(index, txid, "Transaction with this txid already exists.")
+                continue
+            if wallet_id not in balances:
+                result.reject(index, txid, "Wallet does not exist.")
+                continue
+            new_balance = balances[wallet_id] + amount
+            if new_balance < Decimal(0):
+                result.reject(
+                    index,
+                    txid,
+                    "Transaction denied: Wallet balance cannot be negative.",
+                )
+                continue
+            balances[wallet_id] = new_balance
+            accepted.append(Transaction(txid=txid, amount=amount, wallet_id=wallet_id))
+
+        _write_wallet_balances(
+            wallets,
+            initial_balances,
+            balances,
+            {row.wallet_id for row in accepted},
+        )
+        Transaction.objects.bulk_create(accepted, batch_size=BULK_CREATE_BATCH_SIZE)
+        aggregates.record_changes(
+            [(row.wallet_id, row.amount) for row in accepted],
+            shard_counts={pk: wallet.shard_count for pk, wallet in wallets.items()},
+        )
+
+    result.created = len(accepted)
+    result.transactions = accepted
+    return result
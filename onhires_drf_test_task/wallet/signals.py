@@ -0,0 +1,33 @@
+import typing
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, etags
+from .models import Wallet
+
+
+@receiver([post_save, post_delete], sender=Wallet)
+def invalidate_wallet_responses(
+    sender: type[Wallet],  # noqa: ARG001
+    instance: Wallet,
+    **kwargs: typing.Any,  # noqa: ANN401, ARG001
+) -> None:
+    """
+    Drop the cached responses of a saved or deleted wallet.
+
+    The signals are also sent by the admin bulk delete and ``QuerySet.delete``,
+    which skip ``Wallet.delete``. ``QuerySet.update`` sends none, so its
+    callers invalidate the wallets they change themselves.
+    """
+    caching.invalidate_wallets(instance.pk)
+
+
+@receiver(post_delete, sender=Wallet)
+def record_wallet_deletion(
+    sender: type[Wallet],  # noqa: ARG001
+    instance: Wallet,  # noqa: ARG001
+    **kwargs: typing.Any,  # noqa: ANN401, ARG001
+) -> None:
+    """Change the ETag of wallet lists when a wallet is deleted."""
+    etags.record_wallet_deletion()
@@ -1,15 +1,70 @@
+import csv
+import datetime
+import importlib
+import io
+import json
+import os
+import subprocess  # noqa: S404
+import sys
+import tempfile
+import threading
+import typing
+import unittest
+from collections import Counter
 from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
+import msgpack
 import pytest
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command, CommandError
+from django.db import connection, OperationalError
 from django.db import transaction as db_transaction
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.db.models import Count, Max, Min, Q, Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.exceptions import ValidationError as DRFValidationError
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
 
-from .models import Wallet
-from .serializers import TransactionSerializer
+from . import admin as wallet_admin
+from . import (
+    aggregates,
+    api_schema,
+    archival,
+    benchmarks,
+    caching,
+    contention,
+    filters,
+    group_commit,
+    metrics,
+    pagination,
+    pool,
+    reconciliation,
+    services,
+)
+from .models import (
+    ArchivedTransaction,
+    Transaction,
+    Wallet,
+    WalletShard,
+    WalletStats,
+)
+from .renderers import DecimalJSONEncoder, MessagePackRenderer, ORJSONRenderer
+from .serializers import (
+    TRANSACTION_CHANGED_MESSAGE,
+    TransactionSerializer,
+    WALLET_MISSING_MESSAGE,
+)
+from .views import TransactionViewSet, WalletViewSet
 
 
 class WalletTestCase(APITestCase):
@@ -448,3 +503,2578 @@ class TransactionTestCase(APITestCase):
         assert "wallet balance cannot be negative" in str(
             exc_info.value
         ), "Error message should indicate prevention of negative balance."
+
+    def assert_ledgers_match(self, *wallets: Wallet) -> None:
+        """Assert that balances and stats agree with the transaction rows."""
+        stats = aggregates.wallet_stats([wallet.pk for wallet in wallets])
+        for wallet in wallets:
+            wallet.refresh_from_db()
+            rows = wallet.transactions.aggregate(total=Sum("amount"), count=Count("id"))
+            assert wallet.balance == self.INITIAL_BALANCE + (rows["total"] or 0)
+            assert stats[wallet.pk]["transaction_count"] == rows["count"]
+
+    def test_update_through_stale_instance_is_rejected(self):
+        """Test that a move computed from a stale read applies no deltas."""
+        second_wallet = Wallet.objects.create(
+            label="Second Wallet", balance=self.INITIAL_BALANCE
+        )
+        third_wallet = Wallet.objects.create(
+            label="Third Wallet", balance=self.INITIAL_BALANCE
+        )
+        created = TransactionSerializer().create({
+            "txid": "tx9",
+            "wallet": self.wallet,
+            "amount": Decimal("10.00"),
+        })
+        first, stale = (Transaction.objects.get(pk=created.pk) for _ in range(2))
+
+        for instance, wallet in ((first, second_wallet), (stale, third_wallet)):
+            serializer = TransactionSerializer(
+                instance=instance,
+                data={"wallet": wallet.id, "amount": "10.00"},
+                partial=True,
+            )
+            assert serializer.is_valid(), serializer.errors
+            if instance is first:
+                serializer.save()
+                continue
+            with pytest.raises(DRFValidationError) as excinfo:
+                serializer.save()
+            assert excinfo.value.detail == [TRANSACTION_CHANGED_MESSAGE]
+
+        assert Transaction.objects.get(pk=created.pk).wallet_id == second_wallet.pk
+        self.assert_ledgers_match(self.wallet, second_wallet, third_wallet)
+
+    def test_delete_through_stale_instance_is_rejected(self):
+        """Test that a delete of a row changed since it was read is refused."""
+        created = TransactionSerializer().create({
+            "txid": "tx10",
+            "wallet": self.wallet,
+            "amount": Decimal("10.00"),
+        })
+        stale = Transaction.objects.get(pk=created.pk)
+        serializer = TransactionSerializer(
+            instance=created,
+            data={"wallet": self.wallet.id, "amount": "30.00"},
+            partial=True,
+        )
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+
+        with mock.patch.object(TransactionViewSet, "get_object", return_value=stale):
+            response = self.client.delete(
+                reverse("transaction-detail", args=[stale.pk])
+            )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "changed concurrently" in response.data["detail"]
+        assert Transaction.objects.filter(pk=created.pk).exists()
+        self.assert_ledgers_match(self.wallet)
+
+
+class BulkTransactionTestCase(APITestCase):
+    def setUp(self):
+        """Create two wallets for bulk ingestion."""
+        self.first_wallet = Wallet.objects.create(
+            label="First Wallet", balance=Decimal("100.00")
+        )
+        self.second_wallet = Wallet.objects.create(
+            label="Second Wallet", balance=Decimal("10.00")
+        )
+        self.url = reverse("transaction-bulk")
+
+    def test_bulk_create_applies_summed_deltas(self):
+        """Test that a batch is inserted and each wallet gets its summed delta."""
+        data = [
+            {"txid": "bulk1", "wallet": self.first_wallet.id, "amount": "25.00"},
+            {"txid": "bulk2", "wallet": self.first_wallet.id, "amount": "-75.00"},
+            {"txid": "bulk3", "wallet": self.second_wallet.id, "amount": "-10.00"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+
+        assert (
+            response.status_code == status.HTTP_201_CREATED
+        ), "Bulk ingestion should succeed."
+        assert response.data == {"created": 3, "rejected": []}
+        self.first_wallet.refresh_from_db()
+        self.second_wallet.refresh_from_db()
+        assert self.first_wallet.balance == Decimal("50.00")
+        assert self.second_wallet.balance == Decimal("0.00")
+        assert Transaction.objects.count() == len(data)
+
+    def test_bulk_create_reports_rejected_items(self):
+        """Test that invalid items are reported while the rest is committed."""
+        Transaction.objects.create(
+            txid="existing", amount=Decimal("1.00"), wallet=self.first_wallet
+        )
+        data = [
+            {"txid": "existing", "wallet": self.first_wallet.id, "amount": "5.00"},
+            {"txid": "ok", "wallet": self.first_wallet.id, "amount": "5.00"},
+            {"txid": "ok", "wallet": self.first_wallet.id, "amount": "5.00"},
+            {"txid": "overdraft", "wallet": self.second_wallet.id, "amount": "-11.00"},
+            {"txid": "missing", "wallet": 999_999, "amount": "5.00"},
+            {"txid": "zero", "wallet": self.first_wallet.id, "amount": "0.00"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["created"] == 1
+        assert [item["index"] for item in response.data["rejected"]] == [
+            2,
+            5,
+            0,
+            3,
+            4,
+        ], "Every invalid item should be reported."
+        self.first_wallet.refresh_from_db()
+        self.second_wallet.refresh_from_db()
+        assert self.first_wallet.balance == Decimal("105.00")
+        assert self.second_wallet.balance == Decimal("10.00")
+
+    def test_bulk_create_all_rejected(self):
+        """Test that a batch without accepted items is answered with 400."""
+        data = [
+            {"txid": "overdraft", "wallet": self.second_wallet.id, "amount": "-50.00"}
+        ]
+        response = self.client.post(self.url, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["created"] == 0
+        assert not Transaction.objects.exists()
+
+    def test_bulk_create_invalid_payload(self):
+        """Test that malformed items fail the whole request."""
+        response = self.client.post(
+            self.url, [{"txid": "bad", "amount": "1.00"}], format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Transaction.objects.exists()
+
+
+@override_settings(WALLET_WRITE_MODE="conditional")
+class ConditionalWriteModeTestCase(APITestCase):
+    def setUp(self):
+        """Create two wallets for the conditional write mode."""
+        self.wallet = Wallet.objects.create(
+            label="Conditional Wallet", balance=Decimal("100.00")
+        )
+        self.second_wallet = Wallet.objects.create(
+            label="Second Wallet", balance=Decimal("20.00")
+        )
+
+    def test_create_applies_delta(self):
+        """Test that creating a transaction updates the balance with one UPDATE."""
+        response = self.client.post(
+            reverse("transaction-list"),
+            {"txid": "cond1", "wallet": self.wallet.id, "amount": "-40.00"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("60.00")
+
+    def test_create_rejects_overdraft_at_write_time(self):
+        """Test that the conditional UPDATE rejects a balance changed after validation."""
+        serializer = TransactionSerializer(
+            data={"txid": "cond2", "wallet": self.wallet.id, "amount": "-80.00"}
+        )
+        assert serializer.is_valid(), serializer.errors
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal("50.00"))
+
+        with pytest.raises(DRFValidationError):
+            serializer.save()
+
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("50.00")
+        assert not Transaction.objects.filter(txid="cond2").exists()
+
+    def test_create_reports_wallet_deleted_after_validation(self):
+        """Test that a wallet deleted after validation is not reported as short."""
+        serializer = TransactionSerializer(
+            data={"txid": "cond6", "wallet": self.wallet.id, "amount": "-10.00"}
+        )
+        assert serializer.is_valid(), serializer.errors
+        Wallet.objects.filter(pk=self.wallet.pk).delete()
+
+        with pytest.raises(DRFValidationError) as excinfo:
+            serializer.save()
+
+        assert excinfo.value.detail == {"wallet": [WALLET_MISSING_MESSAGE]}
+        with pytest.raises(Wallet.DoesNotExist):
+            services.apply_balance_deltas({self.wallet.pk: Decimal("-10.00")})
+
+    def test_update_moves_transaction_between_wallets(self):
+        """Test that moving a transaction applies both deltas."""
+        tx = Transaction.objects.create(
+            txid="cond3", amount=Decimal("10.00"), wallet=self.wallet
+        )
+        serializer = TransactionSerializer(
+            instance=tx,
+            data={"wallet": self.second_wallet.id, "amount": "15.00"},
+            partial=True,
+        )
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+
+        self.wallet.refresh_from_db()
+        self.second_wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("90.00")
+        assert self.second_wallet.balance == Decimal("35.00")
+
+    def test_update_move_rolls_back_on_overdraft(self):
+        """Test that a rejected move leaves both wallets unchanged."""
+        tx = Transaction.objects.create(
+            txid="cond4", amount=Decimal("150.00"), wallet=self.wallet
+        )
+        serializer = TransactionSerializer(
+            instance=tx,
+            data={"wallet": self.second_wallet.id, "amount": "1.00"},
+            partial=True,
+        )
+        assert serializer.is_valid(), serializer.errors
+        with pytest.raises(DRFValidationError):
+            serializer.save()
+
+        self.wallet.refresh_from_db()
+        self.second_wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("100.00")
+        assert self.second_wallet.balance == Decimal("20.00")
+
+    def test_destroy_rejects_overdraft(self):
+        """Test that deleting a transaction cannot make the balance negative."""
+        tx = Transaction.objects.create(
+            txid="cond5", amount=Decimal("150.00"), wallet=self.wallet
+        )
+        response = self.client.delete(reverse("transaction-detail", args=[tx.id]))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Transaction.objects.filter(pk=tx.pk).exists()
+
+        tx.amount = Decimal("30.00")
+        tx.save()
+        response = self.client.delete(reverse("transaction-detail", args=[tx.id]))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("70.00")
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        """Create wallets whose balances repeat to exercise the id tie-breaker."""
+        self.wallets = [
+            Wallet.objects.create(label=f"Wallet {i:02}", balance=Decimal(i % 4))
+            for i in range(23)
+        ]
+
+    def walk(self, url: str, params: dict) -> tuple[list[int], dict]:
+        """Follow the next links and return the ids and the last response."""
+        response = self.client.get(url, params)
+        ids = []
+        while True:
+            assert response.status_code == status.HTTP_200_OK, response.data
+            assert "count" not in response.data, "Keyset pages should not count."
+            ids.extend(item["id"] for item in response.data["results"])
+            if response.data["next"] is None:
+                return ids, response
+            response = self.client.get(response.data["next"])
+
+    def test_keyset_follows_ordering_with_id_tie_breaker(self):
+        """Test that every wallet is returned once in (balance, id) order."""
+        ids, _ = self.walk(
+            reverse("wallet-list"), {"pagination": "cursor", "ordering": "-balance"}
+        )
+        expected = [
+            wallet.id
+            for wallet in sorted(
+                self.wallets, key=lambda wallet: (wallet.balance, wallet.id)
+            )
+        ]
+        assert ids == expected[::-1], "Keyset pages should follow the ordering."
+
+    def test_keyset_previous_link(self):
+        """Test that the previous link returns the preceding page."""
+        url = reverse("wallet-list")
+        first = self.client.get(url, {"pagination": "cursor", "ordering": "label"})
+        assert first.data["previous"] is None
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        assert back.data["results"] == first.data["results"]
+        assert back.data["next"] == first.data["next"]
+
+    def test_keyset_transactions_default_ordering(self):
+        """Test keyset pagination of transactions ordered by id."""
+        for i in range(12):
+            Transaction.objects.create(
+                txid=f"keyset{i}", amount=Decimal(1), wallet=self.wallets[0]
+            )
+        ids, _ = self.walk(reverse("transaction-list"), {"pagination": "cursor"})
+        assert ids == sorted(Transaction.objects.values_list("id", flat=True))
+
+    def test_keyset_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        response = self.client.get(reverse("wallet-list"), {"cursor": "not-a-cursor"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_page_number_remains_default(self):
+        """Test that requests without the opt-in keep the page number format."""
+        response = self.client.get(reverse("wallet-list"), {"page": 3})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == len(self.wallets)
+
+
+class TransactionExportTestCase(APITestCase):
+    def setUp(self):
+        """Create two wallets with transactions to export."""
+        self.wallet = Wallet.objects.create(label="Export Wallet", balance=0)
+        self.other_wallet = Wallet.objects.create(label="Other Wallet", balance=0)
+        for i in range(7):
+            Transaction.objects.create(
+                txid=f"export{i}", amount=Decimal(i % 3) + 1, wallet=self.wallet
+            )
+        Transaction.objects.create(
+            txid="other", amount=Decimal("5.00"), wallet=self.other_wallet
+        )
+        self.url = reverse("transaction-export")
+
+    def test_export_ndjson_matches_serializer(self):
+        """Test that NDJSON rows match the serializer output and the filters."""
+        response = self.client.get(
+            self.url,
+            {"format": "ndjson", "wallet": self.wallet.id, "ordering": "-amount"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        expected = TransactionSerializer(
+            Transaction.objects.filter(wallet=self.wallet).order_by("-amount", "-id"),
+            many=True,
+        ).data
+        assert rows == [dict(item) for item in expected]
+
+    def test_export_csv_reads_in_chunks(self):
+        """Test that the CSV export walks every chunk of the keyset."""
+        with mock.patch.object(TransactionViewSet, "export_chunk_size", 2):
+            response = self.client.get(self.url, {"format": "csv"})
+            content = b"".join(response.streaming_content).decode()
+
+        assert response.status_code == status.HTTP_200_OK
+        header, *rows = list(csv.reader(io.StringIO(content)))
+        assert header == ["id", "txid", "wallet", "amount", "created_at"]
+        assert [int(row[0]) for row in rows] == sorted(
+            Transaction.objects.values_list("id", flat=True)
+        )
+        assert rows[0][3] == "1.00"
+
+    def test_export_unknown_format(self):
+        """Test that an unsupported format is rejected."""
+        response = self.client.get(self.url, {"format": "xml"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class ReconciliationTestCase(APITestCase):
+    def setUp(self):
+        """Create consistent and drifted wallets."""
+        self.consistent = Wallet.objects.create(label="Consistent", balance=0)
+        self.drifted = Wallet.objects.create(label="Drifted", balance=0)
+        self.empty = Wallet.objects.create(label="Empty", balance=0)
+        for wallet, amount in ((self.consistent, "30.00"), (self.drifted, "20.00")):
+            Transaction.objects.create(
+                txid=f"rec-{wallet.pk}", amount=Decimal(amount), wallet=wallet
+            )
+        Wallet.objects.filter(pk=self.consistent.pk).update(balance=Decimal("30.00"))
+        Wallet.objects.filter(pk=self.drifted.pk).update(balance=Decimal("25.00"))
+
+    def test_reconcile_reports_drift(self):
+        """Test that only wallets whose balance differs from the ledger are reported."""
+        drifts = reconciliation.reconcile_balances(range_size=2)
+        assert drifts == [
+            reconciliation.BalanceDrift(
+                self.drifted.pk, Decimal("25.00"), Decimal("20.00")
+            )
+        ]
+        self.drifted.refresh_from_db()
+        assert self.drifted.balance == Decimal("25.00"), "Reports should not repair."
+
+    def test_reconcile_repairs_drift(self):
+        """Test that repair resets the balance to the ledger sum."""
+        drifts = reconciliation.reconcile_balances(repair=True)
+        assert [drift.repaired for drift in drifts] == [True]
+        self.drifted.refresh_from_db()
+        assert self.drifted.balance == Decimal("20.00")
+
+    @staticmethod
+    def test_command_resumes_from_checkpoint() -> None:
+        """Test that ranges recorded in the checkpoint are skipped."""
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Path(directory) / "reconcile.json"
+            out = io.StringIO()
+            call_command(
+                "reconcile_balances",
+                "--range-size=1",
+                f"--checkpoint={checkpoint}",
+                stdout=out,
+            )
+            assert "Found 1 drifted wallets, repaired 0." in out.getvalue()
+
+            out = io.StringIO()
+            call_command(
+                "reconcile_balances",
+                "--range-size=1",
+                f"--checkpoint={checkpoint}",
+                stdout=out,
+            )
+            assert (
+                "Checked" not in out.getvalue()
+            ), "Completed ranges should be skipped."
+            assert "Found 0 drifted wallets" in out.getvalue()
+
+
+class ShardedWalletTestCase(APITestCase):
+    def setUp(self):
+        """Create a wallet and spread its balance over four shards."""
+        self.wallet = Wallet.objects.create(
+            label="Hot Wallet", balance=Decimal("10.01")
+        )
+        response = self.client.post(
+            reverse("wallet-shard", args=[self.wallet.id]),
+            {"shard_count": 4},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK, response.data
+        assert response.data["balance"] == "10.01"
+        assert response.data["shard_count"] == 4  # noqa: PLR2004
+
+    def get_balance(self) -> str:
+        """Return the balance reported by the wallet API."""
+        return self.client.get(reverse("wallet-detail", args=[self.wallet.id])).data[
+            "balance"
+        ]
+
+    def assert_row_holds_shard_total(self) -> None:
+        """Assert that the wallet row holds the total of its shards."""
+        self.wallet.refresh_from_db()
+        assert (
+            self.wallet.balance
+            == self.wallet.shards.aggregate(total=Sum("balance"))["total"]
+        )
+
+    def test_shards_hold_the_balance(self):
+        """Test that the shards split the balance the wallet row keeps."""
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("10.01")
+        assert sorted(self.wallet.shards.values_list("balance", flat=True)) == [
+            Decimal("2.50"),
+            Decimal("2.50"),
+            Decimal("2.50"),
+            Decimal("2.51"),
+        ]
+
+    def test_credit_and_debit_across_shards(self):
+        """Test that a debit larger than any shard drains several shards."""
+        url = reverse("transaction-list")
+        response = self.client.post(
+            url, {"txid": "hot1", "wallet": self.wallet.id, "amount": "5.00"}
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert self.get_balance() == "15.01"
+        self.assert_row_holds_shard_total()
+
+        response = self.client.post(
+            url, {"txid": "hot2", "wallet": self.wallet.id, "amount": "-15.00"}
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.data
+        assert self.get_balance() == "0.01"
+        assert all(
+            balance >= 0
+            for balance in self.wallet.shards.values_list("balance", flat=True)
+        )
+        self.assert_row_holds_shard_total()
+
+        response = self.client.post(
+            url, {"txid": "hot3", "wallet": self.wallet.id, "amount": "-0.02"}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert self.get_balance() == "0.01"
+
+    def test_transaction_delete_and_bulk_on_sharded_wallet(self):
+        """Test that deletes and bulk ingestion keep the shards consistent."""
+        tx = Transaction.objects.create(
+            txid="hot4", amount=Decimal("10.01"), wallet=self.wallet
+        )
+        response = self.client.delete(reverse("transaction-detail", args=[tx.id]))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.get_balance() == "0.00"
+
+        response = self.client.post(
+            reverse("transaction-bulk"),
+            [
+                {"txid": "hot5", "wallet": self.wallet.id, "amount": "3.00"},
+                {"txid": "hot6", "wallet": self.wallet.id, "amount": "-2.50"},
+                {"txid": "hot7", "wallet": self.wallet.id, "amount": "-1.00"},
+            ],
+            format="json",
+        )
+        assert response.data["created"] == 2  # noqa: PLR2004
+        assert self.get_balance() == "0.50"
+        self.assert_row_holds_shard_total()
+
+    def test_direct_balance_update_and_unsharding(self):
+        """Test that a direct balance update is spread and unsharding folds it back."""
+        response = self.client.patch(
+            reverse("wallet-detail", args=[self.wallet.id]),
+            {"balance": "8.00"},
+            format="json",
+        )
+        assert response.data["balance"] == "8.00"
+        assert self.wallet.shards.count() == 4  # noqa: PLR2004
+        self.assert_row_holds_shard_total()
+
+        response = self.client.post(
+            reverse("wallet-shard", args=[self.wallet.id]),
+            {"shard_count": 0},
+            format="json",
+        )
+        assert response.data["balance"] == "8.00"
+        assert not self.wallet.shards.exists()
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("8.00")
+
+    def test_reconcile_repairs_sharded_wallet(self):
+        """Test that reconciliation sums shards and repairs them."""
+        Transaction.objects.create(
+            txid="hot8", amount=Decimal("4.00"), wallet=self.wallet
+        )
+        drifts = reconciliation.reconcile_balances(repair=True)
+        assert drifts == [
+            reconciliation.BalanceDrift(
+                self.wallet.pk, Decimal("10.01"), Decimal("4.00"), repaired=True
+            )
+        ]
+        assert self.get_balance() == "4.00"
+        assert self.wallet.shards.count() == 4  # noqa: PLR2004
+
+    def test_balance_filters_count_shards(self):
+        """Test that balance filters read the balance of the shards."""
+        Wallet.objects.create(label="Plain Wallet", balance=Decimal("5.00"))
+        url = reverse("wallet-list")
+        labels = [
+            row["label"]
+            for row in self.client.get(url, {"balance_min": "10"}).data["results"]
+        ]
+        assert labels == ["Hot Wallet"]
+        labels = [
+            row["label"]
+            for row in self.client.get(url, {"balance_max": "6"}).data["results"]
+        ]
+        assert labels == ["Plain Wallet"]
+
+    def test_balance_ordering_counts_shards(self):
+        """Test that ordering by balance, by page or cursor, reads the shards."""
+        Wallet.objects.create(label="Plain Wallet", balance=Decimal("5.00"))
+        Wallet.objects.create(label="Rich Wallet", balance=Decimal("20.00"))
+        url = reverse("wallet-list")
+        response = self.client.get(url, {"ordering": "-balance"})
+        assert [row["label"] for row in response.data["results"]] == [
+            "Rich Wallet",
+            "Hot Wallet",
+            "Plain Wallet",
+        ]
+        assert response.data["results"][1]["balance"] == "10.01"
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            first = self.client.get(
+                url, {"ordering": "balance", "pagination": "cursor"}
+            )
+            second = self.client.get(first.data["next"])
+        labels = [row["label"] for row in first.data["results"]]
+        labels += [row["label"] for row in second.data["results"]]
+        assert labels == ["Plain Wallet", "Hot Wallet", "Rich Wallet"]
+
+    def test_balance_queries_read_the_balance_column(self):
+        """Test that balance filters, ordering and cursors stay on the index."""
+        Wallet.objects.create(label="Plain Wallet", balance=Decimal("5.00"))
+        url = reverse("wallet-list")
+        with (
+            CaptureQueriesContext(connection) as queries,
+            mock.patch.object(pagination.KeysetPagination, "page_size", 1),
+        ):
+            first = self.client.get(
+                url,
+                {"ordering": "balance", "balance_min": "1", "pagination": "cursor"},
+            )
+            second = self.client.get(first.data["next"])
+            self.client.get(url, {"ordering": "-balance", "balance_max": "100"})
+        assert second.data["results"][0]["label"] == "Hot Wallet"
+        ordered = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "wallet_wallet"' in query["sql"] and "ORDER BY" in query["sql"]
+        ]
+        assert len(ordered) == 3  # noqa: PLR2004
+        for sql in ordered:
+            assert "wallet_walletshard" not in sql
+            assert "CASE" not in sql
+            if connection.vendor != "sqlite":
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+            assert "USING INDEX wallet_wall_balance_" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+
+
+class GroupCommitTestCase(APITestCase):
+    def setUp(self):
+        """Create a wallet and a group commit queue without worker threads."""
+        self.wallet = Wallet.objects.create(
+            label="Group Commit Wallet", balance=Decimal("10.00")
+        )
+        self.queue = group_commit.GroupCommitQueue(
+            max_depth=3, batch_size=10, max_wait=0, start_workers=False
+        )
+
+    def submit_and_drain(self, txid: str, wallet_pk: int, amount: Decimal):
+        """Submit a transaction and commit it right away."""
+        future = group_commit.GroupCommitQueue.submit(
+            self.queue, txid, wallet_pk, amount
+        )
+        self.queue.drain()
+        return future
+
+    def test_batch_resolves_every_submission(self):
+        """Test that a batch checks the running balance and resolves every future."""
+        futures = [
+            self.queue.submit("gc1", self.wallet.pk, Decimal("-8.00")),
+            self.queue.submit("gc2", self.wallet.pk, Decimal("-5.00")),
+            self.queue.submit("gc3", self.wallet.pk, Decimal("3.00")),
+        ]
+        assert self.queue.depth == 3  # noqa: PLR2004
+        self.queue.drain()
+        assert self.queue.depth == 0
+
+        first, second, third = (future.result(timeout=0) for future in futures)
+        assert first.transaction.pk is not None
+        assert first.transaction.txid == "gc1"
+        assert second.transaction is None
+        assert second.detail == "Transaction denied: Wallet balance cannot be negative."
+        assert third.transaction.amount == Decimal("3.00")
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("5.00")
+        assert Transaction.objects.count() == 2  # noqa: PLR2004
+
+    def test_full_queue_rejects_submission(self):
+        """Test that submissions beyond the maximum depth are refused."""
+        for index in range(3):
+            self.queue.submit(f"full{index}", self.wallet.pk, Decimal("1.00"))
+        with pytest.raises(group_commit.QueueFullError):
+            self.queue.submit("full3", self.wallet.pk, Decimal("1.00"))
+
+    @override_settings(WALLET_SUBMISSION_MODE="group_commit")
+    def test_api_creates_through_queue(self):
+        """Test that the API returns the committed transaction or its rejection."""
+        with (
+            mock.patch.object(group_commit, "get_queue", return_value=self.queue),
+            mock.patch.object(
+                self.queue, "submit", side_effect=self.submit_and_drain
+            ) as submit,
+        ):
+            response = self.client.post(
+                reverse("transaction-list"),
+                {"txid": "api1", "wallet": self.wallet.id, "amount": "-4.00"},
+                format="json",
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+            assert response.data["id"] == Transaction.objects.get(txid="api1").pk
+
+            Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal("1.00"))
+            response = self.client.post(
+                reverse("transaction-list"),
+                {"txid": "api2", "wallet": self.wallet.id, "amount": "-1.50"},
+                format="json",
+            )
+        assert submit.call_count == 1
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @override_settings(WALLET_SUBMISSION_MODE="group_commit")
+    def test_api_reports_full_queue(self):
+        """Test that a full queue answers with 429."""
+        with mock.patch.object(
+            group_commit,
+            "get_queue",
+            return_value=mock.Mock(
+                submit=mock.Mock(side_effect=group_commit.QueueFullError)
+            ),
+        ):
+            response = self.client.post(
+                reverse("transaction-list"),
+                {"txid": "busy1", "wallet": self.wallet.id, "amount": "1.00"},
+                format="json",
+            )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+class IdempotentTransactionTestCase(APITestCase):
+    def setUp(self):
+        """Create a wallet and one transaction posted through the API."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(
+            label="Idempotent Wallet", balance=Decimal("50.00")
+        )
+        self.payload = {"txid": "retry1", "wallet": self.wallet.id, "amount": "-10.00"}
+        response = self.client.post(
+            reverse("transaction-list"), self.payload, format="json"
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        self.created = response.data
+
+    def test_retry_replays_original_without_locking(self):
+        """Test that a retry returns the original transaction without a wallet lock."""
+        with (
+            mock.patch.object(Wallet.objects, "select_for_update") as lock,
+            self.assertNumQueries(0),
+        ):
+            response = self.client.post(
+                reverse("transaction-list"),
+                {**self.payload, "amount": "-10"},
+                format="json",
+            )
+        lock.assert_not_called()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == self.created
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("40.00")
+
+    def test_retry_with_different_payload_conflicts(self):
+        """Test that a known txid with another payload is rejected with 409."""
+        response = self.client.post(
+            reverse("transaction-list"),
+            {**self.payload, "amount": "-20.00"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert Transaction.objects.count() == 1
+
+    def test_replay_after_cache_miss(self):
+        """Test that a txid missing from the cache is found by its index."""
+        cache.clear()
+        response = self.client.post(
+            reverse("transaction-list"), self.payload, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["id"] == self.created["id"]
+
+    def test_update_and_delete_forget_cached_payload(self):
+        """Test that a changed or deleted transaction is not replayed from the cache."""
+        detail_url = reverse("transaction-detail", args=[self.created["id"]])
+        response = self.client.put(
+            detail_url, {**self.payload, "amount": "-5.00"}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = self.client.post(
+            reverse("transaction-list"), self.payload, format="json"
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+        self.client.delete(detail_url)
+        response = self.client.post(
+            reverse("transaction-list"), self.payload, format="json"
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+
+@override_settings(WALLET_RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        """Create a wallet with an empty response cache."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(
+            label="Cached Wallet", balance=Decimal("100.00")
+        )
+        self.detail_url = reverse("wallet-detail", args=[self.wallet.id])
+
+    def get_balance(self) -> str:
+        """Return the balance reported by the wallet detail endpoint."""
+        return self.client.get(self.detail_url).data["balance"]
+
+    def test_detail_is_served_from_cache(self):
+        """Test that a repeated wallet read only looks up the wallet version."""
+        before = caching.stats()
+        assert self.get_balance() == "100.00"
+        with self.assertNumQueries(1):
+            assert self.get_balance() == "100.00"
+
+        after = caching.stats()
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"] + 1
+
+    def test_transaction_writes_invalidate_detail(self):
+        """Test that creating, updating and deleting transactions refresh the balance."""
+        assert self.get_balance() == "100.00"
+        response = self.client.post(
+            reverse("transaction-list"),
+            {"txid": "cache1", "wallet": self.wallet.id, "amount": "-30.00"},
+            format="json",
+        )
+        assert self.get_balance() == "70.00"
+
+        detail_url = reverse("transaction-detail", args=[response.data["id"]])
+        self.client.put(
+            detail_url,
+            {"txid": "cache1", "wallet": self.wallet.id, "amount": "-10.00"},
+            format="json",
+        )
+        assert self.get_balance() == "90.00"
+
+        self.client.delete(detail_url)
+        assert self.get_balance() == "100.00"
+
+    def test_admin_bulk_delete_invalidates_responses(self):
+        """Test that wallets deleted by the admin action are not served anymore."""
+        other = Wallet.objects.create(label="Other Wallet", balance=Decimal(1))
+        assert self.get_balance() == "100.00"
+        assert len(self.client.get(reverse("wallet-list")).data["results"]) == 2  # noqa: PLR2004
+
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            reverse("admin:wallet_wallet_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [self.wallet.pk, other.pk],
+                "post": "yes",
+            },
+        )
+        assert response.status_code == status.HTTP_302_FOUND
+        assert not Wallet.objects.exists()
+        assert self.client.get(self.detail_url).status_code == status.HTTP_404_NOT_FOUND
+        assert self.client.get(reverse("wallet-list")).data["results"] == []
+
+    def test_queryset_delete_invalidates_detail(self):
+        """Test that a queryset delete drops the cached wallet."""
+        assert self.get_balance() == "100.00"
+        Wallet.objects.filter(pk=self.wallet.pk).delete()
+        assert self.client.get(self.detail_url).status_code == status.HTTP_404_NOT_FOUND
+
+    @override_settings(WALLET_WRITE_MODE="conditional")
+    def test_conditional_and_bulk_writes_invalidate_detail(self):
+        """Test that statement based and bulk balance writes refresh the balance."""
+        assert self.get_balance() == "100.00"
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "cache2", "wallet": self.wallet.id, "amount": "-40.00"},
+            format="json",
+        )
+        assert self.get_balance() == "60.00"
+
+        self.client.post(
+            reverse("transaction-bulk"),
+            [{"txid": "cache3", "wallet": self.wallet.id, "amount": "5.00"}],
+            format="json",
+        )
+        assert self.get_balance() == "65.00"
+
+    def test_wallet_update_invalidates_filtered_list(self):
+        """Test that a direct wallet update refreshes the cached list pages."""
+        list_url = reverse("wallet-list") + "?balance_min=50"
+        assert self.client.get(list_url).data["count"] == 1
+        self.client.patch(self.detail_url, {"balance": "10.00"}, format="json")
+
+        assert self.client.get(list_url).data["count"] == 0
+        assert self.get_balance() == "10.00"
+        response = self.client.get(reverse("wallet-cache-stats"))
+        assert response.data["enabled"]
+        assert response.data["invalidations"] > 0
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        """Create a wallet with one transaction."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(label="Polled Wallet", balance=Decimal(0))
+        self.other_wallet = Wallet.objects.create(
+            label="Other Wallet", balance=Decimal(0)
+        )
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "poll1", "wallet": self.wallet.id, "amount": "10.00"},
+            format="json",
+        )
+        self.detail_url = reverse("wallet-detail", args=[self.wallet.id])
+        self.transactions_url = (
+            reverse("transaction-list") + f"?wallet={self.wallet.id}"
+        )
+
+    def test_unchanged_wallet_answers_not_modified(self):
+        """Test that a matching ETag gets 304 after a single version lookup."""
+        response = self.client.get(self.detail_url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        assert not response.content
+
+    def test_balance_change_moves_etags(self):
+        """Test that a new transaction changes the wallet and list ETags."""
+        wallet_etag = self.client.get(self.detail_url)["ETag"]
+        list_etag = self.client.get(self.transactions_url)["ETag"]
+        other_etag = self.client.get(
+            reverse("transaction-list") + f"?wallet={self.other_wallet.id}"
+        )["ETag"]
+
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "poll2", "wallet": self.wallet.id, "amount": "-4.00"},
+            format="json",
+        )
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=wallet_etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["balance"] == "6.00"
+        response = self.client.get(self.transactions_url, HTTP_IF_NONE_MATCH=list_etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 2  # noqa: PLR2004
+        response = self.client.get(
+            reverse("transaction-list") + f"?wallet={self.other_wallet.id}",
+            HTTP_IF_NONE_MATCH=other_etag,
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_etag_covers_filters_and_deletions(self):
+        """Test that list ETags differ per filter set and change on deletion."""
+        first = self.client.get(reverse("wallet-list"))["ETag"]
+        filtered = self.client.get(reverse("wallet-list") + "?balance_min=5")["ETag"]
+        assert first != filtered
+
+        # The highest wallet and shard versions and the deletions version.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("wallet-list"), HTTP_IF_NONE_MATCH=first)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(queries.captured_queries) == 3  # noqa: PLR2004
+        assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+
+        self.client.delete(reverse("wallet-detail", args=[self.other_wallet.id]))
+        response = self.client.get(reverse("wallet-list"), HTTP_IF_NONE_MATCH=first)
+        assert response.status_code == status.HTTP_200_OK
+
+        second = response["ETag"]
+        Wallet.objects.create(label="Deleted Wallet", balance=Decimal(1))
+        third = self.client.get(reverse("wallet-list"))["ETag"]
+        Wallet.objects.filter(label="Deleted Wallet").delete()
+        response = self.client.get(reverse("wallet-list"), HTTP_IF_NONE_MATCH=third)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] not in {second, third}
+
+    def test_sharded_wallet_etag_follows_shards(self):
+        """Test that a credit to a shard changes the ETag of a sharded wallet."""
+        self.client.post(
+            reverse("wallet-shard", args=[self.wallet.id]),
+            {"shard_count": 2},
+            format="json",
+        )
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "poll3", "wallet": self.wallet.id, "amount": "1.00"},
+            format="json",
+        )
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["balance"] == "11.00"
+
+
+@override_settings(
+    WALLET_WRITE_MODE="optimistic",
+    WALLET_WRITE_MAX_ATTEMPTS=3,
+    WALLET_WRITE_RETRY_BACKOFF=0,
+)
+class OptimisticWriteModeTestCase(APITestCase):
+    def setUp(self):
+        """Create two wallets for the optimistic write mode."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(
+            label="Optimistic Wallet", balance=Decimal("100.00")
+        )
+        self.second_wallet = Wallet.objects.create(
+            label="Second Wallet", balance=Decimal("20.00")
+        )
+
+    def create_transaction(self, txid: str, amount: str):
+        """Post a transaction to the first wallet."""
+        return self.client.post(
+            reverse("transaction-list"),
+            {"txid": txid, "wallet": self.wallet.id, "amount": amount},
+            format="json",
+        )
+
+    def test_create_update_and_delete(self):
+        """Test that every transaction change swaps the balance and the version."""
+        version = self.wallet.version
+        response = self.create_transaction("opt1", "-40.00")
+        assert response.status_code == status.HTTP_201_CREATED
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("60.00")
+        assert self.wallet.version > version
+
+        detail_url = reverse("transaction-detail", args=[response.data["id"]])
+        response = self.client.put(
+            detail_url,
+            {"txid": "opt1", "wallet": self.second_wallet.id, "amount": "-10.00"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        self.wallet.refresh_from_db()
+        self.second_wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("100.00")
+        assert self.second_wallet.balance == Decimal("10.00")
+
+        response = self.client.delete(detail_url)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        self.second_wallet.refresh_from_db()
+        assert self.second_wallet.balance == Decimal("20.00")
+
+    def test_stale_version_conflicts(self):
+        """Test that the compare-and-swap update rejects a stale version."""
+        with mock.patch.object(Wallet.objects, "values_list") as values_list:
+            values_list.return_value.get.return_value = (
+                Decimal("100.00"),
+                self.wallet.version - 1,
+            )
+            with pytest.raises(services.VersionConflictError):
+                services.apply_versioned_deltas({self.wallet.pk: Decimal("-1.00")})
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("100.00")
+
+    def test_conflict_is_retried(self):
+        """Test that a conflicting attempt is rolled back, retried and counted."""
+        apply_versioned_deltas = services.apply_versioned_deltas
+        attempts = []
+
+        def lose_first_attempt(deltas: dict[int, Decimal]) -> None:
+            attempts.append(deltas)
+            if len(attempts) == 1:
+                raise services.VersionConflictError(self.wallet.pk)
+            apply_versioned_deltas(deltas)
+
+        before = services.write_stats()
+        with mock.patch.object(
+            services,
+            "apply_versioned_deltas",
+            side_effect=lose_first_attempt,
+        ):
+            response = self.create_transaction("opt2", "-30.00")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("70.00")
+        assert services.write_stats()["retries"] == before["retries"] + 1
+
+    def test_exhausted_attempts_give_up(self):
+        """Test that a wallet that keeps changing is reported as busy."""
+        before = services.write_stats()
+        with mock.patch.object(
+            services,
+            "apply_versioned_deltas",
+            side_effect=services.VersionConflictError(self.wallet.pk),
+        ) as apply:
+            response = self.create_transaction("opt3", "-30.00")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert apply.call_count == 3  # noqa: PLR2004
+        assert not Transaction.objects.filter(txid="opt3").exists()
+        stats = self.client.get(reverse("transaction-write-stats")).data
+        assert stats["mode"] == "optimistic"
+        assert stats["give_ups"] == before["give_ups"] + 1
+        assert stats["retries"] == before["retries"] + 2
+
+    def test_overdraft_is_not_retried(self):
+        """Test that an insufficient balance is rejected without a retry."""
+        before = services.write_stats()
+        response = self.create_transaction("opt4", "-150.00")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert services.write_stats() == before
+
+
+@override_settings(WALLET_WRITE_MAX_ATTEMPTS=20, WALLET_WRITE_RETRY_BACKOFF=0.001)
+class ConcurrentMoveTestCase(APITransactionTestCase):
+    THREADS = 8
+    MOVES_PER_THREAD = 5
+
+    def setUp(self):
+        """Create two wallets and one transaction per thread on each of them."""
+        cache.clear()
+        self.wallets = [
+            Wallet.objects.create(label=f"Wallet {index}", balance=Decimal(0))
+            for index in range(2)
+        ]
+        self.transactions = []
+        for index in range(self.THREADS):
+            wallet = self.wallets[index % 2]
+            self.transactions.append(
+                TransactionSerializer().create({
+                    "txid": f"move{index}",
+                    "wallet": wallet,
+                    "amount": Decimal("10.00"),
+                })
+            )
+
+    def move_back_and_forth(self, index: int, errors: list) -> None:
+        """Move one transaction between the two wallets, in opposite directions."""
+        try:
+            for move in range(self.MOVES_PER_THREAD):
+                instance = Transaction.objects.get(pk=self.transactions[index].pk)
+                target = self.wallets[(index + move + 1) % 2]
+                serializer = TransactionSerializer(
+                    instance,
+                    data={
+                        "txid": instance.txid,
+                        "wallet": target.pk,
+                        "amount": "10.00",
+                    },
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_crossing_moves_do_not_deadlock(self):
+        """Test that concurrent A to B and B to A moves all commit."""
+        errors = []
+        threads = [
+            threading.Thread(target=self.move_back_and_forth, args=(index, errors))
+            for index in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors, errors
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+            ledger = sum(
+                wallet.transactions.values_list("amount", flat=True), Decimal(0)
+            )
+            assert wallet.balance == ledger
+        assert sum(wallet.balance for wallet in self.wallets) == Decimal("80.00")
+
+    @staticmethod
+    def test_lock_conflicts_are_recognized() -> None:
+        """Test that deadlocks and lock timeouts are told apart from other errors."""
+        assert services.is_lock_conflict(OperationalError(1213, "Deadlock found"))
+        assert services.is_lock_conflict(OperationalError(1205, "Lock wait timeout"))
+        assert services.is_lock_conflict(OperationalError("database is locked"))
+        assert not services.is_lock_conflict(OperationalError(2006, "Gone away"))
+
+
+class LeanListSerializerTestCase(APITestCase):
+    def setUp(self):
+        """Create plain and sharded wallets with a few transactions."""
+        cache.clear()
+        self.wallets = [
+            Wallet.objects.create(label="Plain Wallet", balance=Decimal(5)),
+            Wallet.objects.create(label="Ünicode Wallet", balance=Decimal("0.10")),
+            Wallet.objects.create(label="Hot Wallet", balance=Decimal("10.01")),
+        ]
+        services.shard_wallet(self.wallets[2].pk, 3)
+        for index, amount in enumerate(["1", "-0.50", "1234567.89", "7.10"]):
+            Transaction.objects.create(
+                txid=f"lean{index}",
+                amount=Decimal(amount),
+                wallet=self.wallets[index % 2],
+            )
+
+    def assert_same_content(self, viewset: type, url: str) -> None:
+        """Assert that the lean and the serializer paths render the same bytes."""
+        lean = self.client.get(url)
+        with mock.patch.object(viewset, "lean_serializer_class", None):
+            full = self.client.get(url)
+        assert lean.status_code == status.HTTP_200_OK
+        assert lean.content == full.content
+
+    def test_transaction_lists_match(self):
+        """Test that transaction pages are byte-identical on both paths."""
+        url = reverse("transaction-list")
+        self.assert_same_content(TransactionViewSet, url)
+        self.assert_same_content(TransactionViewSet, f"{url}?ordering=-amount")
+        self.assert_same_content(TransactionViewSet, f"{url}?pagination=cursor")
+
+    def test_wallet_lists_match(self):
+        """Test that wallet pages, including sharded balances, are byte-identical."""
+        url = reverse("wallet-list")
+        self.assert_same_content(WalletViewSet, url)
+        self.assert_same_content(
+            WalletViewSet, f"{url}?pagination=cursor&ordering=label"
+        )
+
+    def test_keyset_cursor_from_rows(self):
+        """Test that keyset pagination walks lean rows page by page."""
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            response = self.client.get(
+                reverse("transaction-list"), {"pagination": "cursor"}
+            )
+            txids = [item["txid"] for item in response.data["results"]]
+            response = self.client.get(response.data["next"])
+        txids += [item["txid"] for item in response.data["results"]]
+        assert txids == ["lean0", "lean1", "lean2", "lean3"]
+        assert response.data["next"] is None
+
+    @staticmethod
+    def test_benchmark_command_checks_output() -> None:
+        """Test that the benchmark command runs both paths on the stored rows."""
+        out = io.StringIO()
+        call_command("benchmark_list_serialization", "--repeat=1", stdout=out)
+        assert "transactions: 4 rows" in out.getvalue()
+        assert "wallets: 3 rows" in out.getvalue()
+
+
+class RendererTestCase(APITestCase):
+    def setUp(self):
+        """Create wallets with exact balances and labels that need escaping."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(
+            label='Ünicode \u2028 "Wallet"', balance=Decimal("10.10")
+        )
+        Wallet.objects.create(label="Other Wallet", balance=Decimal("0.01"))
+        Transaction.objects.create(
+            txid="render1", amount=Decimal("1234567.89"), wallet=self.wallet
+        )
+
+    def test_json_matches_stock_renderer(self):
+        """Test that responses are rendered exactly like the stock renderer."""
+        for url in [
+            reverse("wallet-list"),
+            reverse("wallet-detail", args=[self.wallet.pk]),
+            reverse("transaction-list") + "?pagination=cursor",
+            reverse("wallet-detail", args=[0]),
+        ]:
+            response = self.client.get(url)
+            assert response["Content-Type"] == "application/json"
+            assert response.content == JSONRenderer().render(response.data)
+
+    @staticmethod
+    def test_raw_values_match_stock_renderer() -> None:
+        """Test that raw values are encoded like the stock renderer's encoder."""
+        data = {
+            "balance": Decimal("10.10"),
+            "created_at": datetime.datetime(
+                2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.UTC
+            ),
+            1: ["\u2029", None, 1.5],
+        }
+        stock = JSONRenderer()
+        stock.encoder_class = DecimalJSONEncoder
+        assert ORJSONRenderer().render(data) == stock.render(data)
+
+    @staticmethod
+    def test_raw_decimals_stay_exact() -> None:
+        """Test that a raw Decimal is rendered as its exact string, not a float."""
+        data = {"total": Decimal("0.10") + Decimal("0.20")}
+        assert ORJSONRenderer().render(data) == b'{"total":"0.30"}'
+        assert msgpack.unpackb(MessagePackRenderer().render(data)) == {"total": "0.30"}
+
+    def test_indented_json_falls_back(self):
+        """Test that an indented response is rendered by the stock renderer."""
+        response = self.client.get(
+            reverse("wallet-list"), HTTP_ACCEPT="application/json; indent=2"
+        )
+        assert response.content == JSONRenderer().render(
+            response.data, "application/json; indent=2"
+        )
+
+    def test_msgpack_response(self):
+        """Test that MessagePack carries the same values as JSON."""
+        url = reverse("wallet-detail", args=[self.wallet.pk])
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        assert response["Content-Type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content) == self.client.get(url).json()
+        assert msgpack.unpackb(response.content)["balance"] == "10.10"
+
+    def test_msgpack_request(self):
+        """Test that a transaction can be created from a MessagePack body."""
+        response = self.client.post(
+            reverse("transaction-list"),
+            msgpack.packb({
+                "txid": "msgpack1",
+                "amount": "-0.10",
+                "wallet": self.wallet.pk,
+            }),
+            content_type="application/msgpack",
+            HTTP_ACCEPT="application/msgpack",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert msgpack.unpackb(response.content)["amount"] == "-0.10"
+        self.wallet.refresh_from_db()
+        assert self.wallet.balance == Decimal("10.00")
+
+    def test_malformed_bodies(self):
+        """Test that malformed JSON and MessagePack bodies are rejected."""
+        url = reverse("transaction-list")
+        for body, content_type in [
+            (b'{"txid": ', "application/json"),
+            (b'{"amount": NaN}', "application/json"),
+            (b"\xc1", "application/msgpack"),
+        ]:
+            response = self.client.post(url, body, content_type=content_type)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class WalletStatsTestCase(APITestCase):
+    def setUp(self):
+        """Create two wallets to move transactions between."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(label="Stats Wallet", balance=Decimal(100))
+        self.other_wallet = Wallet.objects.create(
+            label="Other Wallet", balance=Decimal(100)
+        )
+
+    def create(self, txid: str, amount: str, wallet: Wallet | None = None) -> int:
+        """Create a transaction through the API and return its id."""
+        response = self.client.post(
+            reverse("transaction-list"),
+            {"txid": txid, "amount": amount, "wallet": (wallet or self.wallet).pk},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data["id"]
+
+    def assert_stats(self, wallet: Wallet) -> dict:
+        """Assert that the stats endpoint matches the stored transactions."""
+        expected = Transaction.objects.filter(wallet=wallet).aggregate(
+            transaction_count=Count("id"),
+            total_credits=Sum("amount", filter=Q(amount__gt=0), default=0),
+            total_debits=Sum("amount", filter=Q(amount__lt=0), default=0),
+            min_amount=Min("amount"),
+            max_amount=Max("amount"),
+        )
+        response = self.client.get(reverse("wallet-stats", args=[wallet.pk]))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["wallet"] == wallet.pk
+        assert response.data["transaction_count"] == expected["transaction_count"]
+        for field in ["total_credits", "total_debits", "min_amount", "max_amount"]:
+            value = response.data[field]
+            assert (None if value is None else Decimal(value)) == expected[field]
+        return response.data
+
+    def test_stats_follow_creates_updates_and_deletes(self):
+        """Test that the stats follow every change of the transactions."""
+        assert self.assert_stats(self.wallet)["min_amount"] is None
+
+        first = self.create("stats1", "10.00")
+        self.create("stats2", "-30.00")
+        self.create("stats3", "5.50")
+        stats = self.assert_stats(self.wallet)
+        assert stats["total_credits"] == "15.50"
+        assert stats["min_amount"] == "-30.00"
+
+        response = self.client.put(
+            reverse("transaction-detail", args=[first]),
+            {"txid": "stats1", "amount": "20.00", "wallet": self.wallet.pk},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert self.assert_stats(self.wallet)["max_amount"] == "20.00"
+
+        debit = Transaction.objects.get(txid="stats2").pk
+        response = self.client.delete(reverse("transaction-detail", args=[debit]))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.assert_stats(self.wallet)["min_amount"] == "5.50"
+
+    def test_stats_follow_wallet_moves(self):
+        """Test that moving a transaction moves it between the wallet stats."""
+        pk = self.create("move1", "40.00")
+        self.create("move2", "1.00")
+        response = self.client.put(
+            reverse("transaction-detail", args=[pk]),
+            {"txid": "move1", "amount": "40.00", "wallet": self.other_wallet.pk},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert self.assert_stats(self.wallet)["max_amount"] == "1.00"
+        assert self.assert_stats(self.other_wallet)["transaction_count"] == 1
+
+    def test_stats_follow_bulk_ingestion(self):
+        """Test that a bulk batch updates the stats of every wallet once."""
+        response = self.client.post(
+            reverse("transaction-bulk"),
+            [
+                {"txid": "bulk1", "wallet": self.wallet.pk, "amount": "2.00"},
+                {"txid": "bulk2", "wallet": self.wallet.pk, "amount": "-1.00"},
+                {"txid": "bulk3", "wallet": self.other_wallet.pk, "amount": "-500"},
+                {"txid": "bulk4", "wallet": self.other_wallet.pk, "amount": "-3"},
+            ],
+            format="json",
+        )
+        assert response.data["created"] == 3  # noqa: PLR2004
+        self.assert_stats(self.wallet)
+        assert self.assert_stats(self.other_wallet)["total_debits"] == "-3.00"
+
+    def test_sharded_wallet_stats(self):
+        """Test that a sharded wallet spreads its stats and reports their sum."""
+        services.shard_wallet(self.wallet.pk, 4)
+        for index, amount in enumerate(["-5", "3", "-1", "8", "2", "-4", "6", "1"]):
+            self.create(f"hot{index}", amount)
+        with mock.patch("wallet.aggregates.random.randrange", return_value=3):
+            pk = self.create("hot12", "-6.00")
+        self.client.delete(reverse("transaction-detail", args=[pk]))
+
+        assert WalletStats.objects.filter(wallet=self.wallet).count() > 1
+        assert self.assert_stats(self.wallet)["min_amount"] == "-5.00"
+
+    def test_stats_read_is_constant(self):
+        """Test that reading the stats does not depend on the history length."""
+        for index in range(20):
+            self.create(f"long{index}", "1.00")
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("wallet-stats", args=[self.wallet.pk]))
+        assert response.data["transaction_count"] == 20  # noqa: PLR2004
+        response = self.client.get(reverse("wallet-stats", args=[0]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_wallet_list_includes_stats(self):
+        """Test that the wallet list adds the stats only when asked to."""
+        self.create("list1", "-12.34")
+        assert "stats" not in self.client.get(reverse("wallet-list")).data["results"][0]
+
+        for query in ["?include=stats", "?include=stats&pagination=cursor"]:
+            response = self.client.get(reverse("wallet-list") + query)
+            results = {row["id"]: row for row in response.data["results"]}
+            assert self.assert_stats(self.wallet) == {
+                "wallet": self.wallet.pk,
+                **results[self.wallet.pk]["stats"],
+            }
+            assert results[self.wallet.pk]["stats"]["total_debits"] == "-12.34"
+            assert results[self.other_wallet.pk]["stats"]["transaction_count"] == 0
+
+    def test_migration_backfills_stats(self):
+        """Test that the migration computes the stats of the existing history."""
+        self.create("old1", "7.00")
+        self.create("old2", "-2.00")
+        self.create("old3", "1.00", self.other_wallet)
+        WalletStats.objects.all().delete()
+
+        migration = importlib.import_module("wallet.migrations.0005_wallet_stats")
+        migration.backfill_wallet_stats(apps, None)
+        self.assert_stats(self.wallet)
+        self.assert_stats(self.other_wallet)
+
+
+class TransactionHistoryTestCase(APITestCase):
+    START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+    def setUp(self):
+        """Create a wallet with transactions an hour apart, two of them at once."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(label="History Wallet", balance=Decimal(0))
+        self.other_wallet = Wallet.objects.create(
+            label="Other Wallet", balance=Decimal(0)
+        )
+        self.url = reverse("transaction-list")
+        for index, hours in enumerate([0, 1, 2, 2, 3]):
+            self.create(f"history{index}", hours, self.wallet)
+        self.create("other", 2, self.other_wallet)
+
+    def create(self, txid: str, hours: int, wallet: Wallet) -> None:
+        """Create a transaction through the API at the given hour."""
+        now = self.START + datetime.timedelta(hours=hours)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            response = self.client.post(
+                self.url,
+                {"txid": txid, "amount": "1.00", "wallet": wallet.pk},
+                format="json",
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["created_at"] == now.isoformat().replace("+00:00", "Z")
+
+    def txids(self, params: dict) -> list[str]:
+        """Return the txids of the transaction list page."""
+        response = self.client.get(self.url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return [row["txid"] for row in response.data["results"]]
+
+    def test_latest_first(self):
+        """Test that -created_at lists the newest first and breaks ties by id."""
+        assert self.txids({"wallet": self.wallet.pk, "ordering": "-created_at"}) == [
+            "history4",
+            "history3",
+            "history2",
+            "history1",
+            "history0",
+        ]
+
+    def test_created_range(self):
+        """Test that the range filters include the start and exclude the end."""
+        params = {
+            "wallet": self.wallet.pk,
+            "created_after": "2024-01-01T01:00:00Z",
+            "created_before": "2024-01-01T03:00:00Z",
+            "ordering": "created_at",
+        }
+        assert self.txids(params) == ["history1", "history2", "history3"]
+        response = self.client.get(self.url, {"created_after": "yesterday"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cursor_pages_by_created_at(self):
+        """Test that keyset pages walk the history in time order across ties."""
+        txids, params = (
+            [],
+            {
+                "wallet": self.wallet.pk,
+                "ordering": "-created_at",
+                "pagination": "cursor",
+            },
+        )
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            url = self.url
+            while url:
+                response = self.client.get(url, params)
+                txids += [row["txid"] for row in response.data["results"]]
+                url, params = response.data["next"], {}
+        assert txids == [f"history{index}" for index in range(4, -1, -1)]
+
+    def test_replay_keeps_created_at(self):
+        """Test that a replayed POST returns the original timestamp."""
+        response = self.client.post(
+            self.url,
+            {"txid": "history0", "amount": "1.00", "wallet": self.wallet.pk},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created_at"] == "2024-01-01T00:00:00Z"
+
+
+class ArchivalTestCase(APITestCase):
+    START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+    def setUp(self):
+        """Create two wallets with a transaction per day for five days."""
+        cache.clear()
+        self.wallet = Wallet.objects.create(label="Archive Wallet", balance=Decimal(0))
+        self.other_wallet = Wallet.objects.create(
+            label="Other Wallet", balance=Decimal(0)
+        )
+        for day in range(5):
+            for wallet in (self.wallet, self.other_wallet):
+                now = self.START + datetime.timedelta(days=day)
+                with mock.patch("django.utils.timezone.now", return_value=now):
+                    response = self.client.post(
+                        reverse("transaction-list"),
+                        {
+                            "txid": f"w{wallet.pk}d{day}",
+                            "amount": str(day + 1),
+                            "wallet": wallet.pk,
+                        },
+                        format="json",
+                    )
+                assert response.status_code == status.HTTP_201_CREATED
+
+    @staticmethod
+    def archive(**policy: typing.Any) -> int:  # noqa: ANN401
+        """Archive without pausing between batches."""
+        return archival.archive_transactions(
+            archival.ArchivePolicy(**policy), batch_size=2, pause=0
+        )
+
+    def assert_ledgers_intact(self) -> None:
+        """Assert that balances and stats still match every transaction."""
+        assert reconciliation.reconcile_balances() == []
+        for wallet in (self.wallet, self.other_wallet):
+            stats = aggregates.wallet_stats([wallet.pk])[wallet.pk]
+            assert stats["transaction_count"] == 5  # noqa: PLR2004
+            assert stats["total_credits"] == Decimal(15)
+
+    def test_archive_before_cutoff(self):
+        """Test that transactions before the cutoff move with their ids and txids."""
+        hot = {row.txid: row for row in Transaction.objects.all()}
+        moved = self.archive(before=self.START + datetime.timedelta(days=3))
+
+        assert moved == 6  # noqa: PLR2004
+        assert Transaction.objects.count() == 4  # noqa: PLR2004
+        for archived in ArchivedTransaction.objects.all():
+            original = hot[archived.txid]
+            assert (archived.pk, archived.amount, archived.created_at) == (
+                original.pk,
+                original.amount,
+                original.created_at,
+            )
+        self.assert_ledgers_intact()
+
+    def test_archive_beyond_latest(self):
+        """Test that only the newest transactions of every wallet are kept."""
+        assert self.archive(keep_latest=2) == 6  # noqa: PLR2004
+        assert sorted(Transaction.objects.values_list("txid", flat=True)) == sorted([
+            f"w{wallet.pk}d{day}"
+            for wallet in (self.wallet, self.other_wallet)
+            for day in (3, 4)
+        ])
+        assert self.archive(keep_latest=2) == 0
+        self.assert_ledgers_intact()
+
+    def test_archive_both_policies(self):
+        """Test that a transaction must match both policies to be archived."""
+        moved = self.archive(
+            before=self.START + datetime.timedelta(days=1), keep_latest=2
+        )
+        assert moved == 2  # noqa: PLR2004
+
+    def test_checkpoint_resumes_after_completed_wallets(self):
+        """Test that a resumed run skips the wallets already completed."""
+        policy = archival.ArchivePolicy(keep_latest=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "archive.json"
+            archival.ArchiveCheckpoint(path, policy).mark(self.wallet.pk)
+            moved = archival.archive_transactions(policy, pause=0, checkpoint_path=path)
+            assert moved == 4  # noqa: PLR2004
+            assert archival.ArchiveCheckpoint(path, policy).wallet_pk == (
+                self.other_wallet.pk
+            )
+            assert (
+                archival.ArchiveCheckpoint(
+                    path, archival.ArchivePolicy(keep_latest=2)
+                ).wallet_pk
+                == 0
+            )
+        assert self.wallet.transactions.count() == 5  # noqa: PLR2004
+
+    def test_txids_stay_unique_across_tables(self):
+        """Test that archived txids are replayed, rejected or refused."""
+        self.archive(keep_latest=1)
+        url = reverse("transaction-list")
+        txid = f"w{self.wallet.pk}d0"
+
+        cache.clear()
+        response = self.client.post(
+            url, {"txid": txid, "amount": "1.00", "wallet": self.wallet.pk}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created_at"] == "2024-01-01T00:00:00Z"
+        response = self.client.post(
+            url, {"txid": txid, "amount": "2.00", "wallet": self.wallet.pk}
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+        response = self.client.post(
+            reverse("transaction-bulk"),
+            [{"txid": txid, "amount": "1.00", "wallet": self.wallet.pk}],
+            format="json",
+        )
+        assert response.data["created"] == 0
+
+        latest = Transaction.objects.get(wallet=self.wallet)
+        response = self.client.put(
+            reverse("transaction-detail", args=[latest.pk]),
+            {"txid": txid, "amount": str(latest.amount), "wallet": self.wallet.pk},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        self.assert_ledgers_intact()
+
+    def test_archive_is_read_on_request_only(self):
+        """Test that the archive is listed and retrieved only with archived=true."""
+        self.archive(keep_latest=3)
+        url = reverse("transaction-list")
+        assert self.client.get(url).data["count"] == 6  # noqa: PLR2004
+
+        response = self.client.get(
+            url,
+            {"archived": "true", "wallet": self.wallet.pk, "ordering": "-created_at"},
+        )
+        assert [row["txid"] for row in response.data["results"]] == [
+            f"w{self.wallet.pk}d1",
+            f"w{self.wallet.pk}d0",
+        ]
+        archived = response.data["results"][0]
+
+        detail = reverse("transaction-detail", args=[archived["id"]])
+        assert self.client.get(detail).status_code == status.HTTP_404_NOT_FOUND
+        response = self.client.get(detail, {"archived": "true"})
+        assert response.data == archived
+        response = self.client.delete(detail + "?archived=true")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_archived_rows_are_not_written_back(self):
+        """Test that a change of a transaction archived after it was read is refused."""
+        instance = Transaction.objects.get(txid=f"w{self.wallet.pk}d0")
+        self.archive(keep_latest=1)
+
+        serializer = TransactionSerializer(
+            instance,
+            data={"txid": instance.txid, "amount": "9.00", "wallet": self.wallet.pk},
+        )
+        assert serializer.is_valid()
+        with pytest.raises(NotFound):
+            serializer.save()
+        assert not Transaction.objects.filter(pk=instance.pk).exists()
+        self.assert_ledgers_intact()
+
+    def test_archival_moves_list_etag(self):
+        """Test that archiving changes the ETag of the wallet's transaction list."""
+        url = reverse("transaction-list") + f"?wallet={self.wallet.pk}"
+        etag = self.client.get(url)["ETag"]
+        self.archive(keep_latest=4)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 4  # noqa: PLR2004
+
+    @staticmethod
+    def test_command() -> None:
+        """Test the command options and its summary."""
+        out = io.StringIO()
+        call_command(
+            "archive_transactions",
+            "--before=2024-01-02T00:00:00",
+            "--pause=0",
+            stdout=out,
+        )
+        assert "Archived 2 transactions." in out.getvalue()
+        with pytest.raises(CommandError):
+            call_command("archive_transactions")
+        with pytest.raises(CommandError):
+            call_command("archive_transactions", "--before=yesterday")
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        """Start from empty metrics and create a wallet."""
+        cache.clear()
+        metrics.registry.reset()
+        self.wallet = Wallet.objects.create(label="Metrics Wallet", balance=10)
+
+    def scrape(self) -> str:
+        """Return the metrics page."""
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == metrics.CONTENT_TYPE
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_action(self):
+        """Test that latency, SQL statements and rendering are kept per action."""
+        self.client.get(reverse("wallet-list"))
+        self.client.get(reverse("wallet-list"))
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "metrics1", "amount": "1.00", "wallet": self.wallet.pk},
+            format="json",
+        )
+        self.client.get(reverse("wallet-detail", args=[0]))
+
+        totals = metrics.registry.totals()
+        assert totals["requests", "WalletViewSet.list", 200] == 2  # noqa: PLR2004
+        assert totals["requests", "TransactionViewSet.create", 201] == 1
+        assert totals["requests", "WalletViewSet.retrieve", 404] == 1
+        assert totals["queries", "TransactionViewSet.create"] > 0
+        assert totals["render_seconds", "WalletViewSet.list"] > 0
+
+        page = self.scrape()
+        assert (
+            'wallet_http_requests_total{view="WalletViewSet.list",status="200"} 2'
+            in page
+        )
+        assert (
+            "wallet_http_request_duration_seconds_bucket"
+            '{view="WalletViewSet.list",le="+Inf"} 2' in page
+        )
+        assert (
+            'wallet_http_request_duration_seconds_count{view="WalletViewSet.list"} 2'
+            in page
+        )
+        assert "# TYPE wallet_db_lock_wait_seconds_total counter" in page
+
+    @staticmethod
+    def test_locking_statements() -> None:
+        """Test that FOR UPDATE statements count as lock waits and failures."""
+        request_metrics = metrics.RequestMetrics()
+
+        def execute(sql: str, *args: typing.Any) -> None:  # noqa: ANN401, ARG001
+            if "NOWAIT" in sql:
+                raise OperationalError(3572, "Statement aborted because lock(s) could not be acquired")  # fmt: skip
+            if "UPDATE wallet_wallet" in sql:
+                raise OperationalError(1213, "Deadlock found")
+
+        request_metrics(execute, "SELECT 1", None, False, {})  # noqa: FBT003
+        request_metrics(execute, "SELECT 1 FOR UPDATE", None, False, {})  # noqa: FBT003
+        for sql in ["SELECT 1 FOR UPDATE NOWAIT", "UPDATE wallet_wallet SET x = 1"]:
+            with pytest.raises(OperationalError):
+                request_metrics(execute, sql, None, False, {})  # noqa: FBT003
+
+        assert request_metrics.queries == 4  # noqa: PLR2004
+        assert request_metrics.lock_failures == 2  # noqa: PLR2004
+        assert 0 < request_metrics.lock_wait_seconds <= request_metrics.query_seconds
+
+    @staticmethod
+    def test_histogram_is_cumulative() -> None:
+        """Test that every bucket counts the requests at or below its bound."""
+        page = metrics.exposition({
+            ("latency", "view", 0): 1,
+            ("latency", "view", 2): 3,
+            ("latency", "view", len(metrics.LATENCY_BUCKETS)): 1,
+            ("latency_seconds", "view"): 20.5,
+        })
+        name = "wallet_http_request_duration_seconds"
+        assert f'{name}_bucket{{view="view",le="0.005"}} 1' in page
+        assert f'{name}_bucket{{view="view",le="0.01"}} 1' in page
+        assert f'{name}_bucket{{view="view",le="0.025"}} 4' in page
+        assert f'{name}_bucket{{view="view",le="10.0"}} 4' in page
+        assert f'{name}_bucket{{view="view",le="+Inf"}} 5' in page
+        assert f'{name}_sum{{view="view"}} 20.5' in page
+
+    def test_processes_are_added_up(self):
+        """Test that a scrape adds the totals flushed by other processes."""
+        with tempfile.TemporaryDirectory() as directory:
+            other = Path(directory) / "1.json"
+            other.write_text(json.dumps([[["requests", "WalletViewSet.list", 200], 5]]))
+            with override_settings(METRICS_DIR=directory):
+                self.client.get(reverse("wallet-list"))
+                own = Path(directory) / f"{os.getpid()}.json"
+                assert own.exists()
+                assert (
+                    metrics.registry.collect()["requests", "WalletViewSet.list", 200]
+                    == 6  # noqa: PLR2004
+                )
+
+
+class LoadBenchmarkTestCase(APITransactionTestCase):
+    @staticmethod
+    def benchmark(*args: str) -> dict:
+        """Run the command with a small load and return its JSON report."""
+        cache.clear()
+        out = io.StringIO()
+        call_command(
+            "benchmark_load",
+            "--requests=12",
+            "--threads=2",
+            "--wallets=3",
+            "--history=25",
+            "--host=testserver",
+            "--format=json",
+            *args,
+            stdout=out,
+        )
+        return json.loads(out.getvalue())
+
+    def test_every_scenario(self):
+        """Test that every scenario sends its requests and keeps the balances."""
+        report = self.benchmark()
+        assert report["environment"]["database"] == connection.vendor
+        assert [result["scenario"] for result in report["results"]] == list(
+            benchmarks.SCENARIOS
+        )
+        for result in report["results"]:
+            assert result["requests"] == 12  # noqa: PLR2004
+            assert result["outcomes"]["server_error"] == 0
+            assert result["invariants"]["ok"], result
+            assert {"p50", "p95", "p99"} <= result["latency_ms"].keys()
+        assert not Wallet.objects.filter(
+            label__startswith=benchmarks.LABEL_PREFIX
+        ).exists()
+
+    def test_sharded_hot_wallet(self):
+        """Test that writes to a sharded wallet are acknowledged exactly."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "report.json"
+            report = self.benchmark(
+                "--scenario=hot", "--shard-count=2", "--keep", f"--output={output}"
+            )
+            assert json.loads(output.read_text()) == report
+        (result,) = report["results"]
+        assert result["outcomes"]["ok"] == 12  # noqa: PLR2004
+        assert result["invariants"]["ok"]
+        assert result["operations"]["create_transaction"]["requests"] == 12  # noqa: PLR2004
+        sharded = Wallet.objects.filter(
+            label__startswith=benchmarks.LABEL_PREFIX, shard_count=2
+        )
+        assert sharded.count() == 3  # noqa: PLR2004
+
+    @staticmethod
+    def test_invalid_options() -> None:
+        """Test that loads that cannot run are refused."""
+        for option in ["--threads=0", "--read-ratio=2", "--wallets=0"]:
+            with pytest.raises(CommandError):
+                call_command("benchmark_load", option)
+
+    @staticmethod
+    def test_async_read_comparison() -> None:
+        """Test that the same slow reads succeed through WSGI and ASGI."""
+        out = io.StringIO()
+        call_command(
+            "benchmark_async_reads",
+            "--requests=12",
+            "--clients=4",
+            "--client-delay=0",
+            "--wallets=3",
+            "--history=5",
+            "--host=testserver",
+            "--format=json",
+            stdout=out,
+        )
+        results = json.loads(out.getvalue())["results"]
+        assert [result["interface"] for result in results] == ["wsgi", "asgi"]
+        for result in results:
+            assert result["outcomes"]["ok"] == 12  # noqa: PLR2004
+            assert result["clients"] == 4  # noqa: PLR2004
+            assert result["peak_threads"] >= 1
+        assert not Wallet.objects.filter(
+            label__startswith=benchmarks.LABEL_PREFIX
+        ).exists()
+
+
+class AsyncReadTestCase(APITransactionTestCase):
+    def setUp(self):
+        """Create two wallets and a history, committed for the read threads."""
+        cache.clear()
+        metrics.registry.reset()
+        self.wallet = Wallet.objects.create(label="Async Wallet", balance=Decimal(0))
+        self.other_wallet = Wallet.objects.create(
+            label="Other Async Wallet", balance=Decimal(0)
+        )
+        for index in range(3):
+            self.client.post(
+                reverse("transaction-list"),
+                {"txid": f"async{index}", "wallet": self.wallet.id, "amount": "2.50"},
+                format="json",
+            )
+
+    def test_matches_sync_endpoints(self):
+        """Test that every async read answers as its synchronous endpoint."""
+        wallet_pk = self.wallet.pk
+        urls = [
+            "/api/wallets/",
+            "/api/wallets/?include=stats&balance_min=1",
+            f"/api/wallets/{wallet_pk}/",
+            "/api/wallets/0/",
+            "/api/wallets/abc/",
+            f"/api/transactions/?wallet={wallet_pk}&ordering=-created_at",
+            f"/api/transactions/?wallet={wallet_pk}&pagination=cursor",
+            "/api/transactions/?wallet=0",
+            "/api/transactions/?page=9",
+            "/api/transactions/?archived=true",
+            f"/api/transactions/{Transaction.objects.first().pk}/",
+        ]
+        for url in urls:
+            expected = self.client.get(url)
+            response = self.client.get(url.replace("/api/", "/api/async/"))
+            assert response.status_code == expected.status_code, url
+            assert response["Content-Type"] == expected["Content-Type"], url
+            assert response.content == expected.content, url
+
+        response = self.client.get(
+            f"/api/async/wallets/{wallet_pk}/", HTTP_ACCEPT="application/msgpack"
+        )
+        assert msgpack.unpackb(response.content)["balance"] == "7.50"
+
+    def test_pagination_links_stay_async(self):
+        """Test that the next page is linked on the async endpoint."""
+        url = reverse("async-transaction-list")
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            response = self.client.get(
+                url, {"wallet": self.wallet.pk, "pagination": "cursor"}
+            )
+            next_url = response.json()["next"]
+            assert url in next_url
+            response = self.client.get(next_url)
+        assert len(response.json()["results"]) == 1
+
+    def test_conditional_get(self):
+        """Test that an unchanged wallet answers 304 and a write moves its ETag."""
+        url = reverse("async-wallet-detail", args=[self.wallet.pk])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.client.post(
+            reverse("transaction-list"),
+            {"txid": "async-moved", "wallet": self.wallet.id, "amount": "1.00"},
+            format="json",
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_writes_are_not_served(self):
+        """Test that the async endpoints only read."""
+        response = self.client.post(
+            reverse("async-transaction-list"),
+            {"txid": "async-write", "wallet": self.wallet.id, "amount": "1.00"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        response = self.client.delete(
+            reverse("async-wallet-detail", args=[self.wallet.pk])
+        )
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert not Transaction.objects.filter(txid="async-write").exists()
+
+    async def test_served_on_the_event_loop(self):
+        """Test that an ASGI request is counted with the statements it ran."""
+        url = reverse("async-wallet-list")
+        response = await self.async_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()["results"]) == 2  # noqa: PLR2004
+
+        totals = metrics.registry.totals()
+        assert totals["requests", "async:WalletViewSet.list", 200] == 1
+        assert totals["queries", "async:WalletViewSet.list"] > 0
+
+
+class ContentionTestCase(APITestCase):
+    def setUp(self):
+        """Start from an empty profile and create a wallet."""
+        cache.clear()
+        contention.reset()
+        self.wallet = Wallet.objects.create(label="Hot Wallet", balance=Decimal(0))
+
+    @staticmethod
+    def test_space_saving_keeps_heavy_hitters() -> None:
+        """Test that heavy keys survive and counts stay within their error."""
+        sketch = contention.SpaceSaving(capacity=4)
+        stream = [1] * 50 + [2] * 30 + list(range(100, 160)) + [1] * 10
+        true_counts = Counter(stream)
+        for key in stream:
+            sketch.add(key)
+
+        top = sketch.top(2)
+        assert [key for key, _, _ in top] == [1, 2]
+        assert len(sketch.counts) == 4  # noqa: PLR2004
+        assert len(sketch._heap) <= 16  # noqa: PLR2004, SLF001
+        for key, count, error in sketch.top(4):
+            assert count - error <= true_counts[key] <= count
+
+    def test_lock_waits_are_recorded_per_wallet(self):
+        """Test that the locks of transaction writes are profiled per wallet."""
+        for index in range(3):
+            response = self.client.post(
+                reverse("transaction-list"),
+                {"txid": f"hot{index}", "amount": "5.00", "wallet": self.wallet.pk},
+                format="json",
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+
+        response = self.client.get(reverse("diagnostics-hot-wallets"), {"limit": 5})
+        assert response.status_code == status.HTTP_200_OK
+        (row,) = response.data["wait_seconds"]
+        assert row["wallet"] == self.wallet.pk
+        assert row["value"] > 0
+        assert row["error"] == 0
+        assert response.data["nowait_failures"] == []
+
+        response = self.client.get(reverse("diagnostics-hot-wallets"), {"limit": "x"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_lock_failures_are_recorded(self):
+        """Test that NOWAIT failures and deadlocks are told apart."""
+        other = Wallet.objects.create(label="Other Wallet", balance=Decimal(0))
+        deltas = {self.wallet.pk: Decimal(1), other.pk: Decimal(1)}
+        busy = OperationalError(3572, "Lock could not be acquired")
+        with (
+            mock.patch.object(Wallet.objects, "select_for_update", side_effect=busy),
+            pytest.raises(services.WalletBusyError),
+        ):
+            services.apply_locked_deltas(deltas, nowait=True)
+        deadlock = OperationalError(1213, "Deadlock found")
+        with (
+            mock.patch.object(
+                Wallet.objects, "select_for_update", side_effect=deadlock
+            ),
+            pytest.raises(OperationalError),
+        ):
+            services.lock_wallets([self.wallet.pk])
+
+        report = contention.get_profile().report(10)
+        assert {row["wallet"] for row in report["nowait_failures"]} == {
+            self.wallet.pk,
+            other.pk,
+        }
+        assert report["lock_conflicts"] == [
+            {"wallet": self.wallet.pk, "value": 1, "error": 0}
+        ]
+
+    def test_shard_locks_are_recorded(self):
+        """Test that the shard locks of a sharded wallet are profiled too."""
+        self.wallet.balance = Decimal(20)
+        self.wallet.save()
+        services.shard_wallet(self.wallet.pk, 2)
+        services.apply_shard_delta(self.wallet.pk, Decimal(5), 2)
+        services.apply_shard_delta(self.wallet.pk, Decimal(-15), 2)
+        with (
+            mock.patch.object(
+                WalletShard.objects,
+                "select_for_update",
+                return_value=WalletShard.objects.none(),
+            ),
+            pytest.raises(services.WalletBusyError),
+        ):
+            services.apply_shard_delta(self.wallet.pk, Decimal(-1), 2)
+        deadlock = OperationalError(1213, "Deadlock found")
+        with (
+            mock.patch.object(
+                WalletShard.objects, "select_for_update", side_effect=deadlock
+            ),
+            pytest.raises(OperationalError),
+        ):
+            services.apply_shard_delta(self.wallet.pk, Decimal(-1), 2)
+
+        report = contention.get_profile().report(10)
+        (row,) = report["wait_seconds"]
+        assert row["wallet"] == self.wallet.pk
+        assert row["value"] > 0
+        for metric in ("nowait_failures", "lock_conflicts"):
+            assert report[metric] == [
+                {"wallet": self.wallet.pk, "value": 1, "error": 0}
+            ]
+
+    def test_admin_view(self):
+        """Test that the admin lists the hot wallets with their labels."""
+        contention.record(contention.WAIT_SECONDS, [self.wallet.pk], 0.25)
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:wallet_wallet_hot_wallets"))
+        assert response.status_code == status.HTTP_200_OK
+        assert "Hot Wallet" in response.content.decode()
+        assert "0.25" in response.content.decode()
+
+
+class FakeConnection:
+    """A DB-API connection recording what the pool does with it."""
+
+    def __init__(self) -> None:
+        """Start open and answering."""
+        self.closed = False
+        self.rollbacks = 0
+        self.answers = True
+
+    def close(self) -> None:
+        """Close the connection."""
+        self.closed = True
+
+    def rollback(self) -> None:
+        """Roll back, failing once the connection no longer answers."""
+        if not self.answers:
+            raise OperationalError(2006, "MySQL server has gone away")
+        self.rollbacks += 1
+
+
+class ConnectionPoolTestCase(APITestCase):
+    @staticmethod
+    def build(**options: typing.Any) -> pool.ConnectionPool:  # noqa: ANN401
+        """Return a pool of one connection and one overflow connection."""
+        return pool.ConnectionPool(**{
+            "size": 1,
+            "max_overflow": 1,
+            "recycle": 3600,
+            "timeout": 1,
+            "pre_ping": True,
+            **options,
+        })
+
+    @staticmethod
+    def check(connection: FakeConnection) -> bool:
+        """Return whether a fake connection answers."""
+        return connection.answers
+
+    def test_connections_are_reused(self):
+        """Test that a given back connection is handed out again."""
+        connections_pool = self.build()
+        connection, reused = connections_pool.acquire(FakeConnection, self.check)
+        assert not reused
+        connections_pool.release(connection)
+        assert connections_pool.acquire(FakeConnection, self.check) == (
+            connection,
+            True,
+        )
+        stats = connections_pool.stats()
+        assert stats["created"] == 1
+        assert stats["checkouts"] == 2  # noqa: PLR2004
+        assert stats["checked_out"] == 1
+
+    def test_overflow_is_closed_and_limited(self):
+        """Test that overflow connections are closed and checkouts time out."""
+        connections_pool = self.build(timeout=0.01)
+        first, _ = connections_pool.acquire(FakeConnection, self.check)
+        second, _ = connections_pool.acquire(FakeConnection, self.check)
+        assert connections_pool.stats()["overflow"] == 1
+        with pytest.raises(pool.PoolTimeoutError):
+            connections_pool.acquire(FakeConnection, self.check)
+
+        connections_pool.release(first)
+        connections_pool.release(second)
+        assert not first.closed
+        assert second.closed
+        stats = connections_pool.stats()
+        assert (stats["idle"], stats["checked_out"], stats["overflow"]) == (1, 0, 0)
+        assert stats["timeouts"] == 1
+
+    def test_waiting_checkout_gets_a_given_back_connection(self):
+        """Test that a full pool hands out the next connection given back."""
+        connections_pool = self.build(max_overflow=0)
+        connection, _ = connections_pool.acquire(FakeConnection, self.check)
+        timer = threading.Timer(0.05, connections_pool.release, [connection])
+        timer.start()
+        assert connections_pool.acquire(FakeConnection, self.check) == (
+            connection,
+            True,
+        )
+        timer.join()
+        stats = connections_pool.stats()
+        assert stats["waits"] == 1
+        assert stats["wait_seconds"] > 0
+
+    def test_stale_and_broken_connections_are_replaced(self):
+        """Test that old and unanswering idle connections are replaced."""
+        connections_pool = self.build(recycle=0)
+        old, _ = connections_pool.acquire(FakeConnection, self.check)
+        connections_pool.release(old)
+        connection, reused = connections_pool.acquire(FakeConnection, self.check)
+        assert not reused
+        assert old.closed
+
+        connections_pool = self.build()
+        broken, _ = connections_pool.acquire(FakeConnection, self.check)
+        broken.answers = False
+        connections_pool.release(broken)
+        connection, reused = connections_pool.acquire(FakeConnection, self.check)
+        assert (connection is broken, reused) == (False, False)
+        assert broken.closed
+        assert connections_pool.stats()["failed_checks"] == 1
+
+    def test_open_transactions_are_rolled_back(self):
+        """Test that a reset rolls back, and a failed rollback discards."""
+        connections_pool = self.build()
+        connection, _ = connections_pool.acquire(FakeConnection, self.check)
+        connections_pool.release(connection, reset=True)
+        assert connection.rollbacks == 1
+        assert not connection.closed
+
+        connection, _ = connections_pool.acquire(FakeConnection, self.check)
+        connection.answers = False
+        connections_pool.release(connection, reset=True)
+        assert connection.closed
+        assert connections_pool.stats()["idle"] == 0
+
+    @staticmethod
+    def test_database_wrapper_checks_connections_out_of_the_pool() -> None:
+        """Test that closing a pooled wrapper keeps its connection for reuse."""
+        wrapper_class = type(
+            "DatabaseWrapper",
+            (pool.PooledDatabaseWrapperMixin, sqlite_base.DatabaseWrapper),
+            {},
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {
+                **connection.settings_dict,
+                "NAME": str(Path(directory) / "pooled.sqlite3"),
+                "POOL_OPTIONS": {"POOL_SIZE": 1, "MAX_OVERFLOW": 0},
+            }
+            wrapper = wrapper_class(settings_dict, alias="pooled")
+            wrapper.ensure_connection()
+            raw = wrapper.connection
+            wrapper.close()
+            wrapper.ensure_connection()
+            assert wrapper.connection is raw
+            assert wrapper.pool_reused
+
+            stats = pool.stats()["pooled"]
+            assert (stats["created"], stats["checked_out"]) == (1, 1)
+
+            # A transaction left open is rolled back before reuse.
+            with wrapper.cursor() as cursor:
+                cursor.execute("CREATE TABLE pooled (id integer)")
+            wrapper.set_autocommit(False)
+            with wrapper.cursor() as cursor:
+                cursor.execute("INSERT INTO pooled VALUES (1)")
+            wrapper.close()
+            assert pool.stats()["pooled"]["idle"] == 1
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM pooled")
+                assert cursor.fetchone() == (0,)
+
+            # A wrapper closed inside an atomic block keeps referring to its
+            # connection, which must not be handed to another thread.
+            wrapper.in_atomic_block = True
+            wrapper.close()
+            wrapper.in_atomic_block = False
+            wrapper.connection = None
+            assert pool.stats()["pooled"]["idle"] == 0
+            pool.get_pool("pooled", settings_dict).dispose()
+
+    def test_pool_metrics_are_served(self):
+        """Test that the pool statistics are exposed with the request metrics."""
+        connections_pool = pool.get_pool(
+            "metrics-pool", {"NAME": "metrics", "POOL_OPTIONS": {"POOL_SIZE": 1}}
+        )
+        connection, _ = connections_pool.acquire(FakeConnection, self.check)
+        page = metrics.exposition(metrics.registry.totals())
+        assert "# TYPE wallet_db_pool_idle_connections gauge" in page
+        assert 'wallet_db_pool_checked_out_connections{database="metrics-pool"} 1' in (
+            page
+        )
+        assert (
+            'wallet_db_pool_connections_created_total{database="metrics-pool"} 1'
+            in (page)
+        )
+        connections_pool.release(connection)
+
+
+class ApiSchemaTestCase(APITestCase):
+    def setUp(self):
+        """Drop the schema loaded by other tests."""
+        api_schema.reset()
+        self.addCleanup(api_schema.reset)
+
+    def test_schema_is_generated_once(self):
+        """Test that the schema is generated once and revalidated by ETag."""
+        with mock.patch.object(
+            api_schema, "generate_schema", wraps=api_schema.generate_schema
+        ) as generate:
+            response = self.client.get(reverse("api-schema"))
+            again = self.client.get(
+                reverse("api-schema"), HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Cache-Control"] == "no-cache"
+        assert "/wallets/" in json.loads(response.content)["paths"]
+        assert again.status_code == status.HTTP_304_NOT_MODIFIED
+        generate.assert_called_once()
+
+    def test_schema_is_served_from_file(self):
+        """Test that the schema written by the command is served as is."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "schema.json"
+            call_command(
+                "generate_api_schema", f"--output={path}", stdout=io.StringIO()
+            )
+            with (
+                override_settings(API_SCHEMA_FILE=str(path)),
+                mock.patch.object(api_schema, "generate_schema") as generate,
+            ):
+                response = self.client.get(reverse("api-schema"))
+            assert response.content == path.read_bytes()
+        generate.assert_not_called()
+
+    def test_swagger_ui_loads_the_schema_url(self):
+        """Test that the Swagger UI points at the cached schema."""
+        response = self.client.get(reverse("schema-swagger-ui"))
+        assert response.status_code == status.HTTP_200_OK
+        assert reverse("api-schema") in response.content.decode()
+
+    @staticmethod
+    def test_drf_yasg_is_imported_lazily() -> None:
+        """Test that loading the URLs does not import the drf-yasg views."""
+        code = (
+            "import sys, django; django.setup(); "
+            "import onhires_drf_test_task.urls; "
+            "sys.exit('drf_yasg.views' in sys.modules)"
+        )
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).resolve().parent.parent,
+            check=False,
+        )
+        assert result.returncode == 0
+
+
+class ScalableAdminTestCase(APITestCase):
+    def setUp(self):
+        """Create wallets with transactions and log in an admin."""
+        cache.clear()
+        self.wallets = [
+            Wallet.objects.create(label=f"Admin {index}", balance=Decimal(balance))
+            for index, balance in enumerate(["10.00", "75.00", "900.00"])
+        ]
+        for index, wallet in enumerate(self.wallets):
+            Transaction.objects.create(
+                txid=f"admin-{index}", amount=Decimal("5.00"), wallet=wallet
+            )
+        Transaction.objects.create(
+            txid="admin-debit", amount=Decimal("-5.00"), wallet=self.wallets[0]
+        )
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin_user)
+
+    def changelist(self, model: str, **params: str) -> typing.Any:  # noqa: ANN401
+        """Return the changelist of the admin of a model."""
+        response = self.client.get(reverse(f"admin:wallet_{model}_changelist"), params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.context["cl"]
+
+    def test_transaction_list_queries_do_not_grow(self):
+        """Test that the wallets are joined and no filter lists every wallet."""
+        with CaptureQueriesContext(connection) as few:
+            self.changelist("transaction")
+        for index in range(10):
+            Transaction.objects.create(
+                txid=f"more-{index}", amount=Decimal(1), wallet=self.wallets[1]
+            )
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("admin:wallet_transaction_changelist"))
+        assert len(many.captured_queries) == len(few.captured_queries)
+        assert "Admin 2" in response.content.decode()
+        assert 'name="wallet_id"' in response.content.decode()
+        assert "?wallet__id__exact" not in response.content.decode()
+
+    def test_large_table_is_counted_from_statistics(self):
+        """Test that an unfiltered list is counted from the table statistics."""
+        with (
+            mock.patch.object(wallet_admin, "estimated_row_count", return_value=10**9),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            changelist = self.changelist("transaction")
+        assert changelist.result_count == 10**9
+        assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+
+        with mock.patch.object(wallet_admin, "estimated_row_count", return_value=10**9):
+            changelist = self.changelist("transaction", amount_range="<0")
+        assert changelist.result_count == 1
+
+    def test_filtered_count_is_bounded(self):
+        """Test that a filtered list is counted up to the exact count limit."""
+        with mock.patch.object(
+            wallet_admin.EstimatedCountPaginator, "exact_count_limit", 2
+        ):
+            changelist = self.changelist("transaction", amount_range="0-100")
+        assert changelist.result_count == 2  # noqa: PLR2004
+
+    def test_search_uses_ids_and_prefixes(self):
+        """Test that ids are matched exactly and text by prefix."""
+        wallet = self.wallets[2]
+        changelist = self.changelist("transaction", q=str(wallet.pk))
+        assert {row.wallet_id for row in changelist.result_list} == {wallet.pk}
+        changelist = self.changelist("transaction", q="admin-1")
+        assert [row.txid for row in changelist.result_list] == ["admin-1"]
+        changelist = self.changelist("wallet", q="dmin")
+        assert list(changelist.result_list) == []
+        changelist = self.changelist("wallet", q='"Admin 1"')
+        assert list(changelist.result_list) == [self.wallets[1]]
+
+    def test_filters(self):
+        """Test the wallet id and range filters and the range ordering."""
+        wallet = self.wallets[0]
+        changelist = self.changelist("transaction", wallet_id=str(wallet.pk))
+        assert {row.txid for row in changelist.result_list} == {
+            "admin-0",
+            "admin-debit",
+        }
+        changelist = self.changelist("transaction", wallet_id="x")
+        assert list(changelist.result_list) == []
+        changelist = self.changelist("transaction", amount_range="0-100")
+        assert changelist.queryset.query.order_by[:2] == ("amount", "id")
+        changelist = self.changelist("transaction", amount_range="0-100", o="-1")
+        assert changelist.queryset.query.order_by[0] == "-id"
+
+    def test_balance_range_reads_the_balance_index(self):
+        """Test that the balance range is filtered and ordered on its index."""
+        changelist = self.changelist("wallet", balance_range="50-100")
+        assert list(changelist.result_list) == [self.wallets[1]]
+        assert changelist.queryset.query.order_by[:2] == ("balance", "id")
+        if connection.vendor == "sqlite":
+            plan = changelist.result_list.explain()
+            assert "USING INDEX wallet_wall_balance_" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+        changelist = self.changelist("wallet", balance_range="50-100", o="-1")
+        assert changelist.queryset.query.order_by[0] == "-id"
+
+    def test_balance_range_counts_shards(self):
+        """Test that a sharded wallet is filtered and shown by its total balance."""
+        services.shard_wallet(self.wallets[2].pk, 3)
+        changelist = self.changelist("wallet", balance_range="500+")
+        assert list(changelist.result_list) == [self.wallets[2]]
+        assert changelist.result_list[0].balance == Decimal("900.00")
+        changelist = self.changelist("wallet", balance_range="<50")
+        assert list(changelist.result_list) == [self.wallets[0]]
+
+
+class WalletLabelSearchTestCase(APITestCase):
+    LABELS = ("Acme Payroll", "acme savings", "Beta Payroll", "Acme_2", "Zeta")
+
+    def setUp(self):
+        """Create wallets with searchable labels."""
+        cache.clear()
+        self.wallets = {
+            label: Wallet.objects.create(label=label, balance=Decimal(1))
+            for label in self.LABELS
+        }
+
+    def labels(self, **params: str) -> list[str]:
+        """Return the labels of the wallets listed with the given parameters."""
+        response = self.client.get(reverse("wallet-list"), params)
+        assert response.status_code == status.HTTP_200_OK
+        return [row["label"] for row in response.data["results"]]
+
+    def test_label_prefix(self):
+        """Test that the prefix is case insensitive and lists in label order."""
+        assert self.labels(label_prefix="acme") == [
+            "Acme Payroll",
+            "Acme_2",
+            "acme savings",
+        ]
+        assert self.labels(label_prefix="Acme_") == ["Acme_2"]
+        assert self.labels(label_prefix="acme", ordering="-label") == [
+            "acme savings",
+            "Acme_2",
+            "Acme Payroll",
+        ]
+
+    def test_label_prefix_with_cursor(self):
+        """Test that keyset pages follow the label order of a prefix."""
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            first = self.client.get(
+                reverse("wallet-list"), {"label_prefix": "a", "pagination": "cursor"}
+            )
+            second = self.client.get(first.data["next"])
+        labels = [row["label"] for row in first.data["results"]]
+        labels += [row["label"] for row in second.data["results"]]
+        assert labels == ["Acme Payroll", "Acme_2", "acme savings"]
+
+    def test_search_matches_every_word(self):
+        """Test that the search matches labels containing every word."""
+        assert self.labels(q="payroll") == ["Acme Payroll", "Beta Payroll"]
+        assert self.labels(q="ACME roll") == ["Acme Payroll"]
+        assert self.labels(q='"me sav"') == ["acme savings"]
+        assert self.labels(q="eta", ordering="-label") == ["Zeta", "Beta Payroll"]
+        assert self.labels(q="missing") == []
+
+    @staticmethod
+    def test_fulltext_query() -> None:
+        """Test the boolean mode query and its MySQL condition."""
+        assert filters.fulltext_query(["acme", "x", "roll"]) == '+"acme" +"roll"'
+        queryset = Wallet.objects.filter(label__fulltext='+"acme"')
+        compiler = queryset.query.get_compiler(using=queryset.db)
+        sql, params = queryset.query.where.children[0].as_mysql(
+            compiler, compiler.connection
+        )
+        assert sql.startswith("MATCH (")
+        assert sql.endswith("AGAINST (%s IN BOOLEAN MODE)")
+        assert params == ['+"acme"']
+
+
+@unittest.skipUnless(connection.vendor == "mysql", "The full-text index is MySQL only.")
+class WalletLabelFullTextTestCase(APITransactionTestCase):
+    # Full-text indexes only see committed rows, so the wallets are committed.
+    LABELS = (
+        "Acme Payroll",
+        "Wallet for the win",
+        "About this wallet",
+        "Data plan",
+        "Zeta",
+    )
+    SEARCHES = ("payroll", "the win", "about", "is wal", "ata", "for", "zeta")
+
+    def setUp(self):
+        """Create wallets whose labels contain default stopwords."""
+        for label in self.LABELS:
+            Wallet.objects.create(label=label, balance=Decimal(1))
+
+    def test_fulltext_matches_contains(self):
+        """Test that MATCH and icontains find the same labels."""
+        for search in self.SEARCHES:
+            terms = search.split()
+            matched = Wallet.objects.filter(
+                label__fulltext=filters.fulltext_query(terms)
+            )
+            contains = Wallet.objects.filter(
+                Q.create([("label__icontains", term) for term in terms])
+            )
+            assert set(matched.values_list("label", flat=True)) == set(
+                contains.values_list("label", flat=True)
+            ), search
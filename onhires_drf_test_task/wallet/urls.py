@@ -1,9 +1,34 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import TransactionViewSet, WalletViewSet
+from .async_views import AsyncReadView
+from .views import DiagnosticsViewSet, TransactionViewSet, WalletViewSet
 
 router = DefaultRouter()
 router.register(r"wallets", WalletViewSet)
 router.register(r"transactions", TransactionViewSet)
+router.register(r"diagnostics", DiagnosticsViewSet, basename="diagnostics")
 
-urlpatterns = router.urls
+urlpatterns = [
+    *router.urls,
+    path(
+        "async/wallets/",
+        AsyncReadView.for_action(WalletViewSet, "list"),
+        name="async-wallet-list",
+    ),
+    path(
+        "async/wallets/<str:pk>/",
+        AsyncReadView.for_action(WalletViewSet, "retrieve"),
+        name="async-wallet-detail",
+    ),
+    path(
+        "async/transactions/",
+        AsyncReadView.for_action(TransactionViewSet, "list"),
+        name="async-transaction-list",
+    ),
+    path(
+        "async/transactions/<str:pk>/",
+        AsyncReadView.for_action(TransactionViewSet, "retrieve"),
+        name="async-transaction-detail",
+    ),
+]
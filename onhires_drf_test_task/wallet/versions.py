@@ -0,0 +1,23 @@
+import time
+
+from django.db.models import BigIntegerField, F, Value
+from django.db.models.functions import Greatest
+
+
+def _now() -> int:
+    return time.time_ns() // 1000
+
+
+def next_version(current: int = 0) -> int:
+    """
+    Return the version that follows ``current``.
+
+    Versions are microsecond timestamps that never go backwards for a row, so
+    the newest change of any set of wallets carries its highest version.
+    """
+    return max(current + 1, _now())
+
+
+def bump_version(field: str = "version") -> Greatest:
+    """Return the expression that moves a version column to its next value."""
+    return Greatest(F(field) + 1, Value(_now(), output_field=BigIntegerField()))
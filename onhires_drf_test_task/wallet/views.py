@@ -1,59 +1,463 @@
+import functools
 import typing
-from decimal import Decimal
 
-from django.db import DatabaseError, transaction
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
-from rest_framework.filters import OrderingFilter
+from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    APIException,
+    NotFound,
+    Throttled,
+    ValidationError,
+)
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from . import filters, models, serializers
-from .models import Wallet
+from . import (
+    aggregates,
+    caching,
+    contention,
+    etags,
+    exports,
+    filters,
+    group_commit,
+    idempotency,
+    models,
+    pagination,
+    renderers,
+    serializers,
+    services,
+)
 
 
-class WalletViewSet(viewsets.ModelViewSet):
+class SubmissionTimeoutError(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = (
+        "The transaction was queued but not committed in time. "
+        "Please check its status before retrying."
+    )
+    default_code = "submission_timeout"
+
+
+class LeanListMixin:
+    """
+    List through ``lean_serializer_class`` when the view sets one.
+
+    The lean serializer reads ``values()`` rows and formats them directly. Its
+    output equals that of ``serializer_class``, so it can be switched off per
+    view by setting ``lean_serializer_class = None``.
+    """
+
+    lean_serializer_class: type[serializers.LeanListSerializer] | None = None
+
+    def list(
+        self,
+        request: Request,
+        *args: typing.Any,  # noqa: ANN401
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> Response:
+        """Return the filtered and paginated rows formatted by the lean serializer."""
+        if self.lean_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        lean_serializer = self.lean_serializer_class()
+        queryset = lean_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(lean_serializer.to_representation(page))
+        return Response(lean_serializer.to_representation(queryset))
+
+
+class WalletViewSet(LeanListMixin, viewsets.ModelViewSet):
     queryset = models.Wallet.objects.all()
     serializer_class = serializers.WalletSerializer
-    filter_backends: typing.ClassVar = [OrderingFilter, DjangoFilterBackend]
+    lean_serializer_class = serializers.LeanWalletSerializer
+    filter_backends: typing.ClassVar = [
+        filters.WalletOrderingFilter,
+        DjangoFilterBackend,
+    ]
     ordering_fields: typing.ClassVar = ["label", "balance"]
     filterset_class = filters.WalletFilter
     filterset_fields: typing.ClassVar = ["label", "balance"]
     ordering: typing.ClassVar = ["id"]
+    pagination_class = pagination.PageNumberOrKeysetPagination
+
+    def retrieve(
+        self,
+        request: Request,
+        *args: typing.Any,  # noqa: ANN401
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> Response:
+        """
+        Return the wallet, answering a matching ``If-None-Match`` with 304.
+
+        The ETag comes from the wallet version, so an unchanged wallet is
+        answered without running the serializer. A changed one is served from
+        the response cache when it is enabled.
+        """
+        load = functools.partial(super().retrieve, request, *args, **kwargs)
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        if not pk.isdigit():
+            return load()
+
+        version = etags.wallet_version(int(pk))
+        if caching.uses_response_cache():
+            load = functools.partial(
+                caching.cached_response, caching.detail_key(int(pk)), load
+            )
+        return etags.conditional_response(
+            request,
+            None if version is None else etags.make_etag(request, version),
+            load,
+        )
+
+    def get_paginated_response(self, data: list[dict]) -> Response:
+        """Add the stats of every wallet of the page when ``include=stats`` is set."""
+        if "stats" in self.request.query_params.getlist("include"):
+            stats = aggregates.wallet_stats(row["id"] for row in data)
+            for row in data:
+                row["stats"] = serializers.WalletStatsSerializer(stats[row["id"]]).data
+        return super().get_paginated_response(data)
+
+    def list(
+        self,
+        request: Request,
+        *args: typing.Any,  # noqa: ANN401
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> Response:
+        """
+        Return a page of wallets, answering a matching ``If-None-Match`` with 304.
+
+        The ETag covers the query string, the highest wallet version and the
+        version of the wallet deletions, each read from an index, so it is
+        checked before the paginated query runs.
+        """
+        load = functools.partial(super().list, request, *args, **kwargs)
+        etag = etags.make_etag(request, *etags.wallets_version(deletions=True))
+        if caching.uses_response_cache():
+            load = functools.partial(
+                caching.cached_response, caching.list_key(request), load
+            )
+        return etags.conditional_response(request, etag, load)
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request: Request) -> Response:  # noqa: ARG002, PLR6301
+        """Return the response cache counters of the serving process."""
+        return Response({"enabled": caching.uses_response_cache(), **caching.stats()})
+
+    @action(detail=True, methods=["get"], url_path="stats")
+    def stats(self, request: Request, pk: str | None = None) -> Response:  # noqa: ARG002
+        """
+        Return the transaction count, totals and amount bounds of the wallet.
+
+        The stats are kept up to date by every transaction write, so they are
+        read from at most ``shard_count`` rows however long the history is.
+        """
+        wallet = self.get_object()
+        stats = aggregates.wallet_stats([wallet.pk])[wallet.pk]
+        return Response({
+            "wallet": wallet.pk,
+            **serializers.WalletStatsSerializer(stats).data,
+        })
 
+    @action(detail=True, methods=["post"], url_path="shards")
+    def shard(self, request: Request, pk: str | None = None) -> Response:  # noqa: ARG002
+        """
+        Spread the wallet balance over the requested number of shard rows.
 
-class TransactionViewSet(viewsets.ModelViewSet):
+        Credits to a sharded wallet go to a random shard and debits take as
+        many shards as they need. The wallet row keeps the total balance, so
+        it is still updated by every change. A ``shard_count`` of 0 drops the
+        shards.
+        """
+        wallet = self.get_object()
+        serializer = serializers.WalletShardingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        wallet = services.shard_wallet(
+            wallet.pk, serializer.validated_data["shard_count"]
+        )
+        return Response({
+            **self.get_serializer(wallet).data,
+            "shard_count": wallet.shard_count,
+        })
+
+
+class TransactionViewSet(LeanListMixin, viewsets.ModelViewSet):
     queryset = models.Transaction.objects.all()
     serializer_class = serializers.TransactionSerializer
-    filter_backends: typing.ClassVar = [OrderingFilter, DjangoFilterBackend]
-    ordering_fields: typing.ClassVar = ["amount", "txid"]
+    lean_serializer_class = serializers.LeanTransactionSerializer
+    filter_backends: typing.ClassVar = [filters.IdOrderingFilter, DjangoFilterBackend]
+    ordering_fields: typing.ClassVar = ["amount", "txid", "created_at"]
     filterset_fields: typing.ClassVar = ["wallet", "txid", "amount"]
+    pagination_class = pagination.PageNumberOrKeysetPagination
+    export_chunk_size = 2000
+    archive_query_param = "archived"
+    archive_actions = frozenset({"list", "retrieve", "export"})
+
+    def reads_archive(self) -> bool:
+        """Return whether the request reads archived transactions instead."""
+        if self.request is None:
+            # The schema is generated without a request.
+            return False
+        return self.action in self.archive_actions and self.request.query_params.get(
+            self.archive_query_param
+        ) in {"1", "true"}
+
+    def get_queryset(self) -> QuerySet:
+        """Read the archive only when a read request asks for ``archived=true``."""
+        if self.reads_archive():
+            return models.ArchivedTransaction.objects.all()
+        return super().get_queryset()
+
+    @property
+    def filterset_class(self) -> type[filters.TransactionFilter]:
+        """Return the filter set matching the model of the queryset."""
+        if self.reads_archive():
+            return filters.ArchivedTransactionFilter
+        return filters.TransactionFilter
+
+    def list(
+        self,
+        request: Request,
+        *args: typing.Any,  # noqa: ANN401
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> Response:
+        """
+        Return a page of transactions, answering a matching ``If-None-Match`` with 304.
+
+        Every transaction change moves the version of its wallet. A list
+        filtered by ``wallet`` is therefore tagged with that wallet's version,
+        and any other list with the highest version of all wallets.
+        """
+        load = functools.partial(super().list, request, *args, **kwargs)
+        wallet_pk = request.query_params.get("wallet", "")
+        if wallet_pk.isdigit():
+            version = etags.wallet_version(int(wallet_pk))
+            etag = None if version is None else etags.make_etag(request, version)
+        else:
+            etag = etags.make_etag(request, *etags.wallets_version(deletions=False))
+        return etags.conditional_response(request, etag, load)
+
+    def create(
+        self,
+        request: Request,
+        *args: typing.Any,  # noqa: ANN401
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> Response:
+        """
+        Create a transaction, or replay the original one for a repeated txid.
+
+        A retried POST is answered from the recent txid cache before any
+        validation or locking: the original transaction with 200 when the
+        payload is the same, 409 when it differs.
+        """
+        txid = request.data.get("txid") if isinstance(request.data, dict) else None
+        if not isinstance(txid, str):
+            return super().create(request, *args, **kwargs)
+
+        if (recorded := idempotency.lookup(txid)) is not None:
+            return self.replay(recorded, request.data)
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # A concurrent request created the same txid first.
+            if (recorded := idempotency.lookup(txid)) is None:
+                raise
+            return self.replay(recorded, request.data)
+
+    def replay(
+        self,
+        recorded: idempotency.RecordedTransaction,
+        data: dict[str, typing.Any],
+    ) -> Response:
+        """Answer a repeated txid with the original transaction or a conflict."""
+        if not recorded.matches(data):
+            return Response(
+                {
+                    "detail": "A transaction with this txid already exists with a different payload."
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(
+            self.get_serializer(recorded.to_instance()).data, status=status.HTTP_200_OK
+        )
+
+    def perform_create(self, serializer: serializers.TransactionSerializer) -> None:
+        """Create the transaction directly or through the group commit queue."""
+        if group_commit.uses_group_commit():
+            serializer.instance = self.submit_to_queue(serializer.validated_data)
+        else:
+            serializer.save()
+        idempotency.remember(serializer.instance)
+
+    @staticmethod
+    def submit_to_queue(data: dict[str, typing.Any]) -> models.Transaction:
+        """Create the transaction through the group commit queue."""
+        try:
+            future = group_commit.get_queue().submit(
+                data["txid"], data["wallet"].pk, data["amount"]
+            )
+        except group_commit.QueueFullError as exc:
+            raise Throttled(
+                detail="The transaction queue is full. Please try again later."
+            ) from exc
+
+        try:
+            outcome = future.result(timeout=settings.WALLET_GROUP_COMMIT_TIMEOUT)
+        except TimeoutError as exc:
+            raise SubmissionTimeoutError from exc
+        if outcome.detail is not None:
+            raise ValidationError(outcome.detail)
+        return outcome.transaction
+
+    def perform_update(self, serializer: serializers.TransactionSerializer) -> None:  # noqa: PLR6301
+        """Update the transaction and drop the cached payload of its txids."""
+        old_txid = serializer.instance.txid
+        serializer.save()
+        idempotency.forget(old_txid)
+        idempotency.forget(serializer.instance.txid)
 
     def destroy(self, _: Request, *args: typing.Any, **kwargs: typing.Any) -> Response:  # noqa: ARG002, ANN401
         """Override the destroy method to update the wallet balance."""
         instance = self.get_object()
+
+        def delete() -> None:
+            row = services.unchanged_transaction(
+                instance.pk, instance.wallet_id, instance.amount
+            )
+            if not row.delete()[0]:
+                raise services.unmatched_transaction_error(instance.pk)
+
         try:
-            with transaction.atomic():
-                wallet = Wallet.objects.select_for_update().get(pk=instance.wallet.pk)
-
-                new_balance = wallet.balance - instance.amount
-                if new_balance < Decimal(0):
-                    return Response(
-                        {
-                            "detail": "It is impossible to delete the transaction: the wallet balance cannot be negative."
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                wallet.balance = new_balance
-                wallet.save()
-
-                instance.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-
-        except DatabaseError:
+            services.write_with_deltas(
+                {instance.wallet_id: -instance.amount},
+                delete,
+                services.shard_counts(instance.wallet),
+                removed=[(instance.wallet_id, instance.amount)],
+            )
+        except (models.Transaction.DoesNotExist, models.Wallet.DoesNotExist) as exc:
+            raise NotFound from exc
+        except services.InsufficientFundsError:
+            return Response(
+                {
+                    "detail": "It is impossible to delete the transaction: the wallet balance cannot be negative."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except services.WalletBusyError:
             return Response(
                 {
                     "detail": "It is impossible to delete the transaction: the wallet is currently locked. Please try again later."
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        except services.TransactionChangedError:
+            return Response(
+                {
+                    "detail": "It is impossible to delete the transaction: it was changed concurrently. Please try again."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        idempotency.forget(instance.txid)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["get"], url_path="write-stats")
+    def write_stats(self, request: Request) -> Response:  # noqa: ARG002, PLR6301
+        """Return the write mode and the write conflict counters of this process."""
+        return Response({"mode": settings.WALLET_WRITE_MODE, **services.write_stats()})
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request: Request) -> Response:  # noqa: PLR6301
+        """
+        Ingest a batch of transactions with a single atomic commit.
+
+        Responds with the number of created transactions and a per-item report
+        of the rejected ones.
+        """
+        serializer = serializers.BulkTransactionSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=serializers.BulkTransactionSerializer.MAX_ITEMS,
+        )
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            result = services.ingest_transactions(serializer.validated_data)
+        except IntegrityError:
+            return Response(
+                {
+                    "detail": "A transaction from the batch was created concurrently. Please retry the batch."
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(
+            {"created": result.created, "rejected": result.rejected},
+            status=status.HTTP_201_CREATED
+            if result.created
+            else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[renderers.NDJSONRenderer, renderers.CSVRenderer],
+    )
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """
+        Stream the filtered transactions as NDJSON or CSV.
+
+        Honours the list filters and ordering. Rows are read in keyset chunks
+        and written to the response as they arrive, so memory stays flat and
+        the first bytes are sent right away.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        field, descending = pagination.KeysetPagination.get_ordering(
+            request, queryset, self
+        )
+        rows = pagination.iter_keyset(
+            queryset,
+            field,
+            exports.TRANSACTION_EXPORT_COLUMNS,
+            descending=descending,
+            chunk_size=self.export_chunk_size,
+        )
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            exports.TRANSACTION_EXPORT_FORMATS[renderer.format](rows),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="transactions.{renderer.format}"'
+        )
+        return response
+
+
+class DiagnosticsViewSet(viewsets.ViewSet):
+    DEFAULT_LIMIT = 20
+
+    @action(detail=False, methods=["get"], url_path="hot-wallets")
+    def hot_wallets(self, request: Request) -> Response:
+        """
+        Return the wallets with the most lock contention in the serving process.
+
+        Wallets are ranked by lock wait time, NOWAIT failures and lock
+        conflicts; ``limit`` sets how many are listed per metric. Every value
+        overestimates the true one by at most its ``error``.
+        """
+        value = request.query_params.get("limit", self.DEFAULT_LIMIT)
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            limit = 0
+        if limit < 1:
+            raise ValidationError({"limit": "A positive integer is required."})
+        return Response(contention.get_profile().report(limit))